@@ -0,0 +1,142 @@
+try:
+    import numpy as np
+except ImportError as e:
+    raise ImportError("batch.py needs NumPy: pip install numpy") from e
+
+# classifies huge batches of positions at once with NumPy, for analytics and
+# self-play, instead of calling `BoardClass.isWinner` and `boardIsFull` on
+# one board at a time. NumPy is only needed by this module.
+#
+# a batch is an (n, width, width) int8 array, 1 for 'X', -1 for 'O' and 0
+# for an empty cell. `unpack` and `from_games` build one from the bitmasks
+# of BoardClass. Every winning line is summed at once: a line adding up to
+# win_length is a win of 'X', to -win_length a win of 'O'.
+#
+# the work is done cell-major, each cell of every board being one
+# contiguous vector, so that sums and checks of a line run over whole
+# vectors instead of along the short last axis. The batches built here are
+# views of cell-major arrays and cost nothing to turn around.
+
+EMPTY = 0
+X = 1
+O = -1
+
+# results, the same codes as records.py plus a game still going on
+TIE = 0
+X_WON = 1
+O_WON = 2
+ONGOING = 3
+
+
+def _unpack_bytes(x_bytes, o_bytes, board_width):
+    """Build a batch from the little-endian bytes of the bitmasks.
+
+    Args:
+        x_bytes (ndarray): (n, bytes) uint8 array of the cells of 'X'.
+        o_bytes (ndarray): (n, bytes) uint8 array of the cells of 'O'.
+        board_width (int): the width of the boards.
+    """
+    cells = board_width * board_width
+    x = np.unpackbits(x_bytes.T, axis=0, count=cells, bitorder="little").view(np.int8)
+    o = np.unpackbits(o_bytes.T, axis=0, count=cells, bitorder="little").view(np.int8)
+    return (x - o).reshape(board_width, board_width, -1).transpose(2, 0, 1)
+
+
+def unpack(x_bits, o_bits, board_width):
+    """Build a batch from packed bitmasks, cell (row, col) being bit
+       `row * board_width + col` as in BoardClass.
+
+    Args:
+        x_bits (ndarray): uint64 cells of 'X' of each board.
+        o_bits (ndarray): uint64 cells of 'O' of each board.
+        board_width (int): the width of the boards, up to 8.
+
+    Returns:
+        ndarray: the (n, board_width, board_width) int8 boards.
+    """
+    if board_width > 8:
+        raise ValueError(f"a {board_width}x{board_width} board does not fit 64 bits, use from_games")
+    x_bytes = np.ascontiguousarray(x_bits, dtype="<u8").view(np.uint8).reshape(-1, 8)
+    o_bytes = np.ascontiguousarray(o_bits, dtype="<u8").view(np.uint8).reshape(-1, 8)
+    return _unpack_bytes(x_bytes, o_bytes, board_width)
+
+
+def from_games(games):
+    """Build a batch from boards of the same width, of any width.
+
+    Args:
+        games (list): the BoardClass of each position.
+
+    Returns:
+        ndarray: the (n, board_width, board_width) int8 boards.
+    """
+    board_width = games[0].board_width
+    size = (board_width * board_width + 7) // 8
+    x_bytes = np.frombuffer(b"".join(game.x_bits.to_bytes(size, "little") for game in games),
+                            np.uint8).reshape(-1, size)
+    o_bytes = np.frombuffer(b"".join(game.o_bits.to_bytes(size, "little") for game in games),
+                            np.uint8).reshape(-1, size)
+    return _unpack_bytes(x_bytes, o_bytes, board_width)
+
+
+def line_sums(boards, win_length=None):
+    """Sum every winning line of every board.
+
+    Args:
+        boards (ndarray): (n, width, width) batch.
+        win_length (int): how many marks in a row win, the width by default.
+
+    Returns:
+        tuple: the sums of the rows, columns, diagonals and anti-diagonals,
+               each an (a, b, n) array whose [r, c, i] is the line of board
+               i starting at row r, column c.
+    """
+    width = boards.shape[1]
+    k = win_length or width
+    span = width - k + 1
+    cells = np.ascontiguousarray(boards.transpose(1, 2, 0))
+    if k >= 128:
+        cells = cells.astype(np.int16)
+    rows = cells[:, :span].copy()
+    cols = cells[:span, :].copy()
+    diagonals = cells[:span, :span].copy()
+    anti = cells[:span, k - 1:].copy()
+    for i in range(1, k):
+        rows += cells[:, i:span + i]
+        cols += cells[i:span + i, :]
+        diagonals += cells[i:span + i, i:span + i]
+        anti += cells[i:span + i, k - 1 - i:width - i]
+    return rows, cols, diagonals, anti
+
+
+def classify(boards, win_length=None):
+    """Find the result of every board.
+
+    Args:
+        boards (ndarray): (n, width, width) batch.
+        win_length (int): how many marks in a row win, the width by default.
+
+    Returns:
+        ndarray: uint8 X_WON, O_WON, TIE or ONGOING of each board.
+    """
+    n = len(boards)
+    k = win_length or boards.shape[1]
+    x_won = np.zeros(n, bool)
+    o_won = np.zeros(n, bool)
+    for sums in line_sums(boards, k):
+        x_won |= (sums == k).any(axis=(0, 1))
+        o_won |= (sums == -k).any(axis=(0, 1))
+    results = np.full(n, ONGOING, np.uint8)
+    results[(boards != EMPTY).all(axis=(1, 2))] = TIE
+    results[o_won] = O_WON
+    results[x_won] = X_WON
+    return results
+
+
+def legal_moves(boards):
+    """Find the legal moves of every board, like `BoardClass.checkLegalMove`.
+
+    Returns:
+        ndarray: (n, width, width) bool array, True where a mark may be put.
+    """
+    return boards == EMPTY
@@ -0,0 +1,114 @@
+"""Throughput of batch.classify against the scalar BoardClass path.
+
+    python -m benchmarks.bench_batch --positions 1000000
+    python -m benchmarks.bench_batch --width 7 --win-length 4
+
+Classifies the same positions, taken from random games stopped after a
+random number of moves, twice: one BoardClass at a time with `isWinner`
+on the latest move and `boardIsFull`, then as one NumPy batch. Needs NumPy.
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+import batch
+import bots
+import gameboard
+
+
+def random_positions(count, width, win_length, seed):
+    """Take positions from random games: a few thousand distinct ones,
+       repeated to `count`.
+
+    Returns:
+        list: (x_bits, o_bits, latest cell or None, moves) of each position.
+    """
+    rng = random.Random(seed)
+    bot = bots.RandomBot(seed)
+    game = gameboard.BoardClass(width, win_length)
+    distinct = []
+    for _ in range(min(count, 5000)):
+        game.init_player("p1", "p2")
+        game.resetGameBoard()
+        stop = rng.randrange(width * width + 1)
+        mark = "X"
+        while game.moves < stop:
+            r, c = bot.choose_move(game)
+            game.updateGameBoard(mark, r, c, mark)
+            if game.checkGameOver(r, c):
+                break
+            mark = "O" if mark == "X" else "X"
+        latest = game.history[-1] if game.history else None
+        distinct.append((game.x_bits, game.o_bits, latest, game.moves))
+    return [distinct[rng.randrange(len(distinct))] for _ in range(count)]
+
+
+def classify_scalar(positions, width, win_length):
+    """Classify each position with BoardClass.
+
+    Returns:
+        list: the batch result code of each position.
+    """
+    game = gameboard.BoardClass(width, win_length)
+    results = []
+    for x_bits, o_bits, latest, moves in positions:
+        game.x_bits = x_bits
+        game.o_bits = o_bits
+        game.moves = moves
+        if latest is not None and game.isWinner(*divmod(latest, width)):
+            results.append(batch.X_WON if x_bits >> latest & 1 else batch.O_WON)
+        elif game.boardIsFull():
+            results.append(batch.TIE)
+        else:
+            results.append(batch.ONGOING)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--positions", type=int, default=1000000)
+    parser.add_argument("--width", type=int, default=3)
+    parser.add_argument("--win-length", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+    win_length = args.win_length or args.width
+
+    positions = random_positions(args.positions, args.width, win_length, args.seed)
+
+    start = time.perf_counter()
+    expected = classify_scalar(positions, args.width, win_length)
+    scalar = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if args.width <= 8:
+        x_bits = np.array([p[0] for p in positions], np.uint64)
+        o_bits = np.array([p[1] for p in positions], np.uint64)
+        packed = time.perf_counter()
+        boards = batch.unpack(x_bits, o_bits, args.width)
+    else:
+        games = []
+        for x, o, _, _ in positions:
+            game = gameboard.BoardClass(args.width, win_length)
+            game.x_bits, game.o_bits = x, o
+            games.append(game)
+        packed = time.perf_counter()
+        boards = batch.from_games(games)
+    unpacked = time.perf_counter()
+    results = batch.classify(boards, win_length)
+    done = time.perf_counter()
+
+    if results.tolist() != expected:
+        raise SystemExit("batch and scalar results differ")
+    n = args.positions
+    print(f"{n:,} positions of {args.width}x{args.width}, {win_length} in a row")
+    print(f"scalar BoardClass: {n / scalar:14,.0f} positions/s")
+    print(f"batch classify:    {n / (done - unpacked):14,.0f} positions/s"
+          f" ({scalar / (done - unpacked):.0f}x)")
+    print(f"  with unpacking:  {n / (done - packed):14,.0f} positions/s")
+    print(f"  with packing:    {n / (done - start):14,.0f} positions/s")
+
+
+if __name__ == "__main__":
+    main()
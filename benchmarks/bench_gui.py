@@ -0,0 +1,160 @@
+"""Transition time and memory of the game window over many rematches.
+
+    python -m benchmarks.bench_gui --rematches 1000
+
+Compares rebuilding the window for every screen (a new Tk root and new
+cell buttons, as the players did before) with one root whose screens are
+swapped frames and whose board is cleared in place. Each mode runs in its
+own process so their memory does not mix. Needs a display; without one,
+each mode runs under `xvfb-run` if it is installed.
+"""
+import argparse
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import time
+
+MOVES = [(0, 0), (1, 0), (0, 1), (1, 1), (0, 2)]
+
+
+def rss_kib():
+    """Get the resident memory of this process in KiB.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except OSError:
+        # peak rather than current off Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def rebuild(rematches):
+    """Destroy and recreate the window for the board and play-again screens.
+
+    Returns:
+        list: seconds of each transition.
+    """
+    import tkinter as tk
+
+    def new_root(root):
+        if root is not None:
+            root.destroy()
+        root = tk.Tk()
+        root.title("Tic-Tac-Toe Game -- Player 1")
+        root.geometry("400x400")
+        return root
+
+    times = []
+    root = new_root(None)
+    for _ in range(rematches):
+        start = time.perf_counter()
+        root = new_root(root)
+        canvas = tk.Canvas(root, width=400, height=100)
+        turn_indicator = canvas.create_text(200, 15, text="Player1's turn", font=('Arial', 20))
+        canvas.create_text(200, 40, text="", font=('Arial', 10))
+        canvas.place(x=0, y=350)
+        buttons = []
+        for row in range(3):
+            button_row = []
+            for col in range(3):
+                button = tk.Button(root, text="", font=("Arial", 20), width=5, height=2)
+                button.grid(row=row, column=col, padx=5, pady=5)
+                button_row.append(button)
+            buttons.append(button_row)
+        root.update()
+        times.append(time.perf_counter() - start)
+        for i, (r, c) in enumerate(MOVES):
+            buttons[r][c].config(text="XO"[i % 2], state=tk.DISABLED)
+        canvas.itemconfigure(turn_indicator, text="I won!")
+        root.update()
+
+        start = time.perf_counter()
+        root = new_root(root)
+        tk.Label(root, text="Do you want to play again? (y/n): ").pack()
+        tk.Entry(root).pack()
+        tk.Button(root, text="y/n").pack()
+        root.update()
+        times.append(time.perf_counter() - start)
+    root.destroy()
+    return times
+
+
+def reuse(rematches):
+    """Swap frames in one window and clear the board in place.
+
+    Returns:
+        list: seconds of each transition.
+    """
+    import tkinter as tk
+
+    import board_widget
+
+    times = []
+    root = tk.Tk()
+    root.title("Tic-Tac-Toe Game -- Player 1")
+    root.geometry("400x400")
+    board = board_widget.BoardWidget(root, 3, lambda r, c: None)
+    screen = None
+    for _ in range(rematches):
+        start = time.perf_counter()
+        if screen is not None:
+            screen.destroy()
+        board.reset("Player1's turn")
+        board.pack(fill=tk.BOTH, expand=True)
+        root.update()
+        times.append(time.perf_counter() - start)
+        for i, (r, c) in enumerate(MOVES):
+            board.mark(r, c, "XO"[i % 2])
+        board.set_status("I won!")
+        root.update()
+
+        start = time.perf_counter()
+        board.pack_forget()
+        screen = tk.Frame(root)
+        tk.Label(screen, text="Do you want to play again? (y/n): ").pack()
+        tk.Entry(screen).pack()
+        tk.Button(screen, text="y/n").pack()
+        screen.pack(fill=tk.BOTH, expand=True)
+        root.update()
+        times.append(time.perf_counter() - start)
+    root.destroy()
+    return times
+
+
+def run_mode(mode, rematches):
+    """Run one mode in this process and print its results.
+    """
+    before = rss_kib()
+    times = {"rebuild": rebuild, "reuse": reuse}[mode](rematches)
+    after = rss_kib()
+    times.sort()
+    mean = sum(times) / len(times)
+    print(f"{mode:8} transition mean {mean * 1000:7.2f} ms, "
+          f"p99 {times[int(len(times) * 0.99)] * 1000:7.2f} ms, "
+          f"RSS {before:,} -> {after:,} KiB ({after - before:+,})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rematches", type=int, default=1000)
+    parser.add_argument("--mode", choices=("rebuild", "reuse"), default=None,
+                        help="run one mode in this process")
+    args = parser.parse_args(argv)
+
+    if args.mode:
+        run_mode(args.mode, args.rematches)
+        return
+    prefix = []
+    if not os.environ.get("DISPLAY"):
+        if shutil.which("xvfb-run") is None:
+            parser.error("no display: set DISPLAY or install xvfb-run (Debian: apt install xvfb)")
+        prefix = ["xvfb-run", "-a"]
+    for mode in ("rebuild", "reuse"):
+        subprocess.run(prefix + [sys.executable, "-m", "benchmarks.bench_gui", "--mode", mode,
+                                 "--rematches", str(args.rematches)], check=True)
+
+
+if __name__ == "__main__":
+    main()
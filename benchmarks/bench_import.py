@@ -0,0 +1,53 @@
+"""Import time of each module, from `python -X importtime`.
+
+    python -m benchmarks.bench_import --runs 5
+
+Every import runs in a fresh interpreter. Reports the best cumulative time
+of each module and whether importing it loaded Tk, which headless users
+(bots, the server, the worker processes) should never pay for.
+"""
+import argparse
+import subprocess
+import sys
+
+MODULES = ["gameboard", "protocol", "bots", "records", "stats_store", "server",
+           "loadgen", "mcts", "player1", "player2"]
+
+
+def import_time(module):
+    """Import `module` in a fresh interpreter.
+
+    Returns:
+        tuple: (cumulative microseconds, whether _tkinter was imported).
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, check=True)
+    cumulative = None
+    tk_loaded = False
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, total, name = line.split("|")
+        if name.strip() == "_tkinter":
+            tk_loaded = True
+        if name.rstrip() == f" {module}":
+            cumulative = int(total)
+    return cumulative, tk_loaded
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    args = parser.parse_args(argv)
+
+    print(f"{'module':12} {'best us':>9}  Tk")
+    for module in args.modules:
+        runs = [import_time(module) for _ in range(args.runs)]
+        best = min(us for us, _ in runs)
+        tk_loaded = any(loaded for _, loaded in runs)
+        print(f"{module:12} {best:9,}  {'yes' if tk_loaded else 'no'}")
+
+
+if __name__ == "__main__":
+    main()
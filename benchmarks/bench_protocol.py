@@ -0,0 +1,50 @@
+"""Encode/decode microbenchmark of the wire protocol.
+
+    python -m benchmarks.bench_protocol --messages 200000
+"""
+import argparse
+import time
+
+import protocol
+
+
+def bench_encode(count):
+    start = time.perf_counter()
+    for i in range(count):
+        protocol.encode_move(i % 15, i % 13)
+    return count / (time.perf_counter() - start)
+
+
+def bench_decode(stream, count, chunk):
+    """Decode `stream` fed to one decoder `chunk` bytes at a time.
+    """
+    decoder = protocol.Decoder()
+    decoded = 0
+    start = time.perf_counter()
+    for offset in range(0, len(stream), chunk):
+        decoded += len(decoder.feed(stream[offset:offset + chunk]))
+    elapsed = time.perf_counter() - start
+    assert decoded == count, (decoded, count)
+    return count / elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200000)
+    args = parser.parse_args(argv)
+
+    count = args.messages
+    frames = [protocol.encode_move(i % 15, i % 13) for i in range(count)]
+    stream = b"".join(frames)
+    mixed = b"".join(protocol.encode_hello("player") if i % 10 == 0 else frame
+                     for i, frame in enumerate(frames))
+
+    print(f"encode move:               {bench_encode(count):12,.0f} msg/s")
+    print(f"decode, one message/read:  {bench_decode(stream, count, len(frames[0])):12,.0f} msg/s")
+    print(f"decode, 64 KiB reads:      {bench_decode(stream, count, 65536):12,.0f} msg/s")
+    print(f"decode, 7 byte reads:      {bench_decode(stream, count, 7):12,.0f} msg/s")
+    print(f"decode mixed, 64 KiB:      {bench_decode(mixed, count, 65536):12,.0f} msg/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Write/read benchmark of the binary game records.
+
+    python -m benchmarks.bench_records --games 1000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import bots
+import gameboard
+import records
+
+
+def play_games(count, seed):
+    """Play `count` distinct-enough random 3x3 games to record.
+
+    Returns:
+        list: (result, cells) of each game.
+    """
+    rng = random.Random(seed)
+    bot = bots.RandomBot(seed)
+    game = gameboard.BoardClass()
+    played = []
+    # a few hundred distinct games, repeated, keep the setup short
+    for _ in range(min(count, 500)):
+        game.init_player("p1", "p2")
+        game.resetGameBoard()
+        mark = "X"
+        while True:
+            r, c = bot.choose_move(game)
+            game.updateGameBoard(mark, r, c, mark)
+            if game.checkGameOver(r, c):
+                break
+            mark = "O" if mark == "X" else "X"
+        played.append((records.result_of(game), list(game.history)))
+    return [played[rng.randrange(len(played))] for _ in range(count)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--games", type=int, default=1000000)
+    parser.add_argument("--players", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    games = play_games(args.games, args.seed)
+    names = [f"player{i}" for i in range(args.players)]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "games.seg")
+
+        recorder = records.GameRecorder(path)
+        start = time.perf_counter()
+        for i, (result, cells) in enumerate(games):
+            recorder.record(names[i % args.players], "Server", 3, 3, result, cells)
+        recorder.close()
+        write = time.perf_counter() - start
+        size = sum(os.path.getsize(path + suffix) for suffix in ("", ".idx", ".names"))
+
+        start = time.perf_counter()
+        reader = records.SegmentReader(path)
+        opened = time.perf_counter() - start
+
+        start = time.perf_counter()
+        results = reader.results()
+        scan = time.perf_counter() - start
+
+        start = time.perf_counter()
+        moves = sum(len(record.moves) for record in reader)
+        decode = time.perf_counter() - start
+
+        rng = random.Random(args.seed)
+        picks = [rng.randrange(len(reader)) for _ in range(100000)]
+        start = time.perf_counter()
+        for i in picks:
+            reader.cells(i)
+        lookup = time.perf_counter() - start
+        reader.close()
+
+    assert sum(results.values()) == args.games and moves == sum(len(c) for _, c in games)
+    print(f"games:              {args.games:12,}")
+    print(f"bytes/game:         {size / args.games:12.1f}")
+    print(f"write:              {args.games / write:12,.0f} games/s")
+    print(f"open reader:        {opened * 1000:12.2f} ms")
+    print(f"scan headers:       {args.games / scan:12,.0f} games/s")
+    print(f"decode all:         {args.games / decode:12,.0f} games/s")
+    print(f"random access:      {len(picks) / lookup:12,.0f} games/s")
+
+
+if __name__ == "__main__":
+    main()
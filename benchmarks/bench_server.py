@@ -0,0 +1,140 @@
+"""Loopback throughput of `server.GameServer`.
+
+Runs the server in a child process and drives it with many concurrent
+player 1 clients speaking the same messages as player1.py.
+
+Target: on one core, at least 2,000 matches/sec and 15,000 moves/sec with
+200 concurrent clients.
+
+    python -m benchmarks.bench_server --clients 200 --games 20
+
+With --workers, the server is sharded over that many processes by
+shards.py, and --drivers spreads the clients over as many load generator
+processes, so that the clients are not the bottleneck. Throughput should
+grow close to linearly with the workers while there are cores for both.
+
+    python -m benchmarks.bench_server --workers 4 --drivers 4 --clients 800
+
+With --multiplex, each client connection plays that many games at once, so
+the same games take far fewer connections, reads and writes.
+
+    python -m benchmarks.bench_server --clients 4 --multiplex 50
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import socket
+import time
+
+import bots
+import loadgen
+import server
+import shards
+
+
+def serve(port_queue):
+    """Run a server on a free loopback port, reporting the port.
+    """
+    async def _serve():
+        game_server = server.GameServer("127.0.0.1", 0)
+        await game_server.start()
+        port_queue.put(game_server.port)
+        await game_server.serve_forever()
+    asyncio.run(_serve())
+
+
+def serve_sharded(port, workers):
+    """Run the sharded server on `port` until SIGTERM.
+    """
+    shards.Launcher("127.0.0.1", port, workers).run()
+
+
+def free_port():
+    """Find a loopback port that is free right now.
+    """
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def drive(port, clients, games, first=0, multiplex=0):
+    stats = loadgen.LoadStats()
+    start = time.perf_counter()
+    if multiplex:
+        clients = (loadgen.play_mux_client("127.0.0.1", port, f"bot{i}", bots.RandomBot(i),
+                                           multiplex, games, stats)
+                   for i in range(first, first + clients))
+    else:
+        clients = (loadgen.play_client("127.0.0.1", port, f"bot{i}", bots.RandomBot(i),
+                                       games, 0, stats)
+                   for i in range(first, first + clients))
+    await asyncio.gather(*clients)
+    return stats, time.perf_counter() - start
+
+
+def drive_process(port, clients, games, first, multiplex, results):
+    """Run `drive` in a driver process and send back games, moves and elapsed.
+    """
+    stats, elapsed = asyncio.run(drive(port, clients, games, first, multiplex))
+    results.put((stats.games, stats.moves, elapsed))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--games", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=0,
+                        help="server processes sharing the port, 0 for one plain server")
+    parser.add_argument("--drivers", type=int, default=1, help="load generator processes")
+    parser.add_argument("--multiplex", type=int, default=0,
+                        help="games played at once over each client connection")
+    args = parser.parse_args(argv)
+
+    if args.workers:
+        port = free_port()
+        proc = multiprocessing.Process(target=serve_sharded, args=(port, args.workers))
+        proc.start()
+        # wait until the workers accept connections
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(("127.0.0.1", port)).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+    else:
+        port_queue = multiprocessing.Queue()
+        proc = multiprocessing.Process(target=serve, args=(port_queue,), daemon=True)
+        proc.start()
+        port = port_queue.get(timeout=10)
+    try:
+        results = multiprocessing.Queue()
+        per_driver = args.clients // args.drivers
+        drivers = [multiprocessing.Process(target=drive_process,
+                                           args=(port, per_driver, args.games, i * per_driver,
+                                                 args.multiplex, results))
+                   for i in range(args.drivers)]
+        for driver in drivers:
+            driver.start()
+        totals = [results.get() for _ in drivers]
+        for driver in drivers:
+            driver.join()
+    finally:
+        if args.workers:
+            os.kill(proc.pid, signal.SIGTERM)
+        else:
+            proc.terminate()
+        proc.join()
+    games = sum(t[0] for t in totals)
+    moves = sum(t[1] for t in totals)
+    elapsed = max(t[2] for t in totals)
+    print(f"workers={args.workers or 1} drivers={args.drivers} clients={per_driver * args.drivers}"
+          f" multiplex={args.multiplex or 1} games/client={args.games} elapsed={elapsed:.2f}s")
+    print(f"matches/sec: {games / elapsed:.1f}")
+    print(f"moves/sec:   {moves / elapsed:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Cost of spectators to the players of `server.GameServer`.
+
+    python -m benchmarks.bench_spectators --spectators 100 --stalled 10
+
+Plays the same games three times on a loopback server in this process:
+without spectators, watched by spectators who read every message, and
+watched by the same spectators plus stalled ones who never read. The
+spectators run in a child process. The players' moves/sec should barely
+change with stalled spectators, and once the kernel's socket buffers are
+full the bytes queued for each of them should stay around
+spectators.HIGH_WATER.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import socket
+import time
+
+import bots
+import loadgen
+import protocol
+import server
+
+
+async def spectate(port, counts):
+    """Watch the latest game, counting the messages until the match is over.
+    """
+    stream, writer = await asyncio.open_connection("127.0.0.1", port)
+    reader = protocol.AsyncMessageReader(stream, writer)
+    writer.write(protocol.encode_watch(0))
+    try:
+        while True:
+            message = await reader.recv()
+            counts[type(message).__name__] += 1
+            if isinstance(message, protocol.Quit):
+                return
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+def stall(port):
+    """Watch the latest game from a socket that is never read.
+    """
+    s = socket.socket()
+    s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    s.connect(("127.0.0.1", port))
+    s.sendall(protocol.encode_watch(0))
+    return s
+
+
+def watch_process(port, spectators, stalled, results):
+    """Run the spectators, then send back the messages read per spectator.
+    """
+    async def _watch():
+        counts = {"Snapshot": 0, "Move": 0, "Quit": 0}
+        sockets = [stall(port) for _ in range(stalled)]
+        await asyncio.gather(*(spectate(port, counts) for _ in range(spectators)))
+        for s in sockets:
+            s.close()
+        return sum(counts.values()) / spectators if spectators else 0
+    results.put(asyncio.run(_watch()))
+
+
+async def run(games, spectators, stalled):
+    """Play `games` games watched by `spectators` readers and `stalled` stalled spectators.
+
+    Returns:
+        tuple: (moves/sec of the players, messages read per spectator,
+                largest write buffer of a spectator in bytes).
+    """
+    game_server = server.GameServer("127.0.0.1", 0)
+    await game_server.start()
+    serving = asyncio.create_task(game_server.serve_forever())
+    stats = loadgen.LoadStats()
+    player = asyncio.create_task(loadgen.play_client("127.0.0.1", game_server.port, "player",
+                                                     bots.RandomBot(1), games, 0, stats))
+    while not game_server.spectators.channels:
+        await asyncio.sleep(0.001)
+    results = multiprocessing.Queue()
+    watchers = multiprocessing.Process(target=watch_process,
+                                       args=(game_server.port, spectators, stalled, results))
+    watchers.start()
+    while game_server.spectators.watching < spectators + stalled:
+        await asyncio.sleep(0.001)
+    channel = next(iter(game_server.spectators.channels.values()))
+    # loopback send buffers grow to megabytes, more than a run writes to a
+    # stalled spectator; keep them small so the bytes back up into the
+    # server and the HIGH_WATER cut-off is reached
+    for writer in channel.subscribers:
+        writer.get_extra_info("socket").setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+    moves = stats.moves
+    start = time.perf_counter()
+    peak = 0
+    while not player.done():
+        await asyncio.sleep(0.01)
+        for writer in channel.subscribers:
+            peak = max(peak, writer.transport.get_write_buffer_size())
+    elapsed = time.perf_counter() - start
+    await player
+    # the spectators see the match end once the server closes the channel
+    read = await asyncio.get_running_loop().run_in_executor(None, results.get)
+    watchers.join()
+    serving.cancel()
+    return (stats.moves - moves) / elapsed, read, peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--games", type=int, default=2000)
+    parser.add_argument("--spectators", type=int, default=100)
+    parser.add_argument("--stalled", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    print(f"{'case':28} {'moves/sec':>10} {'read/spectator':>15} {'peak buffer':>12}")
+    for name, spectators, stalled in (("no spectators", 0, 0),
+                                      (f"{args.spectators} spectators", args.spectators, 0),
+                                      (f"+ {args.stalled} stalled", args.spectators, args.stalled)):
+        rate, read, peak = asyncio.run(run(args.games, spectators, stalled))
+        print(f"{name:28} {rate:10,.0f} {read:15,.0f} {peak:12,}")
+
+
+if __name__ == "__main__":
+    main()
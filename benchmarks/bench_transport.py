@@ -0,0 +1,84 @@
+"""Round-trip latency of one move over each transport of transport.py.
+
+    python -m benchmarks.bench_transport --round-trips 20000
+
+Echoes Move frames between two threads of this process, like the loopback
+round trip of benchmarks.suite, over TCP on 127.0.0.1, a Unix domain
+socket in a temporary directory and the in-process socketpair transport.
+Both ends use a MessageReader, as the players do.
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+import protocol
+import tracing
+import transport
+
+
+def echo_moves(listener):
+    """Answer every move with the same move, like player 2's recv loop
+       followed by `handle_click`.
+    """
+    conn, _ = listener.accept()
+    reader = protocol.MessageReader(conn)
+    try:
+        while True:
+            message = reader.recv()
+            conn.sendall(protocol.encode_move(message.row, message.col))
+    except (OSError, protocol.ProtocolError):
+        pass
+    finally:
+        conn.close()
+
+
+def round_trips(host, port, count):
+    """Time `count` move round trips to an echo thread over one transport.
+
+    Returns:
+        list: the round trips in microseconds, sorted, after a warm-up tenth.
+    """
+    listener = transport.listen(host, port)
+    if transport.kind(host) == transport.TCP:
+        port = listener.getsockname()[1]
+    thread = threading.Thread(target=echo_moves, args=(listener,), daemon=True)
+    thread.start()
+    s = transport.connect(host, port)
+    reader = protocol.MessageReader(s)
+    samples = []
+    try:
+        for i in range(count + count // 10):
+            move = protocol.encode_move(i % 3, i // 3 % 3)
+            start = time.perf_counter()
+            s.sendall(move)
+            reader.recv()
+            samples.append((time.perf_counter() - start) * 1e6)
+    finally:
+        s.close()
+        thread.join()
+        listener.close()
+    return sorted(samples[count // 10:])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--round-trips", type=int, default=20000)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "ttt.sock")
+        cases = (("tcp", "127.0.0.1"), ("unix", transport.UNIX_PREFIX + path),
+                 ("inproc", transport.INPROC_PREFIX + "bench"))
+        print(f"{args.round_trips:,} move round trips")
+        print(f"{'transport':<10}{'p50 us':>10}{'p99 us':>10}{'round trips/s':>16}")
+        for name, host in cases:
+            samples = round_trips(host, 0, args.round_trips)
+            print(f"{name:<10}{tracing.percentile(samples, 50):>10.1f}"
+                  f"{tracing.percentile(samples, 99):>10.1f}"
+                  f"{len(samples) / (sum(samples) / 1e6):>16,.0f}")
+
+
+if __name__ == "__main__":
+    main()
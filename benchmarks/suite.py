@@ -0,0 +1,307 @@
+"""Reproducible benchmark suite of BoardClass and the move round trip.
+
+    python -m benchmarks.suite --output results.json
+    python -m benchmarks.suite --compare benchmarks/baseline.json
+
+Runs microbenchmarks of the BoardClass methods, full random games and a
+loopback socket round trip of one move, with fixed seeds and the best of
+many short repeats. The whole suite runs --runs times and each result
+keeps its best value, with its spread: how much worse the worst run was.
+Results are written as JSON. With --compare, every result is checked
+against a stored baseline and the exit status is 1 if any of them got
+worse by more than the threshold plus the spread stored for it, so a
+noisy result needs a larger change to count as a regression.
+
+Record the baseline with more runs than the check uses, so its spread
+covers the noise of the machine:
+
+    python -m benchmarks.suite --runs 10 --output benchmarks/baseline.json
+"""
+import argparse
+import json
+import platform
+import socket
+import sys
+import threading
+import time
+import timeit
+
+import bots
+import gameboard
+import protocol
+import tracing
+
+BASELINE_PATH = "benchmarks/baseline.json"
+
+# a 3x3 position in the middle of a game, no line completed:
+#  X | O | X
+#    | O |
+#    |   | X
+MIDGAME = [("X", 0, 0), ("O", 0, 1), ("X", 0, 2), ("O", 1, 1), ("X", 2, 2)]
+
+
+def result(value, unit, better):
+    """Build one entry of the results.
+
+    Args:
+        value (float): the measurement.
+        unit (str): its unit.
+        better (str): "higher" or "lower".
+    """
+    return {"value": round(value, 3), "unit": unit, "better": better}
+
+
+def midgame_board():
+    """Build a board in the MIDGAME position.
+    """
+    game = gameboard.BoardClass()
+    game.init_player("p1", "p2")
+    for mark, r, c in MIDGAME:
+        game.updateGameBoard("p1" if mark == "X" else "p2", r, c, mark)
+    return game
+
+
+def time_call(stmt, setup, namespace, number, repeat):
+    """Time a statement.
+
+    Returns:
+        float: the best time of one execution, in nanoseconds.
+    """
+    timer = timeit.Timer(stmt, setup, globals=namespace)
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e9
+
+
+def bench_board(number, repeat):
+    """Time each BoardClass method on the MIDGAME position.
+
+    Returns:
+        dict: ns per call of each method.
+    """
+    game = midgame_board()
+    namespace = {"game": game, "empty": gameboard.BoardClass()}
+    cases = {
+        # the history of the empty board grows by `number` moves per repeat
+        "updateGameBoard": ("empty.updateGameBoard('p1', 1, 1, 'X')", "empty.resetGameBoard()"),
+        "checkLegalMove": ("game.checkLegalMove(1, 0); game.checkLegalMove(1, 1)", "pass"),
+        "isWinner": ("game.isWinner(2, 2)", "pass"),
+        "boardIsFull": ("game.boardIsFull()", "pass"),
+        "checkGameOver": ("game.checkGameOver(2, 2)", "pass"),
+        "resetGameBoard": ("empty.resetGameBoard()", "pass"),
+    }
+    results = {}
+    for name, (stmt, setup) in cases.items():
+        ns = time_call(stmt, setup, namespace, number, repeat)
+        if name == "checkLegalMove":
+            ns /= 2
+        results[f"board.{name}"] = result(ns, "ns/call", "lower")
+    return results
+
+
+def play_random_games(count, seed):
+    """Play `count` games of random legal moves on one board.
+    """
+    bot = bots.RandomBot(seed)
+    game = gameboard.BoardClass()
+    for _ in range(count):
+        game.init_player("p1", "p2")
+        game.resetGameBoard()
+        while True:
+            r, c = bot.choose_move(game)
+            name, mark = ("p2", "O") if game.moves % 2 else ("p1", "X")
+            game.updateGameBoard(name, r, c, mark)
+            if game.checkGameOver(r, c):
+                break
+    return game
+
+
+def bench_games(count, repeat, seed):
+    """Measure full games per second.
+    """
+    best = min(timeit.repeat(lambda: play_random_games(count, seed), number=1, repeat=repeat))
+    return {"game.random_games": result(count / best, "games/s", "higher")}
+
+
+def echo_moves(listener):
+    """Answer every move with the same move, like player 2's recv loop
+       followed by `handle_click`.
+    """
+    conn, _ = listener.accept()
+    reader = protocol.MessageReader(conn)
+    try:
+        while True:
+            message = reader.recv()
+            conn.sendall(protocol.encode_move(message.row, message.col))
+    except (OSError, protocol.ProtocolError):
+        pass
+    finally:
+        conn.close()
+
+
+def round_trip_samples(count):
+    """Time `count` loopback round trips of one move: sent with `sendall`
+       and read back with a MessageReader, as the players do.
+
+    Returns:
+        list: the round trips in microseconds, sorted, after a warm-up tenth.
+    """
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(1)
+    thread = threading.Thread(target=echo_moves, args=(listener,), daemon=True)
+    thread.start()
+    s = socket.create_connection(listener.getsockname())
+    reader = protocol.MessageReader(s)
+    samples = []
+    try:
+        for i in range(count + count // 10):
+            move = protocol.encode_move(i % 3, i // 3 % 3)
+            start = time.perf_counter()
+            s.sendall(move)
+            reader.recv()
+            samples.append((time.perf_counter() - start) * 1e6)
+    finally:
+        s.close()
+        thread.join()
+        listener.close()
+    # the first tenth warms up both ends
+    return sorted(samples[count // 10:])
+
+
+def bench_round_trip(count, rounds):
+    """Measure the loopback round trip of one move, the best of `rounds`
+       connections of `count` round trips each.
+    """
+    rounds = [round_trip_samples(count) for _ in range(rounds)]
+    return {
+        "net.round_trip_p50": result(min(tracing.percentile(s, 50) for s in rounds), "us", "lower"),
+        "net.round_trip_p99": result(min(tracing.percentile(s, 99) for s in rounds), "us", "lower"),
+        "net.round_trips": result(max(count / (sum(s) / 1e6) for s in rounds),
+                                  "round trips/s", "higher"),
+    }
+
+
+def run_once(args):
+    """Run every benchmark once.
+
+    Returns:
+        dict: the results by name.
+    """
+    results = {}
+    results.update(bench_board(args.number, args.repeat))
+    results.update(bench_games(args.games, args.repeat, args.seed))
+    results.update(bench_round_trip(args.round_trips, args.rounds))
+    return results
+
+
+def combine(runs):
+    """Keep the best value of each result over several runs.
+
+    Args:
+        runs (list): the results of each run, by name.
+
+    Returns:
+        dict: the results by name, each with the spread of the runs: how
+              much worse the worst value was than the best, relative to it.
+    """
+    results = {}
+    for name, entry in runs[0].items():
+        values = [run[name]["value"] for run in runs]
+        if entry["better"] == "higher":
+            best, worst = max(values), min(values)
+        else:
+            best, worst = min(values), max(values)
+        results[name] = dict(entry, value=best, spread=round(abs(worst - best) / best, 3))
+    return results
+
+
+def run_suite(args):
+    """Run every benchmark `args.runs` times.
+
+    Returns:
+        dict: the metadata of the run and the results by name.
+    """
+    results = combine([run_once(args) for _ in range(args.runs)])
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "runs": args.runs,
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, threshold):
+    """Compare results with a baseline.
+
+    Args:
+        current (dict): results of this run.
+        baseline (dict): stored results.
+        threshold (float): relative change that counts as a regression, on
+                           top of the spread stored for each result.
+
+    Returns:
+        tuple: (lines of the report, names of the regressed results).
+    """
+    lines = []
+    regressions = []
+    for name, old in sorted(baseline["results"].items()):
+        new = current["results"].get(name)
+        if new is None:
+            lines.append(f"{name:24} missing")
+            continue
+        change = (new["value"] - old["value"]) / old["value"]
+        worse = -change if old["better"] == "higher" else change
+        tolerance = threshold + old.get("spread", 0)
+        flag = ""
+        if worse > tolerance:
+            flag = "REGRESSION"
+            regressions.append(name)
+        elif worse < -tolerance:
+            flag = "improved"
+        lines.append(f"{name:24} {old['value']:14,.3f} -> {new['value']:14,.3f} {new['unit']:14}"
+                     f" {change:+7.1%} (limit {tolerance:.0%}) {flag}")
+    return lines, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", default=None, help="write the results to this JSON file")
+    parser.add_argument("--compare", nargs="?", const=BASELINE_PATH, default=None,
+                        help=f"baseline JSON to compare with, {BASELINE_PATH} by default")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative slowdown flagged as a regression, on top of the"
+                             " spread stored in the baseline")
+    parser.add_argument("--runs", type=int, default=3,
+                        help="runs of the whole suite, each result keeps the best")
+    parser.add_argument("--number", type=int, default=10000, help="calls per microbenchmark repeat")
+    parser.add_argument("--repeat", type=int, default=300)
+    parser.add_argument("--games", type=int, default=200, help="games per repeat")
+    parser.add_argument("--round-trips", type=int, default=1000, help="round trips per round")
+    parser.add_argument("--rounds", type=int, default=10, help="connections of round trips")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    current = run_suite(args)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(current, f, indent=2, sort_keys=True)
+            f.write("\n")
+    if args.compare is None:
+        for name, entry in sorted(current["results"].items()):
+            print(f"{name:24} {entry['value']:14,.3f} {entry['unit']}")
+        return
+    with open(args.compare) as f:
+        baseline = json.load(f)
+    lines, regressions = compare(current, baseline, args.threshold)
+    print("\n".join(lines))
+    if regressions:
+        print(f"{len(regressions)} regression(s) over their limit: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import tkinter as tk
+
+# the board screen of both players, built once per window: a grid of cell
+# buttons and a canvas with the turn indicator. Between games the marked
+# cells are cleared in place instead of building new widgets.
+
+
+class BoardWidget(tk.Frame):
+    """The cells of the game board and the status line under them.
+    """
+    def __init__(self, master, board_width, on_click):
+        """build the board.
+
+        Args:
+            master (Widget): the window the board is shown in.
+            board_width (int): the number of rows and columns of the board.
+            on_click (function): called with the row and column of a clicked cell.
+        """
+        super().__init__(master)
+        self.canvas = tk.Canvas(self, width=400, height=100)
+        self.turn_indicator = self.canvas.create_text(200, 15, text="", font=('Arial', 20))
+        self.info = self.canvas.create_text(200, 40, text="", font=('Arial', 10))
+        self.canvas.place(x=0, y=350)
+        self.buttons = []
+        for row in range(board_width):
+            button_row = []
+            for col in range(board_width):
+                button = tk.Button(self, text="", font=("Arial", 20), width=5, height=2,
+                                   command=lambda r=row, c=col: on_click(r, c))
+                button.grid(row=row, column=col, padx=5, pady=5)
+                button_row.append(button)
+            self.buttons.append(button_row)
+        # cells marked since the last reset, the only ones to clear
+        self.marked = []
+
+    def reset(self, status):
+        """Clear the board for a new game.
+
+        Args:
+            status (str): the text of the turn indicator.
+        """
+        for r, c in self.marked:
+            self.buttons[r][c].config(text="", state=tk.NORMAL)
+        self.marked.clear()
+        self.set_status(status)
+        self.set_info("")
+
+    def mark(self, r, c, mark):
+        """Show a mark on a cell and disable it.
+
+        Args:
+            r (int): row number
+            c (int): column number
+            mark (str): 'X' or 'O'.
+        """
+        self.buttons[r][c].config(text=mark, state=tk.DISABLED)
+        self.marked.append((r, c))
+
+    def set_status(self, text):
+        """Set the text of the turn indicator.
+        """
+        self.canvas.itemconfigure(self.turn_indicator, text=text)
+
+    def set_info(self, text):
+        """Set the small text under the turn indicator.
+        """
+        self.canvas.itemconfigure(self.info, text=text)
@@ -0,0 +1,86 @@
+import random
+
+# move pickers for players without a human at the keyboard.
+# every bot has `choose_move(game)` returning (row, col) of a legal move.
+
+
+def legal_moves(game):
+    """List the legal positions of a board.
+
+    Args:
+        game (BoardClass): the board to look at.
+
+    Returns:
+        list: (row, col) of every empty position, row by row.
+    """
+    width = game.board_width
+    # one look at the bitmasks instead of a checkLegalMove per position
+    taken = game.x_bits | game.o_bits
+    return [divmod(cell, width) for cell in range(width * width) if not taken >> cell & 1]
+
+
+class RandomBot:
+    """Plays a random legal move.
+    """
+    def __init__(self, seed=None):
+        """initialize the bot.
+
+        Args:
+            seed (int): seed of the bot's own random generator.
+        """
+        self.rng = random.Random(seed)
+
+    def choose_move(self, game):
+        return self.rng.choice(legal_moves(game))
+
+
+class ScriptedBot:
+    """Plays a fixed list of moves, skipping positions already taken,
+       then the first legal move once the script runs out.
+    """
+    def __init__(self, script):
+        """initialize the bot.
+
+        Args:
+            script (list): (row, col) moves in the order they are tried.
+        """
+        self.script = list(script)
+
+    def choose_move(self, game):
+        for r, c in self.script:
+            if game.checkLegalMove(r, c):
+                return r, c
+        return legal_moves(game)[0]
+
+
+class TableBot:
+    """Plays perfectly from the 3x3 perfect-play table.
+    """
+    def choose_move(self, game):
+        return game.bestMove()
+
+
+def parse_script(text):
+    """Parse a script like "1,1 0,0 2,2" into a list of moves.
+    """
+    return [tuple(int(x) for x in move.split(",")) for move in text.split()]
+
+
+def make_bot(kind, seed=None, script=""):
+    """Create a bot by name.
+
+    Args:
+        kind (str): "random", "scripted" or "table".
+        seed (int): seed of a random bot.
+        script (str): moves of a scripted bot, e.g. "1,1 0,0 2,2".
+
+    Returns:
+        the bot.
+    """
+    if kind == "random":
+        return RandomBot(seed)
+    if kind == "scripted":
+        return ScriptedBot(parse_script(script))
+    if kind == "table":
+        return TableBot()
+    raise ValueError(f"unknown bot {kind!r}")
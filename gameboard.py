@@ -1,12 +1,197 @@
-import tkinter as tk
+import os
+import random
+import struct
+
+BOARD_WIDTH = 3
+
+# results of `BoardClass.status`, the same codes as records.py and batch.py
+# plus a game still going on
+TIE = 0
+X_WON = 1
+O_WON = 2
+ONGOING = 3
+
+# perfect-play table of the 3x3 game, written once by `python solver.py`.
+# each record is a canonical position (x_bits | o_bits << 9) and one byte:
+# the value for the side to move plus one in the high nibble, the best move
+# on the canonical board in the low nibble.
+TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ttt_table.bin')
+TABLE_MAGIC = b'TTT1'
+TABLE_RECORD = struct.Struct('<IB')
+NO_MOVE = 0xF
+_TABLE = None
+
+# (width, win_length) -> every winning line, and the lines through each
+# cell, shared by all boards of that size
+_LINES = {}
+_CELL_LINES = {}
+# width -> Zobrist keys of the cells, shared by all boards of that width
+_ZOBRIST_KEYS = {}
+
+def _line_masks(width, win_length):
+    """Build the bitmask of every winning line of a board.
+
+    Cell (row, col) is bit `row * width + col`. A winning line is any
+    `win_length` consecutive cells along a row, a column or a diagonal.
+
+    Args:
+        width (int): the width of the board.
+        win_length (int): how many marks in a row win.
+
+    Returns:
+        tuple: one integer mask per winning line.
+    """
+    lines = []
+    for row in range(width):
+        for col in range(width):
+            for dr, dc in ((0, 1), (1, 0), (1, 1), (1, -1)):
+                end_r = row + dr * (win_length - 1)
+                end_c = col + dc * (win_length - 1)
+                if end_r < width and 0 <= end_c < width:
+                    lines.append(sum(1 << ((row + dr * i) * width + col + dc * i)
+                                     for i in range(win_length)))
+    return tuple(lines)
+
+def _winning_lines(width, win_length):
+    """Get the mask of every winning line, built once per board size.
+    """
+    key = (width, win_length)
+    if key not in _LINES:
+        _LINES[key] = _line_masks(width, win_length)
+    return _LINES[key]
+
+def _cell_lines(width, win_length):
+    """Get the winning lines going through each cell, so a win check
+       only looks at the (at most 4 * win_length) lines of the latest move.
+
+    Args:
+        width (int): the width of the board.
+        win_length (int): how many marks in a row win.
+
+    Returns:
+        tuple: for each cell index, the tuple of line masks through it.
+    """
+    key = (width, win_length)
+    if key not in _CELL_LINES:
+        masks = _winning_lines(width, win_length)
+        _CELL_LINES[key] = tuple(tuple(mask for mask in masks if mask >> cell & 1)
+                                 for cell in range(width * width))
+    return _CELL_LINES[key]
+
+def _zobrist_keys(width):
+    """Get the random 64-bit Zobrist key of each mark on each cell.
+
+    The keys come from a generator seeded with the width, so every process
+    hashes a position the same way and transposition tables can be shared.
+
+    Args:
+        width (int): the width of the board.
+
+    Returns:
+        tuple: the key of 'X' on cell i at 2 * i, of 'O' at 2 * i + 1.
+    """
+    if width not in _ZOBRIST_KEYS:
+        rng = random.Random(width)
+        _ZOBRIST_KEYS[width] = tuple(rng.getrandbits(64) for _ in range(2 * width * width))
+    return _ZOBRIST_KEYS[width]
+
+def _symmetries(width):
+    """Build the cell permutations of the 8 symmetries of a square board.
+
+    Args:
+        width (int): the width of the board.
+
+    Returns:
+        tuple: for each rotation and reflection, the cell each cell moves to.
+    """
+    perms = []
+    for rotations in range(4):
+        for flip in (False, True):
+            perm = []
+            for cell in range(width * width):
+                r, c = divmod(cell, width)
+                if flip:
+                    c = width - 1 - c
+                for _ in range(rotations):
+                    r, c = c, width - 1 - r
+                perm.append(r * width + c)
+            perms.append(tuple(perm))
+    return tuple(perms)
+
+def _mask_images(perm):
+    """Build the image of every mask of a 3x3 board under a symmetry.
+
+    Args:
+        perm (tuple): the cell each cell moves to.
+
+    Returns:
+        list: images[mask] is the mask moved by the symmetry.
+    """
+    images = [0] * (1 << 9)
+    for mask in range(1, 1 << 9):
+        low = mask & -mask
+        images[mask] = images[mask ^ low] | 1 << perm[low.bit_length() - 1]
+    return images
+
+SYMMETRIES = _symmetries(3)
+# the image of every mask under each symmetry, so a side is moved in one lookup
+_MASK_IMAGES = tuple(_mask_images(perm) for perm in SYMMETRIES)
+
+def canonical(x_bits, o_bits):
+    """Fold the 8 symmetries of a 3x3 position.
+
+    Args:
+        x_bits (int): the cells of 'X'.
+        o_bits (int): the cells of 'O'.
+
+    Returns:
+        tuple: (key, symmetry). key is the smallest `x | o << 9` over the
+               symmetries, symmetry the index in SYMMETRIES that gives it.
+    """
+    best = None
+    for i, images in enumerate(_MASK_IMAGES):
+        key = images[x_bits] | images[o_bits] << 9
+        if best is None or key < best:
+            best, symmetry = key, i
+    return best, symmetry
+
+def _load_table():
+    """Load the perfect-play table on first use.
+
+    Returns:
+        dict: canonical key -> packed value and best move.
+    """
+    global _TABLE
+    if _TABLE is None:
+        with open(TABLE_PATH, 'rb') as f:
+            data = f.read()
+        if data[:len(TABLE_MAGIC)] != TABLE_MAGIC:
+            raise ValueError(f"{TABLE_PATH} is not a perfect-play table")
+        _TABLE = dict(TABLE_RECORD.iter_unpack(data[len(TABLE_MAGIC):]))
+    return _TABLE
 
 class BoardClass:
+
+    # the board is kept as one bitmask per mark instead of a list of lists,
+    # so many boards stay small and every check is a few integer operations.
+    #
+    # search uses `push`, `pop` and `status` instead of `updateGameBoard` and
+    # `checkGameOver`: they only change the position, never the players or
+    # the counters, and `history` is their undo stack. `zobrist` hashes the
+    # position: `push` and `pop` keep it up to date, while the game path
+    # (`updateGameBoard`, `resetGameBoard`) only marks it stale, to be
+    # computed from the bitmasks when next read.
+    __slots__ = ('player1_name', 'player2_name', 'my_name', 'last_player',
+                 'imWinner', 'isTie', 'wins', 'ties', 'losses', 'games_played',
+                 'board_width', 'win_length', 'moves', 'cell_lines',
+                 'x_bits', 'o_bits', 'history', '_zobrist', 'zobrist_keys')
     
-    def __init__(self):
+    def __init__(self, board_width=BOARD_WIDTH, win_length=None):
         """initialize the board class.
 
         Args:
-            my_name (String): name of the player who has the board object.
+            board_width (int): the number of rows and columns of the board.
+            win_length (int): how many marks in a row win, the board width by default.
         """   
         self.player1_name = None
         self.player2_name = None     
@@ -18,8 +203,57 @@ class BoardClass:
         self.ties = 0
         self.losses = 0
         self.games_played = 0
-        self.board_width = 3
-        self.game_board = [[' ' for _ in range(self.board_width)] for _ in range(3)]
+        self.board_width = board_width
+        self.win_length = win_length or board_width
+        if not 0 < self.win_length <= board_width:
+            raise ValueError(f"win length {self.win_length} does not fit a {board_width}x{board_width} board")
+        self.cell_lines = _cell_lines(board_width, self.win_length)
+        self.moves = 0
+        self.x_bits = 0
+        self.o_bits = 0
+        # cells played this game, in order, as row * board_width + col
+        self.history = []
+        self.zobrist_keys = _zobrist_keys(board_width)
+        # None until computed, see `zobrist`
+        self._zobrist = None
+
+    @property
+    def zobrist(self):
+        """The Zobrist hash of the position, computed from the bitmasks when
+           stale. Set it to None after changing the bitmasks directly.
+        """
+        if self._zobrist is None:
+            keys = self.zobrist_keys
+            zobrist = 0
+            for bits, mark in ((self.x_bits, 0), (self.o_bits, 1)):
+                while bits:
+                    low = bits & -bits
+                    zobrist ^= keys[2 * (low.bit_length() - 1) + mark]
+                    bits ^= low
+            self._zobrist = zobrist
+        return self._zobrist
+
+    @zobrist.setter
+    def zobrist(self, value):
+        self._zobrist = value
+
+    @property
+    def game_board(self):
+        """The board as rows of ' ', 'X' and 'O', built from the bitmasks.
+        """
+        board = []
+        for row in range(self.board_width):
+            board_row = []
+            for col in range(self.board_width):
+                bit = 1 << (row * self.board_width + col)
+                if self.x_bits & bit:
+                    board_row.append('X')
+                elif self.o_bits & bit:
+                    board_row.append('O')
+                else:
+                    board_row.append(' ')
+            board.append(board_row)
+        return board
     
     def init_player(self, myName, lastName):
         """initialize the player names
@@ -50,7 +284,12 @@ class BoardClass:
         """Resets the game board.
         """
         self.imWinner = False
-        self.game_board = [[' ' for _ in range(self.board_width)] for _ in range(self.board_width)]
+        self.isTie = False
+        self.moves = 0
+        self.x_bits = 0
+        self.o_bits = 0
+        self.history.clear()
+        self._zobrist = 0
     
     def updateGameBoard(self, my_name, row, col, mark):
         """Updates the game board with the player's move.
@@ -65,9 +304,99 @@ class BoardClass:
             mark (character): 'X' ro 'O'.
         """
         
-        self.game_board[row][col] = mark
+        cell = row * self.board_width + col
+        bit = 1 << cell
+        if mark == 'X':
+            self.x_bits |= bit
+        else:
+            self.o_bits |= bit
+        self.moves += 1
+        self.history.append(cell)
         self.last_player = my_name
+        self._zobrist = None
         
+    def restoreGameBoard(self, cells, last_player):
+        """Put back the board of a game from the cells played so far.
+
+        Args:
+            cells (list): the cells played, 'X' first, as row * board_width + col.
+            last_player (string): the player who made the last move.
+        """
+        self.resetGameBoard()
+        for cell in cells:
+            self.push(cell)
+        self.last_player = last_player
+
+    def push(self, cell):
+        """Play the next mark ('X' first) on an empty cell, for search.
+
+        Unlike `updateGameBoard`, only the position changes: not the last
+        player nor any counter. Undo it with `pop`.
+
+        Args:
+            cell (int): the cell, row * board_width + col, which must be empty.
+        """
+        zobrist = self._zobrist
+        if self.moves & 1:
+            self.o_bits |= 1 << cell
+            if zobrist is not None:
+                self._zobrist = zobrist ^ self.zobrist_keys[2 * cell + 1]
+        else:
+            self.x_bits |= 1 << cell
+            if zobrist is not None:
+                self._zobrist = zobrist ^ self.zobrist_keys[2 * cell]
+        self.moves += 1
+        self.history.append(cell)
+
+    def pop(self):
+        """Take back the latest move, pushed or played.
+
+        Returns:
+            int: the cell of the move.
+        """
+        cell = self.history.pop()
+        bit = 1 << cell
+        zobrist = self._zobrist
+        if self.x_bits & bit:
+            self.x_bits ^= bit
+            if zobrist is not None:
+                self._zobrist = zobrist ^ self.zobrist_keys[2 * cell]
+        else:
+            self.o_bits ^= bit
+            if zobrist is not None:
+                self._zobrist = zobrist ^ self.zobrist_keys[2 * cell + 1]
+        self.moves -= 1
+        return cell
+
+    def status(self):
+        """Get the result of the position, without counting it anywhere.
+
+        Only the lines through the latest move are checked, as a game stops
+        at the first win; a board without history, set up from its
+        bitmasks, has every line checked.
+
+        Returns:
+            int: X_WON, O_WON, TIE or ONGOING.
+        """
+        if self.history:
+            cell = self.history[-1]
+            if self.x_bits >> cell & 1:
+                bits, won = self.x_bits, X_WON
+            else:
+                bits, won = self.o_bits, O_WON
+            for mask in self.cell_lines[cell]:
+                if bits & mask == mask:
+                    return won
+        else:
+            for mask in _winning_lines(self.board_width, self.win_length):
+                if self.x_bits & mask == mask:
+                    return X_WON
+                if self.o_bits & mask == mask:
+                    return O_WON
+        if self.moves >= self.board_width * self.board_width:
+            return TIE
+        return ONGOING
+
     def checkLegalMove(self, r, c):
         """check if the position is legal
     
@@ -83,7 +412,7 @@ class BoardClass:
                      Otherwise returns False.
         """
         if r >= 0 and r < self.board_width and c >= 0 and c < self.board_width:
-            if (self.game_board[r][c] == ' '):
+            if not (self.x_bits | self.o_bits) >> (r * self.board_width + c) & 1:
                 return True
         return False
     
@@ -110,7 +439,7 @@ class BoardClass:
         """Check if the latest move resulted in a win.
         
         Check if the latest move resulted in a win, i.e. the latest player gets
-        3 of its game pieces aligned.
+        `win_length` of its game pieces aligned.
         Also, if winner exists, update the win or lose counts accordingly.
 
         Args:
@@ -122,31 +451,14 @@ class BoardClass:
                      Otherwise returns false.
         """
         
-        mark = self.game_board[row][col]
+        cell = row * self.board_width + col
+        bits = self.x_bits if self.x_bits >> cell & 1 else self.o_bits
         win = False
-        if (
-            self.game_board[row][0] == mark and
-            self.game_board[row][1] == mark and
-            self.game_board[row][2] == mark
-        ) or (
-            self.game_board[0][col] == mark and
-            self.game_board[1][col] == mark and
-            self.game_board[2][col] == mark
-        ):
-            win = True
-        
-        if (row == col) :
-            if (self.game_board[0][0] == mark and
-                self.game_board[1][1] == mark and
-                self.game_board[2][2] == mark):
-                win = True
-
-        
-        if (row + col == self.board_width - 1):
-            if (self.game_board[0][2] == mark and
-                self.game_board[1][1] == mark and
-                self.game_board[2][0] == mark):
+        # only the lines through the latest move can have been completed
+        for mask in self.cell_lines[cell]:
+            if bits & mask == mask:
                 win = True
+                break
         # if winner appears, update wins or losses count
         if win:
             if self.isMyself():
@@ -169,9 +481,8 @@ class BoardClass:
                      Otherwise, returns False.
         """
         
-        for row in self.game_board:
-            if ' ' in row:
-                return False
+        if self.moves < self.board_width * self.board_width:
+            return False
             
         # updates the ties count and game_played
         self.ties += 1
@@ -215,4 +526,49 @@ class BoardClass:
               f"Ties Number: {self.ties}\n"
               
         return str
+   
+    def isSolved(self):
+        """Check if the perfect-play table covers this board,
+           i.e. if `bestMove` and `evaluate` can be used.
+
+        Returns:
+            boolean: True for the 3x3, three-in-a-row game.
+        """
+        return self.board_width == 3 and self.win_length == 3
+
+    def _lookup(self):
+        """Find the table record of the current position.
+
+        Returns:
+            tuple: (packed record, index of the symmetry to the canonical board).
+        """
+        if not self.isSolved():
+            raise ValueError("perfect play is only known for the 3x3 game")
+        key, symmetry = canonical(self.x_bits, self.o_bits)
+        try:
+            return _load_table()[key], symmetry
+        except KeyError:
+            raise ValueError("the position cannot be reached in a game") from None
+
+    def evaluate(self):
+        """Evaluate the position with perfect play from both sides.
+
+        Returns:
+            int: 1 if the side to move wins, 0 for a tie, -1 if it loses.
+        """
+        packed, _ = self._lookup()
+        return (packed >> 4) - 1
+
+    def bestMove(self):
+        """Get a best move for the side to move ('X' moves first).
+
+        Returns:
+            tuple: (row, col) of the move, None if the game is over.
+        """
+        packed, symmetry = self._lookup()
+        cell = packed & NO_MOVE
+        if cell == NO_MOVE:
+            return None
+        # move the cell from the canonical board back to this one
+        return divmod(SYMMETRIES[symmetry].index(cell), self.board_width)
    
\ No newline at end of file
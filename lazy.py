@@ -0,0 +1,28 @@
+import importlib.util
+import sys
+
+# modules that are only executed when first used, so that importing the
+# players or the widgets does not load Tk until a window is opened.
+
+
+def module(name):
+    """Import a module lazily.
+
+    Args:
+        name (str): the full name of the module.
+
+    Returns:
+        module: the module, executed on its first attribute access.
+                An already imported module is returned as is.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    lazy = importlib.util.module_from_spec(spec)
+    sys.modules[name] = lazy
+    loader.exec_module(lazy)
+    return lazy
@@ -0,0 +1,357 @@
+import argparse
+import asyncio
+import time
+from collections import Counter
+
+import bots
+import gameboard
+import protocol
+import tracing
+import transport
+
+# headless load generator: many bot clients playing as player 1 ('X/x')
+# against a player 2 host, using the same messages as player1.py. Against
+# the lobby, the clients are paired with each other and play either mark;
+# each game and move is then counted by the client playing 'X'. With
+# --multiplex, each connection carries that many games at once. With
+# --drop-every, clients drop their connection after that many of their
+# moves and resume the session with its token. A host of "unix:PATH" plays
+# over a Unix domain socket, see transport.py.
+
+# tries of a resume the server refuses because it has not yet seen the old
+# connection drop, and the seconds between them
+RESUME_ATTEMPTS = 5
+RESUME_RETRY_DELAY = 0.01
+
+
+class LoadStats:
+    """Counters and latencies collected by every bot client.
+    """
+    def __init__(self):
+        """initialize the counters.
+        """
+        self.connections = 0
+        self.games = 0
+        self.moves = 0
+        self.errors = Counter()
+        self.connect_ms = []
+        self.handshake_ms = []
+        self.move_ms = []
+        self.resume_ms = []
+        self.resume_retries = 0
+
+    def report(self, elapsed):
+        """Format the results of a run.
+
+        Args:
+            elapsed (float): duration of the run in seconds.
+
+        Returns:
+            str: throughput, errors and latency percentiles.
+        """
+        elapsed = max(elapsed, 1e-9)
+        errors = ", ".join(f"{name}={count}" for name, count in sorted(self.errors.items()))
+        resumes = ""
+        if self.resume_ms:
+            resumes = (f"resumes: {len(self.resume_ms)} ({self.resume_retries} retried)\n"
+                       f"{tracing.summarize('reconnect to playable', self.resume_ms)}\n")
+        return (f"elapsed: {elapsed:.2f}s\n"
+                f"connections: {self.connections} ({self.connections / elapsed:.1f}/sec)\n"
+                f"games: {self.games} ({self.games / elapsed:.1f}/sec)\n"
+                f"moves: {self.moves} ({self.moves / elapsed:.1f}/sec)\n"
+                f"errors: {sum(self.errors.values())} {errors}\n"
+                f"{tracing.summarize('connect', self.connect_ms)}\n"
+                f"{tracing.summarize('handshake', self.handshake_ms)}\n"
+                f"{tracing.summarize('move round trip', self.move_ms)}\n"
+                + resumes)
+
+
+async def resume(host, port, token, stats):
+    """Reconnect and resume a dropped session: one round trip, Resume
+       answered by State, once connected.
+
+    Returns:
+        tuple: (AsyncMessageReader, StreamWriter, State) of the new connection.
+    """
+    start = time.perf_counter()
+    for _ in range(RESUME_ATTEMPTS):
+        stream, writer = await transport.open_connection(host, port)
+        writer.write(protocol.encode_resume(token))
+        reader = protocol.AsyncMessageReader(stream, writer)
+        try:
+            message = await reader.recv()
+        except ConnectionError:
+            writer.close()
+            raise
+        if isinstance(message, protocol.State):
+            stats.resume_ms.append((time.perf_counter() - start) * 1000)
+            return reader, writer, message
+        writer.close()
+        if not (isinstance(message, protocol.Error) and message.code == protocol.NO_SESSION):
+            raise protocol.ProtocolError(f"expected the session state, got {message!r}")
+        stats.resume_retries += 1
+        await asyncio.sleep(RESUME_RETRY_DELAY)
+    raise ConnectionError("the session could not be resumed")
+
+
+async def play_client(host, port, name, bot, games, move_delay, stats, drop_every=0):
+    """Connect, send the name, then play `games` games as player 1, asking
+       for a rematch after each game but the last, mirroring player1.py's
+       `get_username`, `handle_click` and `get_play_again`. When the lobby
+       pairs the bot to play 'O', it plays until its opponent quits.
+
+    Args:
+        host (str): ip address of the player 2 host.
+        port (int): port of the player 2 host.
+        name (str): the bot's player name.
+        bot: picks the bot's moves.
+        games (int): number of games to play.
+        move_delay (float): seconds to wait before each move.
+        stats (LoadStats): where the results are collected.
+        drop_every (int): drop the connection after this many of the bot's
+                          moves and resume the session, 0 to never drop.
+    """
+    start = time.perf_counter()
+    stream, writer = await transport.open_connection(host, port)
+    connected = time.perf_counter()
+    stats.connections += 1
+    stats.connect_ms.append((connected - start) * 1000)
+    token = None
+    # moves of the opponent learned from a resumed session's state
+    missed = []
+    sent_moves = 0
+    try:
+        reader = protocol.AsyncMessageReader(stream, writer)
+        writer.write(protocol.encode_hello(name))
+        message = await reader.recv()
+        board_width, win_length = gameboard.BOARD_WIDTH, None
+        if isinstance(message, protocol.Board):
+            # a player2 host set up another board than the 3x3 game, before its name
+            board_width, win_length = message
+            message = await reader.recv()
+        stats.handshake_ms.append((time.perf_counter() - connected) * 1000)
+        if isinstance(message, protocol.Match):
+            opponent, mark = message.opponent, message.mark
+        else:
+            opponent, mark = message.name, "X"
+        other_mark = "O" if mark == "X" else "X"
+        counted = mark == "X"
+
+        game = gameboard.BoardClass(board_width, win_length)
+        game.set_player_name(name, opponent)
+        played = 0
+        while True:
+            game.init_player(name, opponent if mark == "X" else name)
+            game.resetGameBoard()
+            sent = None
+            my_turn = mark == "X"
+            while True:
+                if my_turn:
+                    if move_delay:
+                        await asyncio.sleep(move_delay)
+                    r, c = bot.choose_move(game)
+                    game.updateGameBoard(name, r, c, mark)
+                    sent = time.perf_counter()
+                    writer.write(protocol.encode_move(r, c))
+                    sent_moves += 1
+                elif missed:
+                    r, c = divmod(missed.pop(0), game.board_width)
+                    game.updateGameBoard(opponent, r, c, other_mark)
+                else:
+                    message = await reader.recv()
+                    if isinstance(message, protocol.Token):
+                        token = message.token
+                        message = await reader.recv()
+                    if isinstance(message, protocol.Error):
+                        raise protocol.ProtocolError(message.text)
+                    if isinstance(message, protocol.Quit):
+                        raise ConnectionError(f"{opponent} left during the game")
+                    if sent is not None:
+                        stats.move_ms.append((time.perf_counter() - sent) * 1000)
+                    r, c = message
+                    game.updateGameBoard(opponent, r, c, other_mark)
+                stats.moves += counted
+                if game.checkGameOver(r, c):
+                    break
+                if my_turn and token is not None and drop_every and sent_moves % drop_every == 0:
+                    writer.close()
+                    reader, writer, state = await resume(host, port, token, stats)
+                    sent = None
+                    if tuple(state.moves[:len(game.history)]) != tuple(game.history):
+                        # the move was lost with the connection: play on from the server's board
+                        game.restoreGameBoard(state.moves, opponent)
+                        stats.moves -= counted
+                        continue
+                    missed = list(state.moves[len(game.history):])
+                my_turn = not my_turn
+            stats.games += counted
+            played += 1
+            if mark == "X":
+                again = played < games
+                writer.write(protocol.encode_rematch() if again else protocol.encode_quit())
+            else:
+                again = isinstance(await reader.recv(), protocol.Rematch)
+            if not again:
+                break
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+async def play_mux_client(host, port, name, bot, sessions, games, stats):
+    """Connect and play `games` games in each of `sessions` sessions
+       multiplexed over the one connection, all at the same time. The
+       answers to every message received together are sent with one write.
+
+    Args:
+        host (str): ip address of the player 2 host.
+        port (int): port of the player 2 host.
+        name (str): the bot's player name, suffixed with each session id.
+        bot: picks the bot's moves.
+        sessions (int): number of simultaneous sessions.
+        games (int): number of games to play in each session.
+        stats (LoadStats): where the results are collected.
+    """
+    start = time.perf_counter()
+    stream, writer = await transport.open_connection(host, port)
+    connected = time.perf_counter()
+    stats.connections += 1
+    stats.connect_ms.append((connected - start) * 1000)
+    # session id -> its board, games played and time of the last move sent
+    boards = {}
+    played = {}
+    sent = {}
+    out = []
+
+    def move(session, game):
+        """Play the bot's move in a session.
+        """
+        r, c = bot.choose_move(game)
+        game.updateGameBoard(game.my_name, r, c, "X")
+        stats.moves += 1
+        sent[session] = time.perf_counter()
+        out.append(protocol.encode_mux(session, protocol.encode_move(r, c)))
+        if game.checkGameOver(r, c):
+            finish(session, game)
+
+    def finish(session, game):
+        """Count a finished game, then ask for the next one or quit.
+        """
+        stats.games += 1
+        played[session] += 1
+        if played[session] < games:
+            out.append(protocol.encode_mux(session, protocol.encode_rematch()))
+            game.init_player(game.my_name, game.player2_name)
+            game.resetGameBoard()
+            move(session, game)
+        else:
+            out.append(protocol.encode_mux(session, protocol.encode_quit()))
+            del boards[session]
+
+    try:
+        reader = protocol.AsyncMessageReader(stream, writer)
+        for session in range(1, sessions + 1):
+            boards[session] = None
+            played[session] = 0
+            out.append(protocol.encode_mux(session, protocol.encode_hello(f"{name}.{session}")))
+        writer.write(b"".join(out))
+        out.clear()
+        while boards:
+            for message in await reader.recv_batch():
+                if not isinstance(message, protocol.Mux):
+                    raise protocol.ProtocolError(f"expected a session message, got {message!r}")
+                session, message = message
+                if isinstance(message, protocol.Error):
+                    raise protocol.ProtocolError(message.text)
+                if isinstance(message, protocol.Quit):
+                    raise ConnectionError(f"session {session} closed by the host")
+                if isinstance(message, protocol.Hello):
+                    stats.handshake_ms.append((time.perf_counter() - connected) * 1000)
+                    game = boards[session] = gameboard.BoardClass()
+                    game.set_player_name(f"{name}.{session}", message.name)
+                    game.init_player(game.player1_name, message.name)
+                    game.resetGameBoard()
+                    move(session, game)
+                    continue
+                game = boards[session]
+                stats.move_ms.append((time.perf_counter() - sent[session]) * 1000)
+                r, c = message
+                game.updateGameBoard(game.player2_name, r, c, "O")
+                stats.moves += 1
+                if game.checkGameOver(r, c):
+                    finish(session, game)
+                else:
+                    move(session, game)
+            writer.write(b"".join(out))
+            out.clear()
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+async def run_client(args, index, stats):
+    """Run one bot client, counting its failure instead of raising it.
+    """
+    bot = bots.make_bot(args.bot, seed=None if args.seed is None else args.seed + index,
+                        script=args.script)
+    move_delay = 1 / args.rate if args.rate else 0
+    try:
+        if args.multiplex:
+            await play_mux_client(args.host, args.port, f"bot{index}", bot, args.multiplex,
+                                  args.games, stats)
+        else:
+            await play_client(args.host, args.port, f"bot{index}", bot, args.games, move_delay, stats,
+                              args.drop_every)
+    except Exception as e:
+        stats.errors[type(e).__name__] += 1
+
+
+async def run_load(args):
+    """Run every client, starting `args.ramp` new connections per second
+       (all at once if 0).
+
+    Returns:
+        tuple: the LoadStats and the elapsed seconds.
+    """
+    stats = LoadStats()
+    start = time.perf_counter()
+    tasks = []
+    for i in range(args.connections):
+        if args.ramp:
+            await asyncio.sleep(max(start + i / args.ramp - time.perf_counter(), 0))
+        tasks.append(asyncio.create_task(run_client(args, i, stats)))
+    await asyncio.gather(*tasks)
+    return stats, time.perf_counter() - start
+
+
+def main(argv=None):
+    """run the load generator.
+    """
+    parser = argparse.ArgumentParser(description="Simulate many player 1 clients.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--connections", type=int, default=100,
+                        help="number of concurrent bot clients")
+    parser.add_argument("--games", type=int, default=10, help="games played by each client")
+    parser.add_argument("--rate", type=float, default=0,
+                        help="moves per second of each client, 0 for as fast as possible")
+    parser.add_argument("--ramp", type=float, default=0,
+                        help="new connections per second, 0 to open them all at once")
+    parser.add_argument("--bot", choices=("random", "scripted", "table"), default="random")
+    parser.add_argument("--script", default="1,1 0,0 0,2 2,0 2,2 0,1 1,0 1,2 2,1",
+                        help="moves of the scripted bot")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--multiplex", type=int, default=0,
+                        help="games played at once over each connection, 0 for one game"
+                             " on a plain connection (--rate is not applied)")
+    parser.add_argument("--drop-every", type=int, default=0,
+                        help="drop the connection after this many moves of each client and"
+                             " resume the session, 0 to never drop")
+    args = parser.parse_args(argv)
+
+    stats, elapsed = asyncio.run(run_load(args))
+    print(stats.report(elapsed), end="")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,468 @@
+import argparse
+import asyncio
+import time
+from collections import deque
+
+import gameboard
+import protocol
+import records
+import server
+import spectators
+import stats_store
+import tracing
+import transport
+
+# matchmaking lobby: players connect, send their name like player1.py's
+# `get_username`, wait in a queue and are paired with another waiting
+# player. The lobby then referees the match, passing each move on to the
+# opponent. Every connection is served from one asyncio event loop.
+#
+# a player paired after waiting the longest plays 'X' and decides on the
+# rematch, like player 1 of a direct game. Spectators may watch any match,
+# see spectators.py. A --host of "unix:PATH" listens on a Unix domain
+# socket, see transport.py.
+#
+# a paired player's connection is read for the whole match, not only on
+# their turn, so the Pings of the player waiting for a move are answered
+# and a player who leaves is noticed at once. The phases have the
+# deadlines of server.py: DEADLINES.handshake to send the name,
+# DEADLINES.move for each move and DEADLINES.rematch for 'X' to decide on
+# another game, or the match ends with a TIMEOUT error. A player quiet
+# for the heartbeat interval gets a Ping, and one quiet for the heartbeat
+# timeout is taken for dead and the match ends.
+
+# pairing modes
+FIFO = "fifo"
+RATING = "rating"
+
+# ratings are deciles of the lifetime win rate; players with fewer games
+# than this are put in the middle
+MIN_RATED_GAMES = 5
+MIDDLE_BUCKET = 5
+BUCKETS = 11
+
+# samples of pairing latency kept for the report
+LATENCY_SAMPLES = 100000
+
+
+class Ticket:
+    """A player waiting in the lobby.
+    """
+    __slots__ = ("name", "reader", "writer", "bucket", "enqueued", "watch", "done", "inbox", "pump")
+
+    def __init__(self, name, reader, writer, bucket):
+        """initialize the ticket.
+
+        Args:
+            name (str): the player's name.
+            reader (AsyncMessageReader): reader of the player's messages.
+            writer (StreamWriter): stream to send messages to the player.
+            bucket (int): the queue the player waits in.
+        """
+        self.name = name
+        self.reader = reader
+        self.writer = writer
+        self.bucket = bucket
+        self.enqueued = time.perf_counter()
+        # reads the connection while waiting, to notice players who leave;
+        # cancelled when the player is paired
+        self.watch = None
+        # set when the match of a paired player is over
+        self.done = asyncio.get_running_loop().create_future()
+        # the player's messages during the match, read by `pump`; an error
+        # ending the match is queued in place of a message
+        self.inbox = asyncio.Queue()
+        self.pump = None
+
+
+class LobbyStats:
+    """Counters of the lobby.
+    """
+    def __init__(self):
+        """initialize the counters.
+        """
+        self.started = time.perf_counter()
+        self.connections = 0
+        self.waiting = 0
+        self.peak_waiting = 0
+        self.left_waiting = 0
+        self.matches = 0
+        self.active_matches = 0
+        self.spectators = 0
+        self.games = 0
+        self.moves = 0
+        self.pair_ms = deque(maxlen=LATENCY_SAMPLES)
+
+    def computeStats(self):
+        """compute the stats of the lobby, like `ServerStats.computeStats`.
+        """
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        str = f"Connections: {self.connections}\n"+\
+              f"Waiting: {self.waiting} (peak {self.peak_waiting}, left {self.left_waiting})\n"+\
+              f"Matches: {self.matches} ({self.active_matches} active)\n"+\
+              f"Spectators: {self.spectators}\n"+\
+              f"Games Played: {self.games}\n"+\
+              f"Games/sec: {self.games / elapsed:.1f}\n"+\
+              f"Moves/sec: {self.moves / elapsed:.1f}\n"+\
+              f"{tracing.summarize('pairing', sorted(self.pair_ms))}\n"
+        return str
+
+
+class Lobby:
+    """Pairs waiting players and referees their matches.
+    """
+    def __init__(self, host, port, mode=FIFO, spread=1, store=None, recorder=None,
+                 deadlines=server.DEADLINES):
+        """initialize the lobby.
+
+        Args:
+            host (str): ip address to listen on.
+            port (int): port to listen on, 0 picks a free one.
+            mode (str): FIFO pairs in order of arrival, RATING pairs players
+                        of close lifetime win rates.
+            spread (int): how many rating buckets apart two players may be.
+            store (StatsStore): where results are persisted and ratings come
+                                from, if anywhere.
+            recorder (GameRecorder): where finished games are recorded, if anywhere.
+            deadlines (Deadlines): seconds players have for each phase, and
+                                   the heartbeat interval and timeout, see
+                                   server.Deadlines.
+        """
+        self.host = host
+        self.port = port
+        self.mode = mode
+        self.spread = spread if mode == RATING else 0
+        self.store = store
+        self.recorder = recorder
+        self.deadlines = deadlines
+        self.stats = LobbyStats()
+        self.spectators = spectators.Spectators()
+        # one queue per rating bucket, a single one in FIFO mode. Players
+        # who leave stay queued and are skipped when they reach the front.
+        self.queues = [deque() for _ in range(BUCKETS if mode == RATING else 1)]
+        self.server = None
+
+    def bucket(self, name):
+        """Get the queue a player waits in.
+        """
+        if self.mode != RATING:
+            return 0
+        if self.store is None:
+            return MIDDLE_BUCKET
+        lifetime = self.store.lifetime(name)
+        if lifetime.games_played < MIN_RATED_GAMES:
+            return MIDDLE_BUCKET
+        return lifetime.wins * (BUCKETS - 1) // lifetime.games_played
+
+    def pop_opponent(self, bucket):
+        """Take the longest waiting player from the closest bucket.
+
+        Args:
+            bucket (int): the bucket of the player looking for an opponent.
+
+        Returns:
+            Ticket: the opponent, None if nobody suitable is waiting.
+        """
+        for distance in range(self.spread + 1):
+            for b in (bucket - distance, bucket + distance) if distance else (bucket,):
+                if 0 <= b < len(self.queues):
+                    queue = self.queues[b]
+                    while queue:
+                        ticket = queue.popleft()
+                        if not ticket.watch.done():
+                            return ticket
+        return None
+
+    def join(self, ticket):
+        """Pair a new player or queue them.
+
+        Args:
+            ticket (Ticket): the new player.
+
+        Returns:
+            Ticket: the opponent, None if the player was queued.
+        """
+        opponent = self.pop_opponent(ticket.bucket)
+        if opponent is None:
+            self.queues[ticket.bucket].append(ticket)
+            self.stats.waiting += 1
+            self.stats.peak_waiting = max(self.stats.peak_waiting, self.stats.waiting)
+            return None
+        self.stats.waiting -= 1
+        now = time.perf_counter()
+        self.stats.pair_ms.append((now - opponent.enqueued) * 1000)
+        self.stats.pair_ms.append((now - ticket.enqueued) * 1000)
+        return opponent
+
+    async def start(self):
+        """Start listening. The bound port is stored in `self.port`.
+        """
+        self.server = await transport.start_server(self.handle_connection, self.host, self.port,
+                                                   backlog=4096)
+        if transport.kind(self.host) == transport.TCP:
+            self.port = self.server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self, report_interval=0):
+        """Start listening and serve until cancelled.
+
+        Args:
+            report_interval (float): seconds between stats printed, 0 for none.
+        """
+        if self.server is None:
+            await self.start()
+        reporter = asyncio.create_task(self.report(report_interval)) if report_interval else None
+        try:
+            async with self.server:
+                await self.server.serve_forever()
+        finally:
+            if reporter is not None:
+                reporter.cancel()
+            self.flush()
+
+    async def report(self, interval):
+        """Print the stats and write the queued results every `interval` seconds.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            self.flush()
+            print(self.stats.computeStats(), flush=True)
+
+    def flush(self):
+        """Write the queued results and game records.
+        """
+        if self.store is not None:
+            self.store.flush()
+        if self.recorder is not None:
+            self.recorder.flush()
+
+    async def handle_connection(self, reader, writer):
+        """Queue a new player until they are paired, then play the match
+           if the opponent was waiting, or wait for it to end otherwise.
+           Spectators watch their match instead.
+
+        Args:
+            reader (StreamReader): stream to receive the player's messages.
+            writer (StreamWriter): stream to send messages to the player.
+        """
+        self.stats.connections += 1
+        try:
+            message_reader = protocol.AsyncMessageReader(reader, writer)
+            try:
+                message = await asyncio.wait_for(message_reader.recv(), self.deadlines.handshake)
+            except asyncio.TimeoutError:
+                writer.write(protocol.encode_error(protocol.TIMEOUT, "handshake"))
+                return
+            if isinstance(message, protocol.Watch):
+                self.stats.spectators += 1
+                await self.spectators.watch(message.game_id, message_reader, writer)
+                return
+            if not isinstance(message, protocol.Hello):
+                raise protocol.ProtocolError(f"expected a name, got {message!r}")
+            ticket = Ticket(message.name, message_reader, writer, self.bucket(message.name))
+            ticket.watch = asyncio.ensure_future(message_reader.recv())
+            opponent = self.join(ticket)
+            if opponent is None:
+                await asyncio.wait((ticket.watch,))
+                if not ticket.watch.cancelled():
+                    # left, or spoke out of turn, while waiting
+                    ticket.watch.exception()
+                    self.stats.waiting -= 1
+                    self.stats.left_waiting += 1
+                    return
+                await ticket.done
+            else:
+                ticket.watch.cancel()
+                opponent.watch.cancel()
+                try:
+                    await self.play_match(opponent, ticket)
+                finally:
+                    # already cancelled if the lobby is shutting down
+                    if not opponent.done.done():
+                        opponent.done.set_result(None)
+        except (ConnectionError, protocol.ProtocolError):
+            pass
+        finally:
+            writer.close()
+
+    async def play_match(self, x, o):
+        """Referee games between two paired players until 'X' quits or
+           either player leaves.
+
+        Args:
+            x (Ticket): the player who waited the longest, playing 'X'.
+            o (Ticket): the other player, playing 'O'.
+        """
+        self.stats.matches += 1
+        self.stats.active_matches += 1
+        x.writer.write(protocol.encode_match(o.name, "X"))
+        o.writer.write(protocol.encode_match(x.name, "O"))
+        game = gameboard.BoardClass()
+        game.set_player_name(x.name, o.name)
+        channel = self.spectators.open(game)
+        heartbeat = None
+        try:
+            # both connections stop being watched before the match reads them
+            await asyncio.wait((x.watch, o.watch))
+            x.pump = asyncio.ensure_future(self.pump(x, o))
+            o.pump = asyncio.ensure_future(self.pump(o, x))
+            heartbeat = asyncio.ensure_future(self.heartbeat(x, o))
+            while True:
+                game.init_player(x.name, o.name)
+                game.resetGameBoard()
+                channel.start_game()
+                await self.play_game(game, channel, x, o)
+                message = await self.next_message(x, "rematch", self.deadlines.rematch)
+                if isinstance(message, protocol.Rematch):
+                    o.writer.write(protocol.encode_rematch())
+                elif isinstance(message, protocol.Quit):
+                    o.writer.write(protocol.encode_quit())
+                    return
+                else:
+                    raise protocol.ProtocolError(f"expected play again or quit, got {message!r}")
+        except (ConnectionError, protocol.ProtocolError):
+            # let whoever is still connected know the match is over
+            for player in (x, o):
+                if not player.writer.is_closing():
+                    player.writer.write(protocol.encode_quit())
+            raise
+        finally:
+            for task in (x.pump, o.pump, heartbeat):
+                if task is not None:
+                    task.cancel()
+            self.stats.active_matches -= 1
+            self.spectators.close(channel)
+
+    async def pump(self, player, opponent):
+        """Read a paired player's messages into their inbox for the whole
+           match, answering their Pings. An error reading the connection
+           is queued for both players, so the match ends on either turn.
+        """
+        try:
+            while True:
+                player.inbox.put_nowait(await player.reader.recv())
+        except (ConnectionError, protocol.ProtocolError) as e:
+            player.inbox.put_nowait(e)
+            opponent.inbox.put_nowait(e)
+
+    async def heartbeat(self, x, o):
+        """Ping the players of a match who have been quiet for the heartbeat
+           interval, and close the connection of one quiet for the heartbeat
+           timeout, which ends the match through their pump.
+        """
+        interval = self.deadlines.heartbeat_interval
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            for player in (x, o):
+                quiet = now - player.reader.heard
+                if quiet >= self.deadlines.heartbeat_timeout:
+                    player.writer.close()
+                elif quiet >= interval and not player.writer.is_closing():
+                    player.writer.write(protocol.encode_ping())
+
+    async def next_message(self, player, phase, timeout):
+        """Wait for a player's next message of a phase.
+
+        Args:
+            player (Ticket): the player whose message is due.
+            phase (str): "move" or "rematch", named in the TIMEOUT error.
+            timeout (float): seconds the player has.
+
+        Returns:
+            namedtuple: the message.
+        """
+        try:
+            message = await asyncio.wait_for(player.inbox.get(), timeout)
+        except asyncio.TimeoutError:
+            player.writer.write(protocol.encode_error(protocol.TIMEOUT, phase))
+            raise ConnectionError(f"{player.name} missed the {phase} deadline") from None
+        if isinstance(message, Exception):
+            raise message
+        return message
+
+    async def play_game(self, game, channel, x, o):
+        """Play one game, passing each legal move on to the opponent and
+           the spectators.
+        """
+        players = ((x, "X"), (o, "O"))
+        turn = 0
+        while True:
+            (mover, mark), (other, _) = players[turn], players[1 - turn]
+            message = await self.next_message(mover, "move", self.deadlines.move)
+            if isinstance(message, protocol.Quit):
+                raise ConnectionError(f"{mover.name} left during the game")
+            if not isinstance(message, protocol.Move):
+                raise protocol.ProtocolError(f"expected a move, got {message!r}")
+            r, c = message
+            if not game.checkLegalMove(r, c):
+                mover.writer.write(protocol.encode_error(protocol.ILLEGAL_MOVE, f"{r},{c}"))
+                raise protocol.ProtocolError(f"illegal move {r},{c} from {mover.name}")
+            game.updateGameBoard(mover.name, r, c, mark)
+            move = protocol.encode_move(r, c)
+            other.writer.write(move)
+            channel.publish(move)
+            self.stats.moves += 1
+            if game.checkGameOver(r, c):
+                self.finish_game(game, x, o)
+                return
+            turn = 1 - turn
+
+    def finish_game(self, game, x, o):
+        """Count, persist and record a finished game.
+        """
+        self.stats.games += 1
+        result = records.result_of(game)
+        if self.store is not None:
+            outcome = {records.TIE: stats_store.TIE, records.PLAYER1_WON: stats_store.WIN,
+                       records.PLAYER2_WON: stats_store.LOSS}[result]
+            self.store.record(x.name, o.name, outcome)
+            self.store.record(o.name, x.name, -outcome)
+        if self.recorder is not None:
+            self.recorder.record_game(game, x.name, o.name)
+
+
+def main(argv=None):
+    """run the lobby.
+    """
+    parser = argparse.ArgumentParser(description="Tic-Tac-Toe matchmaking lobby.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--mode", choices=(FIFO, RATING), default=FIFO)
+    parser.add_argument("--spread", type=int, default=1,
+                        help="rating buckets apart two players may be paired")
+    parser.add_argument("--stats-db", default=None,
+                        help="SQLite file of every player's results, also used for ratings")
+    parser.add_argument("--record", default=None,
+                        help="segment file to record every finished game in")
+    parser.add_argument("--report-interval", type=float, default=10,
+                        help="seconds between stats reports, 0 for none")
+    parser.add_argument("--handshake-timeout", type=float, default=server.DEADLINES.handshake,
+                        help="seconds from connecting to a player's name")
+    parser.add_argument("--move-timeout", type=float, default=server.DEADLINES.move,
+                        help="seconds a player has for each move")
+    parser.add_argument("--rematch-timeout", type=float, default=server.DEADLINES.rematch,
+                        help="seconds 'X' has to decide on another game")
+    parser.add_argument("--heartbeat", type=float, default=server.DEADLINES.heartbeat_interval,
+                        help="seconds of silence before a player is pinged; three"
+                             " times that and the match ends")
+    args = parser.parse_args(argv)
+
+    store = stats_store.StatsStore(args.stats_db) if args.stats_db else None
+    recorder = records.GameRecorder(args.record) if args.record else None
+    deadlines = server.Deadlines(args.handshake_timeout, args.move_timeout, args.rematch_timeout,
+                                 args.heartbeat, 3 * args.heartbeat)
+    lobby = Lobby(args.host, args.port, args.mode, args.spread, store, recorder, deadlines)
+    try:
+        asyncio.run(lobby.serve_forever(args.report_interval))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if store is not None:
+            store.close()
+        if recorder is not None:
+            recorder.close()
+    print(lobby.stats.computeStats(), end="")
+
+
+if __name__ == "__main__":
+    main()
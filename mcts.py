@@ -0,0 +1,253 @@
+import argparse
+import math
+import multiprocessing
+import random
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import gameboard
+
+# Monte Carlo tree search opponent for boards too large to search exhaustively.
+#
+# each worker process grows its own search tree from the same position for
+# the time budget (root parallelization); the visit counts of the root moves
+# are then added up and the most visited move is played. A worker plays
+# every rollout on one board with `BoardClass.push` and `status`, then puts
+# the root position back, so no board is built per rollout.
+
+# exploration constant of UCT
+EXPLORATION = 1.4
+
+# the result of a search
+Suggestion = namedtuple("Suggestion", "row col rollouts rollouts_per_sec")
+
+# the winning mark of a `BoardClass.status`, "" for a tie
+WINNER = {gameboard.X_WON: "X", gameboard.O_WON: "O", gameboard.TIE: ""}
+
+
+def snapshot(game):
+    """Capture the position of a board in a few integers that are cheap
+       to send to worker processes.
+
+    Args:
+        game (BoardClass): the board to capture.
+
+    Returns:
+        tuple: (board_width, win_length, x_bits, o_bits).
+    """
+    return (game.board_width, game.win_length, game.x_bits, game.o_bits)
+
+
+def restore(state):
+    """Build a board from a snapshot.
+
+    Args:
+        state (tuple): a snapshot taken by `snapshot`.
+
+    Returns:
+        BoardClass: a board in that position, marks played by "X" and "O".
+    """
+    width, win_length, x_bits, o_bits = state
+    game = gameboard.BoardClass(width, win_length)
+    game.init_player("X", None)
+    game.x_bits = x_bits
+    game.o_bits = o_bits
+    game.moves = bin(x_bits | o_bits).count("1")
+    return game
+
+
+def mark_to_move(state):
+    """Get the mark that moves next; 'X' always starts.
+    """
+    _, _, x_bits, o_bits = state
+    return "X" if bin(x_bits).count("1") == bin(o_bits).count("1") else "O"
+
+
+class Node:
+    """A position in the search tree.
+    """
+    __slots__ = ("cell", "parent", "children", "untried", "visits", "wins", "mark")
+
+    def __init__(self, cell, parent, untried, mark):
+        """initialize the node.
+
+        Args:
+            cell (int): the move that leads to this node from its parent.
+            parent (Node): the node before the move, None for the root.
+            untried (list): moves from this node that have no child yet.
+            mark (str): the mark that played `cell`.
+        """
+        self.cell = cell
+        self.parent = parent
+        self.children = []
+        self.untried = untried
+        self.visits = 0
+        self.wins = 0.0
+        self.mark = mark
+
+    def select(self):
+        """Pick the child with the best UCT score.
+        """
+        log_visits = math.log(self.visits)
+        return max(self.children,
+                   key=lambda child: child.wins / child.visits
+                   + EXPLORATION * math.sqrt(log_visits / child.visits))
+
+
+def play(game, cell):
+    """Push a move on the search board.
+
+    Returns:
+        str: the winning mark, "" for a tie, None if the game goes on.
+    """
+    game.push(cell)
+    return WINNER.get(game.status())
+
+
+def search_worker(state, budget, seed):
+    """Run MCTS from a position for `budget` seconds.
+
+    Args:
+        state (tuple): a snapshot of the position.
+        budget (float): seconds to search for.
+        seed (int): seed of the worker's random generator.
+
+    Returns:
+        tuple: ({cell: visits} of the root moves, number of rollouts).
+    """
+    rng = random.Random(seed)
+    width = state[0]
+    root_game = restore(state)
+    empty = [cell for cell in range(width * width)
+             if root_game.checkLegalMove(cell // width, cell % width)]
+    first = mark_to_move(state)
+    other = {"X": "O", "O": "X"}
+    root = Node(None, None, list(empty), other[first])
+    root_position = (root_game.x_bits, root_game.o_bits, root_game.moves, root_game.zobrist)
+    rollouts = 0
+    game = root_game
+    deadline = time.perf_counter() + budget
+    while time.perf_counter() < deadline:
+        free = list(empty)
+        node = root
+        mark = first
+        result = None
+        # selection
+        while not node.untried and node.children:
+            node = node.select()
+            free.remove(node.cell)
+            result = play(game, node.cell)
+            mark = other[node.mark]
+        # expansion
+        if result is None and node.untried:
+            cell = node.untried.pop(rng.randrange(len(node.untried)))
+            free.remove(cell)
+            result = play(game, cell)
+            child = Node(cell, node, list(free) if result is None else [], mark)
+            node.children.append(child)
+            node = child
+            mark = other[mark]
+        # rollout
+        while result is None:
+            i = rng.randrange(len(free))
+            free[i], free[-1] = free[-1], free[i]
+            result = play(game, free.pop())
+            mark = other[mark]
+        # backpropagation, scored for the mark that moved into each node
+        while node is not None:
+            node.visits += 1
+            if result == node.mark:
+                node.wins += 1
+            elif result == "":
+                node.wins += 0.5
+            node = node.parent
+        # back to the root position; the rollout is thrown away whole, which
+        # is cheaper than a `pop` per move
+        game.x_bits, game.o_bits, game.moves, game.zobrist = root_position
+        del game.history[:]
+        rollouts += 1
+    return {child.cell: child.visits for child in root.children}, rollouts
+
+
+class MCTSPlayer:
+    """Chooses moves with MCTS spread over a pool of worker processes.
+    """
+    def __init__(self, budget=1.0, workers=None):
+        """initialize the player.
+
+        Args:
+            budget (float): seconds of search per move.
+            workers (int): number of worker processes, one per core by default.
+        """
+        self.budget = budget
+        self.workers = workers or multiprocessing.cpu_count()
+        self.executor = None
+        self.last = None
+
+    def search(self, state):
+        """Search a position on every worker and merge the results.
+
+        Args:
+            state (tuple): a snapshot of the position, see `snapshot`.
+
+        Returns:
+            Suggestion: the most visited move and the rollout rate.
+        """
+        if self.executor is None:
+            # spawn, so workers never inherit a Tk interpreter
+            self.executor = ProcessPoolExecutor(self.workers,
+                                                mp_context=multiprocessing.get_context("spawn"))
+        start = time.perf_counter()
+        seed = random.randrange(1 << 30)
+        futures = [self.executor.submit(search_worker, state, self.budget, seed + i)
+                   for i in range(self.workers)]
+        visits = {}
+        rollouts = 0
+        for future in futures:
+            counts, n = future.result()
+            rollouts += n
+            for cell, count in counts.items():
+                visits[cell] = visits.get(cell, 0) + count
+        elapsed = time.perf_counter() - start
+        row, col = divmod(max(visits, key=visits.get), state[0])
+        self.last = Suggestion(row, col, rollouts, rollouts / elapsed)
+        return self.last
+
+    def choose_move(self, game):
+        """Pick a move for the side to move, like the bots in bots.py.
+        """
+        suggestion = self.search(snapshot(game))
+        return suggestion.row, suggestion.col
+
+    def close(self):
+        """Stop the worker processes.
+        """
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+
+def main(argv=None):
+    """measure rollouts/sec from an empty board.
+    """
+    parser = argparse.ArgumentParser(description="Measure MCTS rollouts/sec.")
+    parser.add_argument("--width", type=int, default=15)
+    parser.add_argument("--win-length", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=2.0, help="seconds of search")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    player = MCTSPlayer(args.budget, args.workers)
+    try:
+        game = gameboard.BoardClass(args.width, args.win_length)
+        suggestion = player.search(snapshot(game))
+    finally:
+        player.close()
+    print(f"workers: {player.workers}")
+    print(f"best move: {suggestion.row},{suggestion.col}")
+    print(f"rollouts: {suggestion.rollouts} ({suggestion.rollouts_per_sec:.0f}/sec)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# in-process metrics of a game host, served over HTTP in the Prometheus text
+# format.
+#
+# recording a value takes no lock: every thread adds to cells of its own,
+# found by thread id, and a scrape adds up the cells of every thread. Only
+# the first value a thread records takes the registry's lock, to create its
+# cells.
+#
+#     registry = metrics.Registry()
+#     moves = registry.counter("ttt_moves_total", "Moves played.")
+#     moves.inc()
+#     metrics.serve(registry, "127.0.0.1", 9100)   # GET /metrics
+
+# upper bounds, in seconds, of the buckets of a latency histogram
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Counter:
+    """A count that only goes up.
+    """
+    kind = "counter"
+
+    def __init__(self, name, help, lock):
+        """initialize the counter.
+
+        Args:
+            name (str): the metric name.
+            help (str): what it counts.
+            lock (Lock): the registry's lock, held to add a thread's cell.
+        """
+        self.name = name
+        self.help = help
+        self.lock = lock
+        # thread id -> [value] of that thread
+        self.cells = {}
+
+    def _new_cell(self):
+        """Create the cell of the calling thread.
+        """
+        with self.lock:
+            return self.cells.setdefault(threading.get_ident(), [0])
+
+    def inc(self, amount=1):
+        """Add to the count.
+        """
+        try:
+            self.cells[threading.get_ident()][0] += amount
+        except KeyError:
+            self._new_cell()[0] += amount
+
+    def value(self):
+        """Add up the cells of every thread.
+        """
+        return sum(cell[0] for cell in list(self.cells.values()))
+
+    def samples(self):
+        """List the (name, value) lines of the metric.
+        """
+        return [(self.name, self.value())]
+
+
+class Gauge(Counter):
+    """A count that goes up and down, like the connections open.
+    """
+    kind = "gauge"
+
+    def dec(self, amount=1):
+        """Take from the count.
+        """
+        self.inc(-amount)
+
+
+class Histogram:
+    """Counts of values in buckets, with their sum.
+    """
+    kind = "histogram"
+
+    def __init__(self, name, help, lock, buckets=LATENCY_BUCKETS):
+        """initialize the histogram.
+
+        Args:
+            name (str): the metric name.
+            help (str): what it measures.
+            lock (Lock): the registry's lock, held to add a thread's cells.
+            buckets (tuple): the upper bounds of the buckets, ascending.
+        """
+        self.name = name
+        self.help = help
+        self.lock = lock
+        self.buckets = tuple(buckets)
+        # thread id -> [count of each bucket..., count above the last, sum]
+        self.cells = {}
+
+    def _new_cell(self):
+        """Create the cells of the calling thread.
+        """
+        with self.lock:
+            return self.cells.setdefault(threading.get_ident(), [0] * (len(self.buckets) + 1) + [0.0])
+
+    def observe(self, value):
+        """Count a value.
+        """
+        try:
+            cell = self.cells[threading.get_ident()]
+        except KeyError:
+            cell = self._new_cell()
+        cell[bisect.bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+
+    def samples(self):
+        """List the (name, value) lines of the metric, with cumulative buckets.
+        """
+        totals = [sum(column) for column in zip(*list(self.cells.values()))]
+        if not totals:
+            totals = [0] * (len(self.buckets) + 1) + [0.0]
+        lines = []
+        count = 0
+        for bound, n in zip(self.buckets + ("+Inf",), totals):
+            count += n
+            lines.append((f'{self.name}_bucket{{le="{bound}"}}', count))
+        lines.append((f"{self.name}_sum", totals[-1]))
+        lines.append((f"{self.name}_count", count))
+        return lines
+
+
+class Registry:
+    """The metrics of a process.
+    """
+    def __init__(self):
+        """initialize the registry.
+        """
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    def _add(self, metric):
+        """Register a metric under its name, which must be new.
+        """
+        with self.lock:
+            if metric.name in self.metrics:
+                raise ValueError(f"metric {metric.name} already registered")
+            self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help):
+        """Create and register a Counter.
+        """
+        return self._add(Counter(name, help, self.lock))
+
+    def gauge(self, name, help):
+        """Create and register a Gauge.
+        """
+        return self._add(Gauge(name, help, self.lock))
+
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS):
+        """Create and register a Histogram.
+        """
+        return self._add(Histogram(name, help, self.lock, buckets))
+
+    def render(self):
+        """Format every metric in the Prometheus text format.
+
+        Returns:
+            str: HELP and TYPE of each metric followed by its samples.
+        """
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, value in metric.samples():
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Answers GET /metrics with the registry of its server.
+    """
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # scrapes come every few seconds; keep them out of the host's output
+        pass
+
+
+def serve(registry, host, port):
+    """Serve a registry on http://host:port/metrics from a background thread.
+
+    Args:
+        registry (Registry): the metrics to serve.
+        host (str): ip address to listen on.
+        port (int): port to listen on, 0 picks a free one.
+
+    Returns:
+        ThreadingHTTPServer: the server; its port is `server_address[1]`,
+                             `shutdown()` stops it.
+    """
+    http_server = ThreadingHTTPServer((host, port), MetricsHandler)
+    http_server.daemon_threads = True
+    http_server.registry = registry
+    threading.Thread(target=http_server.serve_forever, name="metrics", daemon=True).start()
+    return http_server
@@ -1,23 +1,44 @@
-import socket
+import time
 import gameboard
-import tkinter as tk
+import lazy
+import protocol
+import stats_store
+import tracing
+import transport
+
+# Tk and the board widget load with the first window, not on import
+tk = lazy.module("tkinter")
+board_widget = lazy.module("board_widget")
 
 import threading
 import queue
 
-# act as a client, always use 'X/x'
+# act as a client, always use 'X/x', unless a lobby pairs it to play 'O/o'
+
+# how often the main thread drains the message buffer, in milliseconds
+POLL_INTERVAL_MS = 10
+# how often the main thread checks whether player2 has been quiet long
+# enough to be pinged, in milliseconds. The receiving thread gives up on a
+# player2 quiet for protocol.HEARTBEAT_TIMEOUT.
+HEARTBEAT_CHECK_MS = 1000
 
-def recv_player2_move(buffer, s):
-    """Receive the move of player 2 and send it to the main thread.
+def recv_player2_messages(buffer, reader, tracer=tracing.NULL_TRACER):
+    """Receive every message of player 2 and send it to the main thread.
+       Runs for the whole connection; puts None once the connection is closed.
 
     Args:
         buffer (queue): message buffer to communicate with the main thread
-        s (socket): socket object to receive and send messages between two players
+        reader (MessageReader): reader of the messages sent by player 2
+        tracer (MoveTracer): stamps the time each move is received
     """
-    player2_move = s.recv(1024).decode()
-    r = int(player2_move[0])
-    c = int(player2_move[1])
-    buffer.put((r, c))       
+    try:
+        while True:
+            message = reader.recv()
+            if isinstance(message, protocol.Move):
+                tracer.stamp(message, "receive")
+            buffer.put(message)
+    except (OSError, protocol.ProtocolError):
+        buffer.put(None)
     
 
 class App():
@@ -26,42 +47,190 @@ class App():
     def __init__(self):
         """initialize the app interface
         """
-        self.s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        # connected by connect_to_player2, over the transport the host names
+        self.s = None
         
         self.root = tk.Tk()
         self.root.title("Tic-Tac-Toe Game -- Player 1")
         self.root.geometry("400x400")
         
         self.game = gameboard.BoardClass()
+        self.store = stats_store.StatsStore()
+        self.tracer = tracing.from_env("player1.trace")
+        self.tracer.watch(self.root)
         
         self.buffer = queue.Queue()
+        self.recv_thread = None
+        # a lobby may pair player1 to play second
+        self.mark = "X"
+        self.other_mark = "O"
+        # resumes the session with the server if the connection drops
+        self.resume_token = None
+        self.finished = False
+        # the window keeps one root; screens are frames swapped inside it
+        self.screen = None
+        self.board = None
+        self.reset_window()
         self.enter_host_info()
 
     def enter_host_info(self):
         """generate the interface with the entries for the host information.
         """
         
-        self.ip_label = tk.Label(self.root, text="Enter host ip:")
+        self.ip_label = tk.Label(self.screen, text="Enter host ip:")
         self.ip_label.pack()
-        self.host_ip_entry = tk.Entry(self.root)
+        self.host_ip_entry = tk.Entry(self.screen)
         self.host_ip_entry.pack()
         
-        self.port_label = tk.Label(self.root, text="Enter host port:")
+        self.port_label = tk.Label(self.screen, text="Enter host port:")
         self.port_label.pack()
         
-        self.host_port_entry = tk.Entry(self.root)
+        self.host_port_entry = tk.Entry(self.screen)
         self.host_port_entry.pack()
         
-        self.get_input_button = tk.Button(self.root, text="Get Host Info", command=self.get_host_info)
+        self.get_input_button = tk.Button(self.screen, text="Get Host Info", command=self.get_host_info)
         self.get_input_button.pack()
     
     def reset_window(self):
-        """reset the window.
+        """reset the window to a new empty screen.
         """
-        self.root.destroy()
-        self.root = tk.Tk()
-        self.root.title("Tic-Tac-Toe Game -- Player 1")
-        self.root.geometry("400x400")
+        self.show_screen(tk.Frame(self.root))
+
+    def show_screen(self, frame):
+        """Replace the screen shown in the window. The board is only
+           hidden, to be reused by the next game; other screens are destroyed.
+
+        Args:
+            frame (Frame): the new screen.
+        """
+        if self.screen is not None:
+            if self.screen is self.board:
+                self.screen.pack_forget()
+            else:
+                self.screen.destroy()
+        self.screen = frame
+        self.screen.pack(fill=tk.BOTH, expand=True)
+        
+    def poll_messages(self):
+        """Drain the message buffer without blocking and handle every
+           message received from player2, then check again shortly.
+        """
+        while True:
+            try:
+                message = self.buffer.get_nowait()
+            except queue.Empty:
+                break
+            self.handle_message(message)
+        self.root.after(POLL_INTERVAL_MS, self.poll_messages)
+
+    def handle_message(self, message):
+        """Handle one message received from player2.
+
+        Args:
+            message (namedtuple): the message, None if the connection closed.
+        """
+        if isinstance(message, protocol.Move):
+            self.tracer.stamp(message, "handoff")
+            self.update_player2_move(message.row, message.col)
+        elif isinstance(message, protocol.Board):
+            # player2 set up another board than the 3x3 game, before its name
+            self.game = gameboard.BoardClass(message.board_width, message.win_length)
+        elif isinstance(message, protocol.Hello):
+            self.player2_name = message.name
+            self.game.set_player_name(self.player1_name, self.player2_name)
+            # jump to the board window
+            self.play_game()
+        elif isinstance(message, protocol.Match):
+            self.player2_name = message.opponent
+            self.mark = message.mark
+            self.other_mark = "O" if self.mark == "X" else "X"
+            self.game.set_player_name(self.player1_name, self.player2_name)
+            self.play_game()
+        elif isinstance(message, protocol.Rematch):
+            # only when playing 'O': the opponent decided to play again
+            self.play_game()
+        elif isinstance(message, protocol.Quit):
+            self.show_statics()
+        elif isinstance(message, protocol.Token):
+            self.resume_token = message.token
+        elif isinstance(message, protocol.State):
+            self.resume_game(message)
+        elif isinstance(message, protocol.Error) and message.code in (protocol.NO_SESSION,
+                                                                       protocol.TIMEOUT):
+            self.show_statics()
+        elif message is None and not self.finished and self.resume_token is not None:
+            self.reconnect()
+        elif message is None and not self.finished and self.board is not None:
+            # player2 left or stopped answering
+            self.show_statics()
+
+    def heartbeat(self):
+        """Ping player2 once they have been quiet for the heartbeat
+           interval; their Pong keeps the receiving thread from timing out.
+        """
+        if self.finished:
+            return
+        if time.monotonic() - self.reader.heard >= protocol.HEARTBEAT_INTERVAL:
+            try:
+                self.s.sendall(protocol.encode_ping())
+            except OSError:
+                pass
+        self.root.after(HEARTBEAT_CHECK_MS, self.heartbeat)
+
+    def reconnect(self):
+        """Connect to the server again after the connection dropped and
+           ask to resume the session. The server answers with its state.
+        """
+        self.s.close()
+        try:
+            self.s = transport.connect(self.host_ip_addr, self.host_port)
+            self.s.settimeout(protocol.HEARTBEAT_TIMEOUT)
+            self.s.sendall(protocol.encode_resume(self.resume_token))
+        except OSError:
+            self.show_statics()
+            return
+        self.reader = protocol.MessageReader(self.s)
+        self.start_receiving()
+
+    def resume_game(self, state):
+        """Carry on a resumed session from the server's state.
+
+        Args:
+            state (State): the board and counters kept by the server.
+        """
+        history = self.game.history
+        if state.over and state.games_played == self.game.games_played:
+            # the end of the server's game was already shown here
+            if tuple(history) != tuple(state.moves):
+                # another game was chosen, but the Rematch was lost with the
+                # connection: ask again, with the moves made since
+                self.s.sendall(protocol.encode_rematch())
+                for cell in history:
+                    self.s.sendall(protocol.encode_move(*divmod(cell, self.game.board_width)))
+            return
+        if tuple(state.moves[:len(history)]) == tuple(history):
+            # only player2's answers can be missing
+            for cell in state.moves[len(history):]:
+                self.update_player2_move(*divmod(cell, self.game.board_width))
+            return
+        # the last move was lost with the connection: show the server's board
+        self.game.restoreGameBoard(state.moves,
+                                   self.player1_name if state.player1_last else self.player2_name)
+        self.game.games_played = state.games_played
+        self.game.wins = state.wins
+        self.game.losses = state.losses
+        self.game.ties = state.ties
+        self.board.reset("Player2's turn" if state.player1_last else "Player1's turn")
+        for i, cell in enumerate(state.moves):
+            r, c = divmod(cell, self.game.board_width)
+            self.board.mark(r, c, "O" if i % 2 else "X")
+        if state.over:
+            result = self.game.status()
+            self.game.isTie = result == gameboard.TIE
+            self.game.imWinner = result == (gameboard.X_WON if self.mark == "X" else gameboard.O_WON)
+            self.store.record_game(self.game, self.player1_name, self.player2_name)
+            self.show_win_los_tie()
+            self.end_game()
         
     def get_host_info(self):
         """Once `get_info` button clicked, it jumps to this function to 
@@ -75,12 +244,15 @@ class App():
         self.reset_window()
         
         if succ:
-            username_label = tk.Label(self.root, text = "Enter player1's user name")
+            # receive right away, so player2's Pings are answered while the name is typed
+            self.start_receiving()
+            self.root.after(HEARTBEAT_CHECK_MS, self.heartbeat)
+            username_label = tk.Label(self.screen, text = "Enter player1's user name")
             username_label.pack()
-            self.username_entry = tk.Entry(self.root)
+            self.username_entry = tk.Entry(self.screen)
             self.username_entry.pack()
             
-            get_username_button = tk.Button(self.root, text="Get Username", command=self.get_username)
+            get_username_button = tk.Button(self.screen, text="Get Username", command=self.get_username)
             get_username_button.pack()
             
         else:
@@ -90,23 +262,23 @@ class App():
         """ Once connectoin failed, prompt the user to indicate
             if they are trying to connect again.
         """
-        try_again_label = tk.Label(self.root, text = "Do you want to try to connect player 2 again? (y/n)")
+        try_again_label = tk.Label(self.screen, text = "Do you want to try to connect player 2 again? (y/n)")
         try_again_label.pack()
-        self.try_again_entry = tk.Entry(self.root)
+        self.try_again_entry = tk.Entry(self.screen)
         self.try_again_entry.pack()
-        try_again_button = tk.Button(self.root, text="y/n", command=self.get_try_again)
+        try_again_button = tk.Button(self.screen, text="y/n", command=self.get_try_again)
         try_again_button.pack()
       
     def show_win_los_tie(self):
         """Show the win or lose state on canvas.
         """
         if self.game.isTie:
-            self.canvas.itemconfigure(self.turn_indicator, text="It's a tie.")
+            self.board.set_status("It's a tie.")
             return
         if self.game.imWinner:
-            self.canvas.itemconfigure(self.turn_indicator, text="I won!")
+            self.board.set_status("I won!")
         else:
-            self.canvas.itemconfigure(self.turn_indicator, text="I lost...")  
+            self.board.set_status("I lost...")  
 
     def get_try_again(self):
         """get the user's input for the `try-again` option.
@@ -123,28 +295,43 @@ class App():
                   
     def get_username(self):
         """ Get player1's name from entry. Send it to player2 and
-            wait for player2 to send its name back.
+            start handling player2's messages.
             Upon receiving player2's name, start a new game.
         """
         self.player1_name = self.username_entry.get()
-        self.s.sendall(self.player1_name.encode())
-        self.player2_name = self.s.recv(1024).decode()
-        self.game.set_player_name(self.player1_name, self.player2_name)
-        # jump to the board window
-        self.play_game()
+        self.s.sendall(protocol.encode_hello(self.player1_name))
+        self.root.after(POLL_INTERVAL_MS, self.poll_messages)
+        self.reset_window()
+        label = tk.Label(self.screen, text="Waiting for player2's name...")
+        label.pack()
+        lifetime = self.store.lifetime(self.player1_name)
+        lifetime_label = tk.Label(self.screen, text="Your lifetime stats:\n" + stats_store.format_stats(lifetime))
+        lifetime_label.pack()
                      
+    def start_receiving(self):
+        """Start the thread receiving every message of the connection.
+        """
+        self.recv_thread = threading.Thread(target=recv_player2_messages, daemon=True,
+                                            kwargs={'buffer': self.buffer, 'reader':self.reader,
+                                                    'tracer': self.tracer})
+        self.recv_thread.start()
+
     def connect_to_player2(self, ip, port):
         """Try to connect to player2 using socket.
 
         Args:
-            ip (str): ip address of server
+            ip (str): ip address of server, or "unix:PATH" / "inproc:NAME"
+                      for a player2 on the same host, see transport.py
             port (str): port of the server
 
         Returns:
             boolean: If connected, returns true. Otherwise, returns false.
         """
         try:
-            self.s.connect((ip, int(port)))
+            self.s = transport.connect(ip, port)
+            # a player2 quiet for this long is taken for dead
+            self.s.settimeout(protocol.HEARTBEAT_TIMEOUT)
+            self.reader = protocol.MessageReader(self.s)
             return True
         except Exception as e:
             return False  
@@ -153,21 +340,26 @@ class App():
         """ Initialize game board interface and game logic.
         """
         
-        self.reset_window()
-        self.canvas = tk.Canvas(self.root, width=400, height=100)
-        self.turn_indicator = self.canvas.create_text(200, 15, text="Player1's turn", font=('Arial', 20))
-        self.canvas.place(x=0, y=350)
-        self.game.init_player(self.player1_name, self.player2_name)
+        # the board is built for the first game only, then cleared in place
+        if self.board is None:
+            self.board = board_widget.BoardWidget(self.root, self.game.board_width, self.handle_click)
+            if self.game.isSolved():
+                hint_button = tk.Button(self.board, text="Hint", command=self.show_hint)
+                hint_button.grid(row=self.game.board_width, column=1)
+        first = self.mark == "X"
+        self.board.reset("Player1's turn" if first else "Player2's turn")
+        self.show_screen(self.board)
+        self.game.init_player(self.player1_name, self.player2_name if first else self.player1_name)
         self.game.resetGameBoard()
-        self.buttons = []
-        for row in range(self.game.board_width):
-            button_row = []
-            for col in range(self.game.board_width):
-                button = tk.Button(self.root, text="", font=("Arial", 20), width=5, height=2,
-                                   command=lambda r=row, c=col: self.handle_click(r, c))
-                button.grid(row=row, column=col, padx=5, pady=5)
-                button_row.append(button)
-            self.buttons.append(button_row)
+
+    def show_hint(self):
+        """Show the best move for player1 from the perfect-play table.
+        """
+        if self.game.isMyTurn():
+            move = self.game.bestMove()
+            if move is not None:
+                r, c = move
+                self.board.set_info(f"Hint: row {r + 1}, column {c + 1}")
 
     def handle_click(self, r, c):
         """Handle the user clicks.
@@ -183,56 +375,64 @@ class App():
             if legal is False:
                 return
             # update game board.
-            self.game.updateGameBoard(self.player1_name, r, c, "X")
-            self.buttons[r][c].config(text="X", state=tk.DISABLED)
+            self.board.set_info("")
+            self.tracer.stamp((r, c), "click")
+            self.game.updateGameBoard(self.player1_name, r, c, self.mark)
+            self.board.mark(r, c, self.mark)
+            self.tracer.stamp((r, c), "render")
             # send the move to player2.
-            move = str(r) + str(c)
-            self.s.send(move.encode())
-            self.canvas.itemconfigure(self.turn_indicator, text="Player2's turn")
+            self.s.sendall(protocol.encode_move(r, c))
+            self.tracer.stamp((r, c), "send")
+            self.tracer.finish((r, c))
+            self.board.set_status("Player2's turn")
 
             over = self.game.checkGameOver(r, c)
             # if game over, prompt the user to decide whether play again.
             if over:
+                self.store.record_game(self.game, self.player1_name, self.player2_name)
                 self.show_win_los_tie()                   
-                self.root.after(1000, self.play_again())
-            else:
-                # create a new thread to receive player2's move.
-                self.recv_thread = threading.Thread(target=recv_player2_move, 
-                                                    kwargs={'buffer': self.buffer, 's':self.s})   
-                self.recv_thread.start()
-                self.root.after(1000, self.update_player2_move)    
+                self.end_game()
             
-    def update_player2_move(self):
-        """ Receive the player2's move from the message buffer,
-            and update the game board accordingly. 
+    def update_player2_move(self, r, c):
+        """ Update the game board with the player2's move
+            received from the message buffer.
+
+        Args:
+            r (int): row number
+            c (int): column number
         """
-         # update game board
-        try:
-            (r,c) = self.buffer.get()
-            self.recv_thread.join()
-            self.game.updateGameBoard(self.player2_name, r, c, "O")
-            self.buttons[r][c].config(text="O", state=tk.DISABLED)
-            over = self.game.checkGameOver(r, c)  
+        # update game board
+        self.game.updateGameBoard(self.player2_name, r, c, self.other_mark)
+        self.board.mark(r, c, self.other_mark)
+        self.tracer.stamp((r, c), "render")
+        self.tracer.finish((r, c))
+        over = self.game.checkGameOver(r, c)  
 
-            self.canvas.itemconfigure(self.turn_indicator, text="Player1's turn")
+        self.board.set_status("Player1's turn")
             
-            # if game over, prompt the user to decide whether play again.
-            if over:
-                self.show_win_los_tie()
-                self.root.after(1000, self.play_again())
-        except queue.Empty:
-            self.root.after(1000, self.update_player2_move)    
+        # if game over, prompt the user to decide whether play again.
+        if over:
+            self.store.record_game(self.game, self.player1_name, self.player2_name)
+            self.show_win_los_tie()
+            self.end_game()
+    
+    def end_game(self):
+        """Prompt the user to play again, unless playing 'O' in the lobby,
+           where the opponent decides.
+        """
+        if self.mark == "X":
+            self.root.after(1000, self.play_again())
     
     def play_again(self):
         """When game is over, prompt the user to indicate whether to play again.
         """
         self.reset_window()
         
-        play_again_label = tk.Label(self.root, text="Do you want to play again? (y/n): ")
+        play_again_label = tk.Label(self.screen, text="Do you want to play again? (y/n): ")
         play_again_label.pack()
-        self.play_again_entry = tk.Entry(self.root)
+        self.play_again_entry = tk.Entry(self.screen)
         self.play_again_entry.pack()
-        play_again_button = tk.Button(self.root, text="y/n", command=self.get_play_again)
+        play_again_button = tk.Button(self.screen, text="y/n", command=self.get_play_again)
         play_again_button.pack()
                    
     def get_play_again(self):
@@ -241,11 +441,11 @@ class App():
         """
         choice = self.play_again_entry.get()
         if choice.lower() == 'y':
-            self.s.sendall("Play Again".encode())
+            self.s.sendall(protocol.encode_rematch())
             self.play_game()
         
         elif choice.lower() == 'n':
-            self.s.sendall("Fun Times".encode())
+            self.s.sendall(protocol.encode_quit())
             self.root.after(100,self.show_statics())
             
     def start(self):
@@ -256,18 +456,25 @@ class App():
     def show_statics(self):
         """When not playing again, show the statics of the game.
         """
+        self.finished = True
         self.reset_window()
-        name_label = tk.Label(self.root, text="Player1's name: "+self.player1_name+ 
+        name_label = tk.Label(self.screen, text="Player1's name: "+self.player1_name+ 
                               "\n"+"Player2's name: "+self.player2_name)
         name_label.pack()
-        label = tk.Label(self.root, text=self.game.computeStats())
+        label = tk.Label(self.screen, text=self.game.computeStats())
         label.pack()
+        lifetime = self.store.lifetime(self.player1_name)
+        lifetime_label = tk.Label(self.screen, text="Lifetime:\n" + stats_store.format_stats(lifetime))
+        lifetime_label.pack()
         self.root.after(10000, self.exit)
         
     def exit(self):     
         """ exit the game.
         """   
-        self.s.close()  
+        if self.s is not None:
+            self.s.close()
+        self.tracer.close(self.game.computeStats())
+        self.store.close()
         self.root.destroy()
     
 def run():
@@ -276,4 +483,5 @@ def run():
     app = App()
     app.start()
     
-run()
\ No newline at end of file
+if __name__ == "__main__":
+    run()
\ No newline at end of file
@@ -1,54 +1,80 @@
-import socket
+import time
 import gameboard
-import tkinter as tk
+import lazy
+import mcts
+import protocol
+import stats_store
+import tracing
+import transport
+
+# Tk and the board widget load with the first window, not on import, which
+# also keeps them out of the computer player's worker processes
+tk = lazy.module("tkinter")
+board_widget = lazy.module("board_widget")
 
 import threading
 import queue
 # act as a server, always use 'O/o'
 
-def listen_to_player1(buffer, s):
-    """Listen to player1's connection.
+# how often the main thread drains the message buffer, in milliseconds
+POLL_INTERVAL_MS = 10
+# seconds the computer searches for each of its moves
+COMPUTER_BUDGET = 1.0
+# seconds player1 has to send their name, to make each move and to decide
+# on another game, before player2 gives up on them
+HANDSHAKE_TIMEOUT = 60.0
+MOVE_TIMEOUT = 120.0
+REMATCH_TIMEOUT = 120.0
+# how often the main thread checks whether player1 has been quiet long
+# enough to be pinged, in milliseconds. The receiving thread gives up on a
+# player1 quiet for protocol.HEARTBEAT_TIMEOUT.
+HEARTBEAT_CHECK_MS = 1000
+# the widest board player1 can be told of, one byte of the Board message
+MAX_BOARD_WIDTH = 255
+
+def listen_to_player1(buffer, s, tracer=tracing.NULL_TRACER):
+    """Listen to player1's connection, then keep receiving
+       player1's messages on the same thread.
 
     Args:
         buffer (queue): message buffer to communicate with main thread.
-        s (socket): socket object to receive and send messages between two players.
+        s (socket): listener of transport.listen to accept player1 on.
+        tracer (MoveTracer): stamps the time each move is received.
     """
-    s.listen(1)
     conn, addr = s.accept()
-    buffer.put(conn)
-
-def recv_player1_name(buffer, conn):
-    """Receive player1's name and put it into buffer.
-
-    Args:        
-        buffer (queue): message buffer to communicate with main thread.
-        conn (socket): socket object to receive and send messages between two players.
-    """
-    player1_name = conn.recv(1024).decode()
-    buffer.put(player1_name)
+    # a player1 quiet for this long is taken for dead
+    conn.settimeout(protocol.HEARTBEAT_TIMEOUT)
+    reader = protocol.MessageReader(conn)
+    buffer.put(reader)
+    recv_player1_messages(buffer, reader, tracer)
 
-def recv_player1_move(buffer, conn):
-    """Receive player player1's move and put it into buffer.
+def recv_player1_messages(buffer, reader, tracer=tracing.NULL_TRACER):
+    """Receive every message of player1 and put it into buffer.
+       Runs for the whole connection; puts None once the connection is closed.
 
     Args:        
         buffer (queue): message buffer to communicate with main thread.
-        conn (socket): socket object to receive and send messages between two players.
+        reader (MessageReader): reader of the messages sent by player1.
+        tracer (MoveTracer): stamps the time each move is received.
     """
-    player1_move = conn.recv(1024).decode()
-    r = int(player1_move[0])
-    c = int(player1_move[1])
-    buffer.put((r, c))    
-   
-def recv_player1_play_again(buffer, conn):
-    """Receive player1's decision of playing again, and
-       put it into the buffer.
+    try:
+        while True:
+            message = reader.recv()
+            if isinstance(message, protocol.Move):
+                tracer.stamp(message, "receive")
+            buffer.put(message)
+    except (OSError, protocol.ProtocolError):
+        buffer.put(None)
+    
+def search_computer_move(buffer, ai, state):
+    """Search the computer's move and put it into buffer.
 
     Args:        
         buffer (queue): message buffer to communicate with main thread.
-        conn (socket): socket object to receive and send messages between two players.
+        ai (MCTSPlayer): the computer player.
+        state (tuple): snapshot of the board to move in.
     """
-    message = conn.recv(1024).decode()
-    buffer.put(message)
+    buffer.put(ai.search(state))
     
     
 class App():
@@ -57,229 +83,411 @@ class App():
     def __init__(self):
         """initialize the app interface
         """
-        self.s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        # the listener for player1, opened by get_host_info
+        self.s = None
         
         self.root = tk.Tk()
         self.root.title("Tic-Tac-Toe Game -- Player 2")
         self.root.geometry("400x400")
         
         self.game = gameboard.BoardClass()
+        self.store = stats_store.StatsStore()
+        self.tracer = tracing.from_env("player2.trace")
+        self.tracer.watch(self.root)
         
         self.buffer = queue.Queue()
+        self.ai = None
+        # the Tk timer of player1's current deadline
+        self.deadline = None
+        self.finished = False
+        # the window keeps one root; screens are frames swapped inside it
+        self.screen = None
+        self.board = None
+        self.reset_window()
         self.enter_host_info()
+        self.root.after(POLL_INTERVAL_MS, self.poll_messages)
 
     def reset_window(self):
-        """reset the window.
+        """reset the window to a new empty screen.
         """
-        self.root.destroy()
-        self.root = tk.Tk()
-        self.root.title("Tic-Tac-Toe Game -- Player 2")
-        self.root.geometry("400x400")
+        self.show_screen(tk.Frame(self.root))
+
+    def show_screen(self, frame):
+        """Replace the screen shown in the window. The board is only
+           hidden, to be reused by the next game; other screens are destroyed.
+
+        Args:
+            frame (Frame): the new screen.
+        """
+        if self.screen is not None:
+            if self.screen is self.board:
+                self.screen.pack_forget()
+            else:
+                self.screen.destroy()
+        self.screen = frame
+        self.screen.pack(fill=tk.BOTH, expand=True)
+        
+    def poll_messages(self):
+        """Drain the message buffer without blocking and handle everything
+           received from player1, then check again shortly.
+        """
+        while True:
+            try:
+                message = self.buffer.get_nowait()
+            except queue.Empty:
+                break
+            self.handle_message(message)
+        self.root.after(POLL_INTERVAL_MS, self.poll_messages)
+
+    def handle_message(self, message):
+        """Handle one item received from the listening thread.
+
+        Args:
+            message: the reader of player1's connection, one of player1's
+                     messages, the computer's move, or None if the
+                     connection closed or player1 stopped answering.
+        """
+        if isinstance(message, protocol.Move):
+            self.tracer.stamp(message, "handoff")
+            self.update_player1_move(message.row, message.col)
+        elif isinstance(message, mcts.Suggestion):
+            self.play_computer_move(message)
+        elif isinstance(message, (protocol.Rematch, protocol.Quit)):
+            self.handle_play_again(message)
+        elif isinstance(message, protocol.Hello):
+            self.get_player1_name(message.name)
+        elif isinstance(message, protocol.MessageReader):
+            self.handle_connection(message)
+        elif message is None and not self.finished:
+            self.drop_player1("Player1 left.")
+
+    def heartbeat(self):
+        """Ping player1 once they have been quiet for the heartbeat
+           interval; their Pong keeps the receiving thread from timing out.
+        """
+        if self.finished:
+            return
+        if time.monotonic() - self.reader.heard >= protocol.HEARTBEAT_INTERVAL:
+            try:
+                self.conn.sendall(protocol.encode_ping())
+            except OSError:
+                pass
+        self.root.after(HEARTBEAT_CHECK_MS, self.heartbeat)
+
+    def set_deadline(self, seconds, phase=None):
+        """Give player1 a number of seconds for their next message,
+           replacing the deadline before.
+
+        Args:
+            seconds (float): the time player1 has, None for no deadline.
+            phase (str): what player1 has to do: "handshake", "move" or "rematch".
+        """
+        if self.deadline is not None:
+            self.root.after_cancel(self.deadline)
+            self.deadline = None
+        if seconds is not None:
+            self.deadline = self.root.after(int(seconds * 1000), self.time_out, phase)
+
+    def time_out(self, phase):
+        """Give up on a player1 who missed the deadline of a phase.
+        """
+        self.deadline = None
+        try:
+            self.conn.sendall(protocol.encode_error(protocol.TIMEOUT, phase))
+        except OSError:
+            pass
+        self.drop_player1(f"Player1 missed the {phase} deadline.")
+
+    def drop_player1(self, reason):
+        """Close the connection of a player1 who left or timed out,
+           show the stats so far, then exit.
+
+        Args:
+            reason (str): why the game stopped.
+        """
+        self.finished = True
+        self.set_deadline(None)
+        self.conn.close()
+        self.reset_window()
+        reason_label = tk.Label(self.screen, text=reason)
+        reason_label.pack()
+        label = tk.Label(self.screen, text=self.game.computeStats())
+        label.pack()
+        self.root.after(10000, self.exit)
         
     def enter_host_info(self):
         """generate the interface with the entries for the host information.
         """
-        self.ip_label = tk.Label(self.root, text="Enter host ip:")
+        self.ip_label = tk.Label(self.screen, text="Enter host ip:")
         self.ip_label.pack()
         
-        self.host_ip_entry = tk.Entry(self.root)
+        self.host_ip_entry = tk.Entry(self.screen)
         self.host_ip_entry.pack()
         
-        self.port_label = tk.Label(self.root, text="Enter host port:")
+        self.port_label = tk.Label(self.screen, text="Enter host port:")
         self.port_label.pack()
         
-        self.host_port_entry = tk.Entry(self.root)
+        self.host_port_entry = tk.Entry(self.screen)
         self.host_port_entry.pack()
         
-        self.get_input_button = tk.Button(self.root, text="Get Host Info", command=self.get_host_info)
+        # player2 picks the board; larger boards are played by MCTS for the computer
+        self.width_label = tk.Label(self.screen, text="Board width:")
+        self.width_label.pack()
+        self.board_width_entry = tk.Entry(self.screen)
+        self.board_width_entry.insert(0, str(gameboard.BOARD_WIDTH))
+        self.board_width_entry.pack()
+        
+        self.win_length_label = tk.Label(self.screen, text="Marks in a row to win (empty for the width):")
+        self.win_length_label.pack()
+        self.win_length_entry = tk.Entry(self.screen)
+        self.win_length_entry.pack()
+        
+        self.get_input_button = tk.Button(self.screen, text="Get Host Info", command=self.get_host_info)
         self.get_input_button.pack()
+        
+        # tells what was wrong with the entries, which are kept for another try
+        self.host_error_label = tk.Label(self.screen, text="")
+        self.host_error_label.pack()
     
     def get_host_info(self):
         """Once `get_info` button clicked, it jumps to this function to 
-           retrieve host ip and port information of the server.
+           retrieve host ip and port information of the server, and the
+           board to play on.
            Then the server starts a new thread for listening to player1's connection.
+           If the board or the address is invalid, the user is told and
+           prompted again.
         """
         self.host_ip_addr = self.host_ip_entry.get()
         self.host_port = self.host_port_entry.get()
-        self.s.bind((self.host_ip_addr, int(self.host_port)))
-        self.s.listen(1)
+        try:
+            board_width = int(self.board_width_entry.get() or gameboard.BOARD_WIDTH)
+            win_length = int(self.win_length_entry.get() or board_width)
+            if board_width > MAX_BOARD_WIDTH:
+                raise ValueError(f"the board is at most {MAX_BOARD_WIDTH} wide")
+            self.game = gameboard.BoardClass(board_width, win_length)
+            # "unix:PATH" or "inproc:NAME" keep a player1 on the same host off TCP
+            self.s = transport.listen(self.host_ip_addr, self.host_port)
+        except (ValueError, OSError) as e:
+            self.host_error_label.config(text=f"Invalid host info: {e}")
+            return
         self.reset_window()
         
-        label = tk.Label(self.root, text="Listening to player1's connection...")
+        label = tk.Label(self.screen, text="Listening to player1's connection...")
         label.pack()
         # create a new thread to listen to player1's connection.
-        self.listen_thread = threading.Thread(target=listen_to_player1, 
-                                              kwargs={'buffer': self.buffer, 's':self.s})
+        # the same thread then receives every message of player1.
+        self.listen_thread = threading.Thread(target=listen_to_player1, daemon=True,
+                                              kwargs={'buffer': self.buffer, 's':self.s,
+                                                      'tracer': self.tracer})
         self.listen_thread.start()
-        self.root.after(2000, self.handle_connection)            
         
-    def handle_connection(self):
-        """ Handle the connection of player1.
-            If connected, create a new thread to receive
-            the username of player1.
+    def handle_connection(self, reader):
+        """ Handle the connection of player1 and wait
+            for the username of player1.
+
+        Args:
+            reader (MessageReader): the reader of the connection to player1.
         """
-        try:
-            self.conn = self.buffer.get()
-            self.reset_window()
-            label = tk.Label(self.root, text="Waiting for player1's name...")
-            label.pack()
-            self.recv_player1_name_thread = threading.Thread(target=recv_player1_name,
-                                                     kwargs={'buffer': self.buffer, 'conn':self.conn})
-            self.recv_player1_name_thread.start() 
-            self.root.after(1000, self.get_player1_name)             
-        except queue.Empty:
-            self.root.after(1000, self.handle_connection)    
+        self.reader = reader
+        self.conn = reader.sock
+        self.reset_window()
+        label = tk.Label(self.screen, text="Waiting for player1's name...")
+        label.pack()
+        self.set_deadline(HANDSHAKE_TIMEOUT, "handshake")
+        self.root.after(HEARTBEAT_CHECK_MS, self.heartbeat)
     
-    def get_player1_name(self):
-        """Get player1's name from buffer. Once successful, 
+    def get_player1_name(self, player1_name):
+        """Get player1's name from buffer, then
             prompt the user to enter the name of player2.
+
+        Args:
+            player1_name (str): the name received from player1.
         """
-        try:
-            # receive player1's name
-            self.player1_name = self.buffer.get()
-            show_name = tk.Label(self.root, text= str(self.player1_name))
-            show_name.pack()
+        # receive player1's name
+        self.player1_name = player1_name
+        self.set_deadline(None)
+        show_name = tk.Label(self.screen, text= str(self.player1_name))
+        show_name.pack()
             
-            username_label = tk.Label(self.root, text = "Enter player2's user name")
-            username_label.pack()
-            self.username_entry = tk.Entry(self.root)
-            self.username_entry.pack()
+        username_label = tk.Label(self.screen, text = "Enter player2's user name")
+        username_label.pack()
+        self.username_entry = tk.Entry(self.screen)
+        self.username_entry.pack()
             
-            get_username_button = tk.Button(self.root, text="Get Username", command=self.get_username)
-            get_username_button.pack()
-        except queue.Empty:
-            self.root.after(1000, self.get_player1_name)    
+        self.computer_var = tk.BooleanVar(self.root, value=False)
+        computer_check = tk.Checkbutton(self.screen, text="Let the computer play for player2",
+                                        variable=self.computer_var)
+        computer_check.pack()
+            
+        get_username_button = tk.Button(self.screen, text="Get Username", command=self.get_username)
+        get_username_button.pack()
         
     def get_username(self):
         """ Get the user input of the player2's name.
-            Send it to player1 and starts the game.
+            Send it to player1, after the board unless it is the 3x3
+            game, and starts the game.
         """
         self.player2_name = self.username_entry.get()
-        self.conn.sendall(self.player2_name.encode())
+        if self.computer_var.get():
+            self.ai = mcts.MCTSPlayer(COMPUTER_BUDGET)
+        frame = protocol.encode_hello(self.player2_name)
+        if (self.game.board_width, self.game.win_length) != (gameboard.BOARD_WIDTH, gameboard.BOARD_WIDTH):
+            frame = protocol.encode_board(self.game.board_width, self.game.win_length) + frame
+        self.conn.sendall(frame)
         self.game.set_player_name(self.player1_name, self.player2_name)
         
         self.play_game()
     
     def play_game(self):
-        """ Initialize game board interface and game logic.
-            Create a new thread to wait for the player1's first move.
+        """ Initialize game board interface and game logic,
+            then wait for the player1's first move.
         """
-        # init game board GUI
-        self.reset_window()
-        self.canvas = tk.Canvas(self.root, width=400, height=100)
-        self.turn_indicator = self.canvas.create_text(200, 15, text="Player1's turn", font=('Arial', 20))
-        self.canvas.place(x=0, y=350)
+        # init game board GUI, built for the first game only, then cleared in place
+        if self.board is None:
+            self.board = board_widget.BoardWidget(self.root, self.game.board_width,
+                                                  lambda r, c: self.handle_click(r, c, human=True))
+        self.board.reset("Player1's turn")
+        self.show_screen(self.board)
         self.game.init_player(self.player2_name, self.player2_name)
         self.game.resetGameBoard()
+        self.set_deadline(MOVE_TIMEOUT, "move")
         
-        self.buttons = []
-        for row in range(self.game.board_width):
-            button_row = []
-            for col in range(self.game.board_width):
-                button = tk.Button(self.root, text="", font=("Arial", 20), width=5, height=2,
-                                   command=lambda r=row, c=col: self.handle_click(r, c))
-                button.grid(row=row, column=col, padx=5, pady=5)
-                button_row.append(button)
-            self.buttons.append(button_row)  
-        # spawn a thread to receive the move from player1
-        self.recv_thread = threading.Thread(target=recv_player1_move, 
-                                                kwargs={'buffer': self.buffer, 'conn':self.conn})   
-        self.recv_thread.start()
-        self.root.after(1000, self.update_player1_move)  
         
-        
-    def update_player1_move(self):
-        """ Receive the player1's move from the message buffer,
-            and update the game board accordingly. 
+    def update_player1_move(self, r, c):
+        """ Update the game board with the player1's move
+            received from the message buffer.
+
+        Args:
+            r (int): row number
+            c (int): column number
         """
-        try:
-            (r,c) = self.buffer.get()
-            self.recv_thread.join()
-            self.game.updateGameBoard(self.player1_name, r, c, "X")
-            self.buttons[r][c].config(text="X", state=tk.DISABLED)
-            over = self.game.checkGameOver(r, c)  
-            self.canvas.itemconfigure(self.turn_indicator, text="Player2's turn")
+        self.game.updateGameBoard(self.player1_name, r, c, "X")
+        self.board.mark(r, c, "X")
+        self.tracer.stamp((r, c), "render")
+        self.tracer.finish((r, c))
+        over = self.game.checkGameOver(r, c)  
+        self.board.set_status("Player2's turn")
             
-            if over:
-                self.show_win_los_tie()
-                self.recv_play_again_thread = threading.Thread(target=recv_player1_play_again,
-                                                               kwargs={'buffer': self.buffer, 'conn':self.conn}) 
-                self.recv_play_again_thread.start()
-                self.root.after(1000, self.handle_play_again)
-        except queue.Empty:
-            self.root.after(1000, self.update_player1_move)    
+        if over:
+            self.store.record_game(self.game, self.player2_name, self.player1_name)
+            self.show_win_los_tie()
+            self.set_deadline(REMATCH_TIMEOUT, "rematch")
+            return
+        # no deadline while player2 thinks
+        self.set_deadline(None)
+        if self.ai is not None:
+            self.start_computer_move()
         
-    def handle_click(self, r, c):
+    def start_computer_move(self):
+        """Play the computer's move from the perfect-play table on the 3x3
+           board. On other boards, search it on a separate thread, so the
+           window stays responsive; the move then arrives through the buffer.
+        """
+        if self.game.isSolved():
+            self.board.set_info("perfect play")
+            r, c = self.game.bestMove()
+            self.handle_click(r, c)
+            return
+        self.board.set_status("Player2 is thinking...")
+        self.computer_state = mcts.snapshot(self.game)
+        self.computer_thread = threading.Thread(target=search_computer_move, daemon=True,
+                                                kwargs={'buffer': self.buffer, 'ai': self.ai,
+                                                        'state': self.computer_state})
+        self.computer_thread.start()
+
+    def play_computer_move(self, suggestion):
+        """Play the move found by the computer, unless the board
+           changed while it was searching.
+
+        Args:
+            suggestion (Suggestion): the computer's move and search rate.
+        """
+        if mcts.snapshot(self.game) != self.computer_state:
+            return
+        self.board.set_info(f"{suggestion.rollouts_per_sec:,.0f} rollouts/sec")
+        self.handle_click(suggestion.row, suggestion.col)
+        
+    def handle_click(self, r, c, human=False):
         """Handle the user clicks.
 
         Args:
             r (int): row number
             c (int): column number
+            human (bool): whether the move was clicked, rather than picked by the computer
         """
+        # when the computer plays for player2, the buttons are ignored
+        if human and self.ai is not None:
+            return
         # click is valid only when it's player2's turn
         if self.game.isMyTurn():
             legal = self.game.checkLegalMove(r, c)
             if legal is False:
                 return
+            self.tracer.stamp((r, c), "click")
             self.game.updateGameBoard(self.player2_name, r, c, "O")
-            self.buttons[r][c].config(text="O", state=tk.DISABLED)
-            move = str(r) + str(c)
-            self.conn.send(move.encode())
+            self.board.mark(r, c, "O")
+            self.tracer.stamp((r, c), "render")
+            self.conn.sendall(protocol.encode_move(r, c))
+            self.tracer.stamp((r, c), "send")
+            self.tracer.finish((r, c))
             over = self.game.checkGameOver(r, c)
-            self.canvas.itemconfigure(self.turn_indicator, text="Player1's turn")
+            self.board.set_status("Player1's turn")
             
             if over:
+                self.store.record_game(self.game, self.player2_name, self.player1_name)
                 self.show_win_los_tie()
-                self.recv_play_again_thread = threading.Thread(target=recv_player1_play_again,
-                                                               kwargs={'buffer': self.buffer, 'conn':self.conn}) 
-                self.recv_play_again_thread.start()
-                self.root.after(1000, self.handle_play_again)
+                self.set_deadline(REMATCH_TIMEOUT, "rematch")
             else:
-                self.recv_thread = threading.Thread(target=recv_player1_move, 
-                                                    kwargs={'buffer': self.buffer, 'conn':self.conn})   
-                self.recv_thread.start()
-                self.root.after(1000, self.update_player1_move)    
+                self.set_deadline(MOVE_TIMEOUT, "move")
     
-    def handle_play_again(self):
-        """ Get the player1's message from the buffer.
+    def handle_play_again(self, message):
+        """ Handle the player1's decision from the buffer.
             If playing again, restart the game. Otherwise,
             jump to show statistics function.
+
+        Args:
+            message (namedtuple): player1's Rematch or Quit message.
         """
-        try:
-            message = self.buffer.get()
-            if message == "Play Again":
-                self.play_game()
-            elif message == "Fun Times":
-                self.root.after(100, self.show_statics())
-        except queue.Empty:
-            self.root.after(1000, self.handle_play_again)    
+        if isinstance(message, protocol.Rematch):
+            self.play_game()
+        elif isinstance(message, protocol.Quit):
+            self.root.after(100, self.show_statics())
     
     def show_win_los_tie(self):
         """Show the win or lose state on canvas.
         """
         if self.game.isTie:
-            self.canvas.itemconfigure(self.turn_indicator, text="It's a tie.")
+            self.board.set_status("It's a tie.")
             return
         if self.game.imWinner:
-            self.canvas.itemconfigure(self.turn_indicator, text="I won!")
+            self.board.set_status("I won!")
         else:
-            self.canvas.itemconfigure(self.turn_indicator, text="I lost...")
+            self.board.set_status("I lost...")
                                       
     def show_statics(self):
         """When not playing again, show the statics of the game.
         """
+        self.finished = True
+        self.set_deadline(None)
         self.reset_window()
-        name_label = tk.Label(self.root, text="Player1's name: "+self.player1_name+ 
+        name_label = tk.Label(self.screen, text="Player1's name: "+self.player1_name+ 
                               "\n"+"Player2's name: "+self.player2_name)
         name_label.pack()
-        label = tk.Label(self.root, text=self.game.computeStats())
+        label = tk.Label(self.screen, text=self.game.computeStats())
         label.pack()
+        lifetime = self.store.lifetime(self.player2_name)
+        lifetime_label = tk.Label(self.screen, text="Lifetime:\n" + stats_store.format_stats(lifetime))
+        lifetime_label.pack()
         self.root.after(10000, self.exit)       
     
     def exit(self):
         """ exit the game.
         """   
         self.conn.close()
+        if self.ai is not None:
+            self.ai.close()
+        self.tracer.close(self.game.computeStats())
+        self.store.close()
         self.root.destroy()
             
     def start(self):
@@ -294,4 +502,6 @@ def run():
     app = App()
     app.start()
     
-run()
\ No newline at end of file
+# guarded, so the worker processes of the computer player can import this module
+if __name__ == "__main__":
+    run()
\ No newline at end of file
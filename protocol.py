@@ -0,0 +1,531 @@
+import struct
+import time
+from collections import deque, namedtuple
+
+# wire protocol shared by both players and the server.
+#
+# every message is a frame: a 4 byte header (version, type, payload length)
+# followed by the payload, so any number of messages can be read from one
+# recv() and a message split over several recv() calls is put back together.
+#
+# Ping and Pong are heartbeats of the connection, not messages: the readers
+# answer every Ping with a Pong and hand neither to the caller, only noting
+# when the peer was last heard from. A peer not heard from for
+# HEARTBEAT_TIMEOUT seconds is taken for dead; a side that may wait longer
+# than HEARTBEAT_INTERVAL for the other sends a Ping.
+
+VERSION = 1
+
+HEADER = struct.Struct("!BBH")
+MOVE_BODY = struct.Struct("!HH")
+ERROR_CODE = struct.Struct("!H")
+WATCH_BODY = struct.Struct("!I")
+# game id, board width, win length, byte lengths of both names; followed by
+# the names and the x and o bitboards
+SNAPSHOT_HEAD = struct.Struct("!IBBHH")
+# header of a Mux frame together with its session id
+MUX_HEAD = struct.Struct("!BBHI")
+SESSION_ID = struct.Struct("!I")
+# board width, win length, whether the game is over, whether player1 moved
+# last, then player1's games played, wins, losses and ties; followed by the
+# cells played so far
+STATE_HEAD = struct.Struct("!BBBBIIII")
+CELL = struct.Struct("!H")
+# board width and win length
+BOARD_BODY = struct.Struct("!BB")
+MAX_PAYLOAD = 0xFFFF
+
+# seconds of silence after which a Ping is sent, and after which the peer
+# is taken for dead
+HEARTBEAT_INTERVAL = 5.0
+HEARTBEAT_TIMEOUT = 15.0
+
+# message types
+HELLO = 1
+MOVE = 2
+REMATCH = 3
+QUIT = 4
+ERROR = 5
+MATCH = 6
+WATCH = 7
+SNAPSHOT = 8
+MUX = 9
+TOKEN = 10
+RESUME = 11
+STATE = 12
+PING = 13
+PONG = 14
+BOARD = 15
+
+# error codes
+BAD_MESSAGE = 1
+ILLEGAL_MOVE = 2
+NO_GAME = 3
+NO_SESSION = 4
+TIMEOUT = 5
+
+Hello = namedtuple("Hello", "name")
+Move = namedtuple("Move", "row col")
+Rematch = namedtuple("Rematch", "")
+Quit = namedtuple("Quit", "")
+Error = namedtuple("Error", "code text")
+# sent by the lobby instead of the opponent's Hello: who to play and with
+# which mark, 'X' moving first
+Match = namedtuple("Match", "opponent mark")
+# sent by a spectator instead of Hello: the game to watch, 0 for the game
+# that started last
+Watch = namedtuple("Watch", "game_id")
+# the whole board of a watched game, sent to a spectator when they start
+# watching, at the start of every game and after they fell behind. The
+# moves that follow are plain Move messages, 'X' moving first.
+Snapshot = namedtuple("Snapshot", "game_id player1 player2 board_width win_length x_bits o_bits")
+# any other message of one of the sessions multiplexed over a connection.
+# A connection that opens with a Mux carries any number of sessions, each
+# started by its own Hello and played as if it had the connection alone.
+Mux = namedtuple("Mux", "session message")
+# sent by the server after its Hello: the token that resumes the session if
+# the connection drops
+Token = namedtuple("Token", "token")
+# sent instead of Hello on a new connection, to carry on a dropped session
+Resume = namedtuple("Resume", "token")
+# the answer to Resume: everything player1 needs to carry on, with the
+# cells played in the current game as row * board_width + col, 'X' first
+State = namedtuple("State", "board_width win_length over player1_last games_played wins losses ties"
+                            " moves")
+Ping = namedtuple("Ping", "")
+Pong = namedtuple("Pong", "")
+# sent by player2 before its Hello when the board is not the 3x3 game: the
+# board both players set up for the match
+Board = namedtuple("Board", "board_width win_length")
+
+
+class ProtocolError(Exception):
+    """Raised when the peer sends bytes that are not a valid message.
+    """
+
+
+def _frame(msg_type, payload=b""):
+    """Put the header in front of a payload.
+
+    Args:
+        msg_type (int): the message type.
+        payload (bytes): the encoded body of the message.
+
+    Returns:
+        bytes: the complete frame.
+    """
+    if len(payload) > MAX_PAYLOAD:
+        raise ProtocolError(f"payload of {len(payload)} bytes is too long")
+    return HEADER.pack(VERSION, msg_type, len(payload)) + payload
+
+
+def encode_hello(name):
+    """Encode the name sent by each player during the handshake.
+    """
+    return _frame(HELLO, name.encode())
+
+
+def encode_move(row, col):
+    """Encode a move.
+    """
+    return HEADER.pack(VERSION, MOVE, MOVE_BODY.size) + MOVE_BODY.pack(row, col)
+
+
+def encode_rematch():
+    """Encode player1's "Play Again" decision.
+    """
+    return _REMATCH_FRAME
+
+
+def encode_quit():
+    """Encode player1's "Fun Times" decision, or any player leaving.
+    """
+    return _QUIT_FRAME
+
+
+def encode_error(code, text=""):
+    """Encode an error reported to the peer.
+    """
+    return _frame(ERROR, ERROR_CODE.pack(code) + text.encode())
+
+
+def encode_match(opponent, mark):
+    """Encode the lobby's pairing of a player with an opponent.
+    """
+    return _frame(MATCH, mark.encode() + opponent.encode())
+
+
+def encode_watch(game_id):
+    """Encode a spectator's request to watch a game.
+    """
+    return _frame(WATCH, WATCH_BODY.pack(game_id))
+
+
+def encode_mux(session, frame):
+    """Wrap an encoded message into the frame of one multiplexed session.
+
+    Args:
+        session (int): the session id chosen by the client.
+        frame (bytes): the message, as returned by the other encoders.
+    """
+    if len(frame) + SESSION_ID.size > MAX_PAYLOAD:
+        raise ProtocolError(f"payload of {len(frame) + SESSION_ID.size} bytes is too long")
+    return MUX_HEAD.pack(VERSION, MUX, len(frame) + SESSION_ID.size, session) + frame
+
+
+def encode_token(token):
+    """Encode the resume token of a session.
+    """
+    return _frame(TOKEN, token)
+
+
+def encode_resume(token):
+    """Encode a request to resume the session of a token.
+    """
+    return _frame(RESUME, token)
+
+
+def encode_state(board_width, win_length, over, player1_last, games_played, wins, losses, ties,
+                 moves):
+    """Encode the state of a resumed session.
+    """
+    return _frame(STATE, STATE_HEAD.pack(board_width, win_length, over, player1_last, games_played,
+                                         wins, losses, ties)
+                  + struct.pack(f"!{len(moves)}H", *moves))
+
+
+def encode_ping():
+    """Encode a heartbeat asking the peer to answer.
+    """
+    return _PING_FRAME
+
+
+def encode_pong():
+    """Encode the answer to a Ping.
+    """
+    return _PONG_FRAME
+
+
+def encode_board(board_width, win_length):
+    """Encode the board of a match.
+    """
+    return _frame(BOARD, BOARD_BODY.pack(board_width, win_length))
+
+
+def _bitboard_size(board_width):
+    """Get the bytes of one bitboard of a board.
+    """
+    return (board_width * board_width + 7) // 8
+
+
+def encode_snapshot(game_id, player1, player2, board_width, win_length, x_bits, o_bits):
+    """Encode the board of a watched game.
+    """
+    name1 = player1.encode()
+    name2 = player2.encode()
+    size = _bitboard_size(board_width)
+    return _frame(SNAPSHOT, SNAPSHOT_HEAD.pack(game_id, board_width, win_length, len(name1), len(name2))
+                  + name1 + name2 + x_bits.to_bytes(size, "big") + o_bits.to_bytes(size, "big"))
+
+
+_REMATCH_FRAME = _frame(REMATCH)
+_QUIT_FRAME = _frame(QUIT)
+_PING_FRAME = _frame(PING)
+_PONG_FRAME = _frame(PONG)
+_REMATCH = Rematch()
+_QUIT = Quit()
+
+
+def encode(message):
+    """Encode any message tuple.
+
+    Args:
+        message (namedtuple): a Hello, Move, Rematch, Quit, Error, Match,
+                              Watch, Snapshot, Mux, Token, Resume, State,
+                              Ping, Pong or Board.
+
+    Returns:
+        bytes: the frame of the message.
+    """
+    if isinstance(message, Move):
+        return encode_move(message.row, message.col)
+    if isinstance(message, Hello):
+        return encode_hello(message.name)
+    if isinstance(message, Rematch):
+        return _REMATCH_FRAME
+    if isinstance(message, Quit):
+        return _QUIT_FRAME
+    if isinstance(message, Error):
+        return encode_error(message.code, message.text)
+    if isinstance(message, Match):
+        return encode_match(message.opponent, message.mark)
+    if isinstance(message, Watch):
+        return encode_watch(message.game_id)
+    if isinstance(message, Snapshot):
+        return encode_snapshot(*message)
+    if isinstance(message, Mux):
+        return encode_mux(message.session, encode(message.message))
+    if isinstance(message, Token):
+        return encode_token(message.token)
+    if isinstance(message, Resume):
+        return encode_resume(message.token)
+    if isinstance(message, State):
+        return encode_state(*message)
+    if isinstance(message, Ping):
+        return _PING_FRAME
+    if isinstance(message, Pong):
+        return _PONG_FRAME
+    if isinstance(message, Board):
+        return encode_board(*message)
+    raise ProtocolError(f"cannot encode {message!r}")
+
+
+def _decode_text(buf, start, end):
+    """Decode the UTF-8 text of `buf[start:end]`.
+    """
+    try:
+        return bytes(buf[start:end]).decode()
+    except UnicodeDecodeError as e:
+        raise ProtocolError(f"text is not UTF-8: {e}") from e
+
+
+def _decode_payload(msg_type, buf, start, length):
+    """Build the message tuple from a payload inside `buf`.
+    """
+    if msg_type == MOVE:
+        if length != MOVE_BODY.size:
+            raise ProtocolError(f"move payload of {length} bytes")
+        return Move._make(MOVE_BODY.unpack_from(buf, start))
+    if msg_type == HELLO:
+        return Hello(_decode_text(buf, start, start + length))
+    if msg_type == REMATCH:
+        return _REMATCH
+    if msg_type == QUIT:
+        return _QUIT
+    if msg_type == ERROR:
+        if length < ERROR_CODE.size:
+            raise ProtocolError(f"error payload of {length} bytes")
+        (code,) = ERROR_CODE.unpack_from(buf, start)
+        return Error(code, _decode_text(buf, start + ERROR_CODE.size, start + length))
+    if msg_type == MATCH:
+        if length < 1 or buf[start] not in b"XO":
+            raise ProtocolError("match without a mark")
+        return Match(_decode_text(buf, start + 1, start + length), chr(buf[start]))
+    if msg_type == WATCH:
+        if length != WATCH_BODY.size:
+            raise ProtocolError(f"watch payload of {length} bytes")
+        return Watch(*WATCH_BODY.unpack_from(buf, start))
+    if msg_type == SNAPSHOT:
+        return _decode_snapshot(buf, start, length)
+    if msg_type == MUX:
+        return _decode_mux(buf, start, length)
+    if msg_type == TOKEN:
+        return Token(bytes(buf[start:start + length]))
+    if msg_type == RESUME:
+        return Resume(bytes(buf[start:start + length]))
+    if msg_type == STATE:
+        if length < STATE_HEAD.size or (length - STATE_HEAD.size) % CELL.size:
+            raise ProtocolError(f"state payload of {length} bytes")
+        head = STATE_HEAD.unpack_from(buf, start)
+        count = (length - STATE_HEAD.size) // CELL.size
+        moves = struct.unpack_from(f"!{count}H", buf, start + STATE_HEAD.size)
+        return State(*head[:2], bool(head[2]), bool(head[3]), *head[4:], moves)
+    if msg_type == BOARD:
+        if length != BOARD_BODY.size:
+            raise ProtocolError(f"board payload of {length} bytes")
+        return Board._make(BOARD_BODY.unpack_from(buf, start))
+    raise ProtocolError(f"unknown message type {msg_type}")
+
+
+def _decode_snapshot(buf, start, length):
+    """Build a Snapshot from its payload inside `buf`.
+    """
+    if length < SNAPSHOT_HEAD.size:
+        raise ProtocolError(f"snapshot payload of {length} bytes")
+    game_id, board_width, win_length, len1, len2 = SNAPSHOT_HEAD.unpack_from(buf, start)
+    size = _bitboard_size(board_width)
+    if length != SNAPSHOT_HEAD.size + len1 + len2 + 2 * size:
+        raise ProtocolError(f"snapshot payload of {length} bytes")
+    offset = start + SNAPSHOT_HEAD.size
+    player1 = _decode_text(buf, offset, offset + len1)
+    offset += len1
+    player2 = _decode_text(buf, offset, offset + len2)
+    offset += len2
+    x_bits = int.from_bytes(buf[offset:offset + size], "big")
+    o_bits = int.from_bytes(buf[offset + size:offset + 2 * size], "big")
+    return Snapshot(game_id, player1, player2, board_width, win_length, x_bits, o_bits)
+
+
+def _decode_mux(buf, start, length):
+    """Build a Mux from its payload inside `buf`.
+    """
+    if length < SESSION_ID.size + HEADER.size:
+        raise ProtocolError(f"mux payload of {length} bytes")
+    (session,) = SESSION_ID.unpack_from(buf, start)
+    version, msg_type, inner = HEADER.unpack_from(buf, start + SESSION_ID.size)
+    if version != VERSION:
+        raise ProtocolError(f"unsupported protocol version {version}")
+    if msg_type == MUX or inner != length - SESSION_ID.size - HEADER.size:
+        raise ProtocolError("malformed mux message")
+    return Mux(session, _decode_payload(msg_type, buf, start + SESSION_ID.size + HEADER.size, inner))
+
+
+class Decoder:
+    """Streaming decoder: feed it bytes as they arrive, get whole messages back.
+    """
+    def __init__(self):
+        """initialize the decoder with an empty buffer.
+        """
+        self.buffer = bytearray()
+        # Pings received and not answered yet
+        self.pings = 0
+        # a malformed message met after valid ones, raised by the next call
+        self.error = None
+
+    def feed(self, data):
+        """Add received bytes and decode every complete message.
+
+        Args:
+            data (bytes): bytes received from the peer.
+
+        Returns:
+            list: the decoded messages, in order, without the heartbeats.
+                  Bytes of an incomplete message are kept for the next call.
+
+        Raises:
+            ProtocolError: at the first malformed message, once the valid
+                           messages before it have been returned.
+        """
+        if self.error is not None:
+            raise self.error
+        buf = self.buffer
+        buf += data
+        messages = []
+        offset = 0
+        end = len(buf)
+        while end - offset >= HEADER.size:
+            version, msg_type, length = HEADER.unpack_from(buf, offset)
+            if version != VERSION:
+                self.error = ProtocolError(f"unsupported protocol version {version}")
+                break
+            start = offset + HEADER.size
+            if end - start < length:
+                break
+            if msg_type == PING:
+                self.pings += 1
+            elif msg_type != PONG:
+                try:
+                    messages.append(_decode_payload(msg_type, buf, start, length))
+                except ProtocolError as e:
+                    self.error = e
+                    break
+                except struct.error as e:
+                    self.error = ProtocolError(f"malformed message of type {msg_type}: {e}")
+                    break
+            offset = start + length
+        if offset:
+            del buf[:offset]
+        # the messages before a malformed one are handed over first
+        if self.error is not None and not messages:
+            raise self.error
+        return messages
+
+
+class MessageReader:
+    """Reads messages one at a time from a blocking socket, answering Pings.
+    """
+    def __init__(self, sock):
+        """initialize the reader.
+
+        Args:
+            sock (socket): the connected socket to read from.
+        """
+        self.sock = sock
+        self.decoder = Decoder()
+        self.pending = deque()
+        # time.monotonic() of the last bytes received
+        self.heard = time.monotonic()
+
+    def recv(self):
+        """Wait for the next message.
+
+        Returns:
+            namedtuple: the next message from the peer.
+        """
+        while not self.pending:
+            if self.decoder.error is not None:
+                raise self.decoder.error
+            data = self.sock.recv(65536)
+            if not data:
+                raise ConnectionError("connection closed by peer")
+            self.heard = time.monotonic()
+            self.pending.extend(self.decoder.feed(data))
+            if self.decoder.pings:
+                self.decoder.pings = 0
+                self.sock.sendall(_PONG_FRAME)
+        return self.pending.popleft()
+
+
+class AsyncMessageReader:
+    """Reads messages one at a time from an asyncio StreamReader, answering
+       Pings if it has the writer of the connection.
+    """
+    def __init__(self, reader, writer=None):
+        """initialize the reader.
+
+        Args:
+            reader (StreamReader): the stream to read from.
+            writer (StreamWriter): the stream Pongs are written to, if any.
+        """
+        self.reader = reader
+        self.writer = writer
+        self.decoder = Decoder()
+        self.pending = deque()
+        # time.monotonic() of the last bytes received
+        self.heard = time.monotonic()
+
+    def _feed(self, data):
+        """Decode received bytes, noting the time and answering Pings.
+        """
+        self.heard = time.monotonic()
+        messages = self.decoder.feed(data)
+        if self.decoder.pings:
+            self.decoder.pings = 0
+            if self.writer is not None and not self.writer.is_closing():
+                self.writer.write(_PONG_FRAME)
+        return messages
+
+    async def recv(self):
+        """Wait for the next message.
+
+        Returns:
+            namedtuple: the next message from the peer.
+        """
+        while not self.pending:
+            if self.decoder.error is not None:
+                raise self.decoder.error
+            data = await self.reader.read(65536)
+            if not data:
+                raise ConnectionError("connection closed by peer")
+            self.pending.extend(self._feed(data))
+        return self.pending.popleft()
+
+    async def recv_batch(self):
+        """Wait for the next messages.
+
+        Returns:
+            list: every message already received, at least one.
+        """
+        if not self.pending:
+            while True:
+                if self.decoder.error is not None:
+                    raise self.decoder.error
+                data = await self.reader.read(65536)
+                if not data:
+                    raise ConnectionError("connection closed by peer")
+                messages = self._feed(data)
+                if messages:
+                    return messages
+        messages = list(self.pending)
+        self.pending.clear()
+        return messages
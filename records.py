@@ -0,0 +1,393 @@
+import argparse
+import mmap
+import os
+import struct
+from collections import Counter, namedtuple
+
+import gameboard
+
+# compact binary records of finished games, for keeping and replaying
+# millions of games.
+#
+# a segment is three files:
+#     games.seg        magic, then one record per game, back to back
+#     games.seg.idx    the offset of every record in the segment, '<Q' each
+#     games.seg.names  the player names, '<H' length + UTF-8 each; the
+#                      position of a name in this file is the player's id
+#
+# a record is a RECORD header followed by the moves of the game, packed as
+# cell indices (row * width + col) of 4 bits on boards of up to 16 cells,
+# 8 bits up to 256 cells and 16 bits beyond. A 3x3 game takes 13 + 5 bytes.
+# The reader maps the segment and the index, so a game is only decoded when
+# it is asked for and an audit over millions of them runs in constant memory.
+
+DEFAULT_PATH = os.environ.get("TTT_RECORDS", "games.seg")
+
+SEGMENT_MAGIC = b"TTG1"
+# player1 id, player2 id, board width, win length, result, number of moves
+RECORD = struct.Struct("<IIBBBH")
+OFFSET = struct.Struct("<Q")
+NAME_LENGTH = struct.Struct("<H")
+
+# results, player1 ('X') always moving first
+TIE = 0
+PLAYER1_WON = 1
+PLAYER2_WON = 2
+
+GameRecord = namedtuple("GameRecord", "player1 player2 board_width win_length result moves")
+
+
+def _move_bits(width):
+    """Get the number of bits of a packed move on a board.
+    """
+    cells = width * width
+    if cells <= 16:
+        return 4
+    if cells <= 256:
+        return 8
+    return 16
+
+
+def pack_moves(cells, width):
+    """Pack the moves of a game.
+
+    Args:
+        cells (list): the cells played, in order, as row * width + col.
+        width (int): the board width.
+
+    Returns:
+        bytes: the packed moves.
+    """
+    bits = _move_bits(width)
+    if bits == 4:
+        padded = list(cells) + [0] * (len(cells) & 1)
+        return bytes(a << 4 | b for a, b in zip(padded[::2], padded[1::2]))
+    if bits == 8:
+        return bytes(cells)
+    return struct.pack(f"<{len(cells)}H", *cells)
+
+
+def unpack_moves(buffer, offset, count, width):
+    """Unpack `count` moves packed by `pack_moves` from `buffer` at `offset`.
+
+    Returns:
+        list: the cells played, in order.
+    """
+    bits = _move_bits(width)
+    if bits == 4:
+        packed = buffer[offset:offset + (count + 1) // 2]
+        cells = []
+        for byte in packed:
+            cells.append(byte >> 4)
+            cells.append(byte & 0xF)
+        return cells[:count]
+    if bits == 8:
+        return list(buffer[offset:offset + count])
+    return list(struct.unpack_from(f"<{count}H", buffer, offset))
+
+
+def _record_size(count, width):
+    """Get the size in bytes of a record of `count` moves.
+    """
+    return RECORD.size + (count * _move_bits(width) + 7) // 8
+
+
+def result_of(game):
+    """Get the result of a finished game from the moves played.
+
+    Args:
+        game (BoardClass): the board, right after `checkGameOver` returned True.
+
+    Returns:
+        int: TIE, PLAYER1_WON or PLAYER2_WON.
+    """
+    if game.isTie:
+        return TIE
+    # the player who made the last move won
+    return PLAYER1_WON if len(game.history) % 2 else PLAYER2_WON
+
+
+def _read_names(path):
+    """Read a names file.
+
+    Returns:
+        tuple: (list of names, size of the complete entries in bytes).
+    """
+    names = []
+    if not os.path.exists(path):
+        return names, 0
+    with open(path, "rb") as f:
+        data = f.read()
+    offset = 0
+    while offset + NAME_LENGTH.size <= len(data):
+        length, = NAME_LENGTH.unpack_from(data, offset)
+        end = offset + NAME_LENGTH.size + length
+        if end > len(data):
+            break
+        names.append(data[offset + NAME_LENGTH.size:end].decode("utf-8"))
+        offset = end
+    return names, offset
+
+
+def _complete_records(segment, index, size):
+    """Count the indexed records that are entirely in the segment; after a
+       crash the index may run ahead of the segment.
+
+    Args:
+        segment (buffer): the segment.
+        index (buffer): the index.
+        size (int): the number of bytes of the segment.
+
+    Returns:
+        tuple: (number of complete records, end of the last one).
+    """
+    count = len(index) // OFFSET.size
+    while count:
+        offset, = OFFSET.unpack_from(index, (count - 1) * OFFSET.size)
+        if offset + RECORD.size <= size:
+            *_, width, _, _, moves = RECORD.unpack_from(segment, offset)
+            end = offset + _record_size(moves, width)
+            if end <= size:
+                return count, end
+        count -= 1
+    return 0, len(SEGMENT_MAGIC)
+
+
+class GameRecorder:
+    """Appends finished games to a segment.
+    """
+    def __init__(self, path=DEFAULT_PATH):
+        """open the segment, creating it if needed. Anything written after
+           the last complete record is dropped.
+
+        Args:
+            path (str): the segment file; the index and the names are kept
+                        next to it.
+        """
+        self.path = path
+        self.names, names_size = _read_names(path + ".names")
+        self.ids = {name: i for i, name in enumerate(self.names)}
+        if os.path.exists(path) and os.path.getsize(path) >= len(SEGMENT_MAGIC):
+            segment = _map(path)
+            index = _map(path + ".idx") if os.path.exists(path + ".idx") else b""
+            try:
+                if segment[:len(SEGMENT_MAGIC)] != SEGMENT_MAGIC:
+                    raise ValueError(f"{path} is not a game segment")
+                self.count, end = _complete_records(segment, index, len(segment))
+            finally:
+                for mapped in (segment, index):
+                    if isinstance(mapped, mmap.mmap):
+                        mapped.close()
+        else:
+            with open(path, "wb") as f:
+                f.write(SEGMENT_MAGIC)
+            self.count, end = 0, len(SEGMENT_MAGIC)
+        self.end = end
+        self.segment = open(path, "r+b")
+        self.segment.truncate(end)
+        self.segment.seek(end)
+        self.index = open(path + ".idx", "a+b")
+        self.index.truncate(self.count * OFFSET.size)
+        self.names_file = open(path + ".names", "a+b")
+        self.names_file.truncate(names_size)
+
+    def player_id(self, name):
+        """Get the id of a player, adding the name if it is new.
+        """
+        player_id = self.ids.get(name)
+        if player_id is None:
+            player_id = self.ids[name] = len(self.names)
+            self.names.append(name)
+            encoded = name.encode("utf-8")
+            self.names_file.write(NAME_LENGTH.pack(len(encoded)) + encoded)
+        return player_id
+
+    def record(self, player1, player2, width, win_length, result, cells):
+        """Append one game.
+
+        Args:
+            player1 (str): name of player 1, who played 'X' and moved first.
+            player2 (str): name of player 2.
+            width (int): the board width.
+            win_length (int): how many marks in a row won.
+            result (int): TIE, PLAYER1_WON or PLAYER2_WON.
+            cells (list): the cells played, in order, as row * width + col.
+        """
+        record = RECORD.pack(self.player_id(player1), self.player_id(player2),
+                             width, win_length, result, len(cells)) + pack_moves(cells, width)
+        self.segment.write(record)
+        self.index.write(OFFSET.pack(self.end))
+        self.end += len(record)
+        self.count += 1
+
+    def record_game(self, game, player1, player2):
+        """Append a finished game.
+
+        Args:
+            game (BoardClass): the board, right after `checkGameOver` returned True.
+            player1 (str): name of player 1.
+            player2 (str): name of player 2.
+        """
+        self.record(player1, player2, game.board_width, game.win_length,
+                    result_of(game), game.history)
+
+    def flush(self):
+        """Write the buffered records; names and records go out before
+           the index entries that refer to them.
+        """
+        self.names_file.flush()
+        self.segment.flush()
+        self.index.flush()
+
+    def close(self):
+        """Write the buffered records and close the files.
+        """
+        self.flush()
+        self.names_file.close()
+        self.segment.close()
+        self.index.close()
+
+
+def _map(path):
+    """Map a file read-only; empty files can not be mapped.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class SegmentReader:
+    """Random access to the games of a segment, through memory maps.
+    """
+    def __init__(self, path=DEFAULT_PATH):
+        """map the segment and its index. Games recorded after this are
+           not seen.
+
+        Args:
+            path (str): the segment file.
+        """
+        self.segment = _map(path)
+        if self.segment[:len(SEGMENT_MAGIC)] != SEGMENT_MAGIC:
+            raise ValueError(f"{path} is not a game segment")
+        self.index = _map(path + ".idx")
+        self.names, _ = _read_names(path + ".names")
+        self.count, _ = _complete_records(self.segment, self.index, len(self.segment))
+
+    def __len__(self):
+        return self.count
+
+    def _offset(self, i):
+        """Get the offset of game `i`, negative indexes counting from the end.
+        """
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError("game index out of range")
+        return OFFSET.unpack_from(self.index, i * OFFSET.size)[0]
+
+    def header(self, i):
+        """Read the header of game `i` without unpacking its moves.
+
+        Returns:
+            tuple: (player1 id, player2 id, width, win length, result, number of moves).
+        """
+        return RECORD.unpack_from(self.segment, self._offset(i))
+
+    def cells(self, i):
+        """Read the cells played in game `i`, in order.
+        """
+        offset = self._offset(i)
+        *_, width, _, _, count = RECORD.unpack_from(self.segment, offset)
+        return unpack_moves(self.segment, offset + RECORD.size, count, width)
+
+    def __getitem__(self, i):
+        """Decode game `i`.
+
+        Returns:
+            GameRecord: the players' names, the board and the (row, col) moves.
+        """
+        offset = self._offset(i)
+        player1, player2, width, win_length, result, count = RECORD.unpack_from(self.segment, offset)
+        cells = unpack_moves(self.segment, offset + RECORD.size, count, width)
+        return GameRecord(self.names[player1], self.names[player2], width, win_length,
+                          result, [divmod(cell, width) for cell in cells])
+
+    def __iter__(self):
+        """Decode the games one at a time, in the order they were recorded.
+        """
+        for i in range(self.count):
+            yield self[i]
+
+    def results(self):
+        """Count the results of every game, reading only the headers.
+
+        Returns:
+            Counter: number of games per result.
+        """
+        counts = Counter()
+        for i in range(self.count):
+            counts[RECORD.unpack_from(self.segment, self._offset(i))[4]] += 1
+        return counts
+
+    def replay(self, i):
+        """Replay game `i` on a new board.
+
+        Returns:
+            BoardClass: the board at the end of the game, owned by player 1.
+        """
+        record = self[i]
+        game = gameboard.BoardClass(record.board_width, record.win_length)
+        game.set_player_name(record.player1, record.player2)
+        game.init_player(record.player1, record.player2)
+        for n, (row, col) in enumerate(record.moves):
+            if n % 2:
+                game.updateGameBoard(record.player2, row, col, "O")
+            else:
+                game.updateGameBoard(record.player1, row, col, "X")
+        if record.moves:
+            game.checkGameOver(*record.moves[-1])
+        return game
+
+    def close(self):
+        """Unmap the files.
+        """
+        for mapped in (self.segment, self.index):
+            if isinstance(mapped, mmap.mmap):
+                mapped.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main(argv=None):
+    """summarize a segment, or show one of its games.
+    """
+    parser = argparse.ArgumentParser(description="Inspect recorded games.")
+    parser.add_argument("path", nargs="?", default=DEFAULT_PATH)
+    parser.add_argument("--show", type=int, default=None, help="index of a game to replay")
+    args = parser.parse_args(argv)
+
+    with SegmentReader(args.path) as reader:
+        if args.show is None:
+            results = reader.results()
+            size = len(reader.segment) + len(reader.index)
+            print(f"games: {len(reader)}")
+            print(f"players: {len(reader.names)}")
+            print(f"player1 won: {results[PLAYER1_WON]}, player2 won: {results[PLAYER2_WON]},"
+                  f" ties: {results[TIE]}")
+            print(f"bytes/game: {size / max(len(reader), 1):.1f}")
+        else:
+            record = reader[args.show]
+            print(f"{record.player1} (X) vs {record.player2} (O),"
+                  f" {record.board_width}x{record.board_width}, {record.win_length} in a row")
+            print("moves: " + " ".join(f"{r},{c}" for r, c in record.moves))
+            for row in reader.replay(args.show).game_board:
+                print("|".join(row))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import argparse
+import multiprocessing
+import os
+import time
+
+import bots
+import gameboard
+
+# offline self-play: two bots play each other on BoardClass directly, with
+# no sockets and no Tk, to stress the engine and compare bots at scale.
+#
+#     python selfplay.py --games 1000000 --bot1 random --bot2 table
+#
+# the games are cut into chunks spread over a process pool. Each worker
+# plays a whole chunk on one board and sends back only its counters, which
+# are added up as they arrive, so a run of millions of games holds a few
+# numbers per chunk in memory. The random bots of a chunk are seeded from
+# --seed and the chunk's first game, so a seeded run gives the same results
+# whatever the number of workers.
+#
+# the results are counted from bot 1's side, in the form of
+# `BoardClass.computeStats`.
+
+BOT1_NAME = "bot1"
+BOT2_NAME = "bot2"
+
+
+def play_chunk(chunk):
+    """Play a chunk of games.
+
+    Args:
+        chunk (tuple): (first game, number of games, bot 1 kind, bot 1 script,
+                       bot 2 kind, bot 2 script, board width, win length,
+                       seed or None, whether the bots take turns playing 'X').
+
+    Returns:
+        tuple: (games played, wins, losses, ties, moves) of bot 1.
+    """
+    first, count, kind1, script1, kind2, script2, width, win_length, seed, alternate = chunk
+    bot1 = bots.make_bot(kind1, seed=None if seed is None else 2 * (seed + first), script=script1)
+    bot2 = bots.make_bot(kind2, seed=None if seed is None else 2 * (seed + first) + 1, script=script2)
+    game = gameboard.BoardClass(width, win_length)
+    game.init_player(BOT1_NAME, BOT2_NAME)
+    game.set_player_name(BOT1_NAME, BOT2_NAME)
+    moves = 0
+    for i in range(first, first + count):
+        game.resetGameBoard()
+        players = ((bot1, BOT1_NAME), (bot2, BOT2_NAME))
+        if alternate and i % 2:
+            players = players[::-1]
+        turn = 0
+        while True:
+            bot, name = players[turn]
+            r, c = bot.choose_move(game)
+            game.updateGameBoard(name, r, c, "O" if turn else "X")
+            if game.checkGameOver(r, c):
+                break
+            turn = 1 - turn
+        moves += game.moves
+    return game.games_played, game.wins, game.losses, game.ties, moves
+
+
+def chunks(args):
+    """Cut the games of a run into chunks, lazily.
+    """
+    for first in range(0, args.games, args.chunk):
+        yield (first, min(args.chunk, args.games - first), args.bot1, args.script1,
+               args.bot2, args.script2, args.width, args.win_length, args.seed, args.alternate)
+
+
+class SelfPlayStats:
+    """Results of a run, added up chunk by chunk.
+    """
+    def __init__(self, board_width, win_length):
+        """initialize the counters.
+        """
+        self.started = time.perf_counter()
+        # counts the results the same way a player's own board does
+        self.total = gameboard.BoardClass(board_width, win_length)
+        self.moves = 0
+        self.chunks = 0
+
+    def add_chunk(self, result):
+        """Add the counters of a finished chunk.
+        """
+        games, wins, losses, ties, moves = result
+        self.total.games_played += games
+        self.total.wins += wins
+        self.total.losses += losses
+        self.total.ties += ties
+        self.moves += moves
+        self.chunks += 1
+
+    def computeStats(self):
+        """compute the stats of the run, like `BoardClass.computeStats`.
+        """
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        str = self.total.computeStats() + \
+            f"Moves: {self.moves}\n" + \
+            f"Games/sec: {self.total.games_played / elapsed:.1f}\n" + \
+            f"Moves/sec: {self.moves / elapsed:.1f}\n"
+        return str
+
+
+def run(args):
+    """Play every chunk of a run.
+
+    Returns:
+        SelfPlayStats: the results.
+    """
+    stats = SelfPlayStats(args.width, args.win_length)
+    if args.workers == 1:
+        results = map(play_chunk, chunks(args))
+        pool = None
+    else:
+        pool = multiprocessing.Pool(args.workers)
+        results = pool.imap_unordered(play_chunk, chunks(args))
+    try:
+        for result in results:
+            stats.add_chunk(result)
+            if args.progress:
+                print(f"{stats.total.games_played}/{args.games} games", flush=True)
+    finally:
+        if pool is not None:
+            pool.terminate()
+    return stats
+
+
+def main(argv=None):
+    """run a self-play tournament.
+    """
+    parser = argparse.ArgumentParser(description="Play bots against each other offline.")
+    parser.add_argument("--games", type=int, default=100000)
+    parser.add_argument("--chunk", type=int, default=10000, help="games per task of a worker")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--bot1", choices=("random", "scripted", "table"), default="random")
+    parser.add_argument("--bot2", choices=("random", "scripted", "table"), default="random")
+    parser.add_argument("--script1", default="1,1 0,0 0,2 2,0 2,2 0,1 1,0 1,2 2,1",
+                        help="moves of bot 1 if scripted")
+    parser.add_argument("--script2", default="1,1 0,0 0,2 2,0 2,2 0,1 1,0 1,2 2,1",
+                        help="moves of bot 2 if scripted")
+    parser.add_argument("--width", type=int, default=gameboard.BOARD_WIDTH)
+    parser.add_argument("--win-length", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--alternate", action="store_true",
+                        help="swap 'X' between the bots every game; bot 1 always plays 'X' otherwise")
+    parser.add_argument("--progress", action="store_true", help="print the games done after each chunk")
+    args = parser.parse_args(argv)
+    if "table" in (args.bot1, args.bot2) and (args.width != 3 or args.win_length not in (None, 3)):
+        parser.error("the table bot only plays the 3x3 game")
+
+    stats = run(args)
+    print(f"{args.bot1} vs {args.bot2}, {args.width}x{args.width}, {args.workers} workers")
+    print(stats.computeStats(), end="")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,796 @@
+import argparse
+import asyncio
+import secrets
+import time
+from collections import namedtuple
+
+import bots
+import gameboard
+import metrics
+import protocol
+import records
+import spectators
+import stats_store
+import timers
+import transport
+
+# headless host, always plays player 2 ('O/o') against every connection.
+# A connection may also carry many matches at once, see `protocol.Mux`.
+#
+# if player1's connection drops, the session is parked with its board for
+# RESUME_TIMEOUT seconds; a new connection sending the session's token
+# gets the whole state in one State message and carries on.
+#
+# every phase has a deadline: player1 has DEADLINES.handshake seconds from
+# connecting to send Hello, then DEADLINES.move for each move and
+# DEADLINES.rematch to decide on another game, or the session ends with a
+# TIMEOUT error. A connection quiet for the heartbeat interval gets a Ping,
+# and one quiet for the heartbeat timeout is taken for dead and closed,
+# its session parked. The deadlines, heartbeats and parked sessions' expiry
+# are all timers of one wheel, see timers.py.
+#
+# with --metrics-port, live counters and latency histograms are served at
+# http://host:port/metrics in the Prometheus text format, see metrics.py.
+#
+# a --host of "unix:PATH" listens on a Unix domain socket instead of TCP,
+# for bots on the same machine, see transport.py.
+
+SERVER_NAME = "Server"
+
+# seconds between writes of the queued results and game records
+FLUSH_INTERVAL = 1.0
+
+# bytes of a resume token
+TOKEN_SIZE = 16
+# seconds a dropped session waits to be resumed
+RESUME_TIMEOUT = 60.0
+# seconds a resume waits for the old connection to be read to its end
+# before closing it
+RESUME_GRACE = 0.1
+
+# seconds player1 has for each phase, and the heartbeats of a connection
+Deadlines = namedtuple("Deadlines", "handshake move rematch heartbeat_interval heartbeat_timeout")
+DEADLINES = Deadlines(handshake=60.0, move=120.0, rematch=120.0,
+                      heartbeat_interval=protocol.HEARTBEAT_INTERVAL,
+                      heartbeat_timeout=protocol.HEARTBEAT_TIMEOUT)
+
+
+class ServerStats:
+    """Counters aggregated over every session of a server.
+    """
+    COUNTERS = ("connections", "active", "matches", "moves", "wins", "losses", "ties", "spectators",
+                "resumes", "reaped")
+
+    def __init__(self):
+        """initialize the counters.
+        """
+        self.started = time.perf_counter()
+        self.connections = 0
+        self.active = 0
+        self.matches = 0
+        self.moves = 0
+        self.wins = 0
+        self.losses = 0
+        self.ties = 0
+        self.spectators = 0
+        self.resumes = 0
+        self.reaped = 0
+
+    def add_game(self, game):
+        """Fold the result of a finished game into the counters.
+
+        Args:
+            game (BoardClass): the board of the game that just ended.
+        """
+        self.matches += 1
+        if game.isTie:
+            self.ties += 1
+        elif game.imWinner:
+            self.wins += 1
+        else:
+            self.losses += 1
+
+    def snapshot(self):
+        """Copy the counters, to send them to another process.
+
+        Returns:
+            dict: the value of every counter.
+        """
+        return {name: getattr(self, name) for name in self.COUNTERS}
+
+    def add_snapshot(self, snapshot):
+        """Add the counters of another server, as taken by `snapshot`.
+        """
+        for name, value in snapshot.items():
+            setattr(self, name, getattr(self, name) + value)
+
+    def computeStats(self):
+        """compute the stats of the server, in the same form as
+           `BoardClass.computeStats`, followed by the throughput.
+        """
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        str = f"Games Played: {self.matches}\n"+\
+              f"Wins Number: {self.wins}\n"+\
+              f"Losses Number: {self.losses}\n"+\
+              f"Ties Number: {self.ties}\n"+\
+              f"Matches/sec: {self.matches / elapsed:.1f}\n"+\
+              f"Moves/sec: {self.moves / elapsed:.1f}\n"+\
+              f"Spectators: {self.spectators}\n"+\
+              f"Resumes: {self.resumes}\n"+\
+              f"Reaped: {self.reaped}\n"
+        return str
+
+
+class ServerMetrics:
+    """The live metrics of a server, scraped over HTTP while it runs.
+    """
+    def __init__(self, registry=None):
+        """initialize the metrics.
+
+        Args:
+            registry (Registry): where the metrics are registered, a new one by default.
+        """
+        self.registry = registry or metrics.Registry()
+        self.connections = self.registry.gauge("ttt_connections_active", "Connections open.")
+        self.games_started = self.registry.counter("ttt_games_started_total", "Games started.")
+        self.games_finished = self.registry.counter("ttt_games_finished_total", "Games finished.")
+        self.moves = self.registry.counter("ttt_moves_total", "Moves played, by both sides.")
+        self.illegal_moves = self.registry.counter("ttt_illegal_moves_total",
+                                                   "Moves of player1 rejected by checkLegalMove.")
+        self.move_seconds = self.registry.histogram(
+            "ttt_move_seconds", "Time from reading a move of player1 to having the answer sent.")
+        self.handshake_seconds = self.registry.histogram(
+            "ttt_handshake_seconds", "Time from accepting a connection to answering its Hello.")
+        self.reaped = self.registry.counter(
+            "ttt_reaped_total", "Connections and sessions ended for a missed deadline or heartbeat.")
+
+
+class Connection:
+    """The deadlines and heartbeats of one connection, checked by a timer
+       of the server's wheel that is moved along as the connection goes.
+    """
+    def __init__(self, server, reader, writer):
+        """initialize the connection, whose peer has DEADLINES.handshake
+           seconds to send their first message.
+
+        Args:
+            server (GameServer): the server the connection belongs to.
+            reader (AsyncMessageReader): reader of the connection.
+            writer (StreamWriter): stream of the connection.
+        """
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        # session id (0 for a plain connection) -> session played over the connection
+        self.sessions = {}
+        # the deadline of the first message
+        now = time.monotonic()
+        self.deadline = now + server.deadlines.handshake
+        self.timer = server.timers.schedule(min(self.deadline, now + server.deadlines.heartbeat_interval),
+                                            self.check)
+
+    def check(self):
+        """Ping a quiet peer, close the connection of a dead one, and end
+           every session that missed its deadline; then check again at the
+           next heartbeat or deadline, whichever comes first.
+        """
+        self.timer = None
+        if self.writer.is_closing():
+            return
+        server = self.server
+        now = time.monotonic()
+        if self.deadline is not None and now >= self.deadline:
+            self.reap()
+            return
+        for session in list(self.sessions.values()):
+            if session.deadline is not None and now >= session.deadline:
+                server.stats.reaped += 1
+                server.metrics.reaped.inc()
+                session.time_out()
+        if self.writer.is_closing():
+            return
+        quiet = now - self.reader.heard
+        if quiet >= server.deadlines.heartbeat_timeout:
+            self.reap()
+            return
+        if quiet >= server.deadlines.heartbeat_interval:
+            self.writer.write(protocol.encode_ping())
+            due = now + server.deadlines.heartbeat_interval
+        else:
+            due = self.reader.heard + server.deadlines.heartbeat_interval
+        if self.deadline is not None:
+            due = min(due, self.deadline)
+        for session in self.sessions.values():
+            if session.deadline is not None:
+                due = min(due, session.deadline)
+        self.timer = server.timers.schedule(due, self.check)
+
+    def reap(self):
+        """Close the connection of a peer who missed the first message or
+           stopped answering; its session ends or is parked as the reads fail.
+        """
+        self.server.stats.reaped += 1
+        self.server.metrics.reaped.inc()
+        self.writer.close()
+
+    def close(self):
+        """Stop checking the connection.
+        """
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+
+class Session:
+    """One match between a remote player 1 and the server's player 2.
+    """
+    # whether a dropped connection leaves the session parked, to be resumed
+    resumable = True
+
+    def __init__(self, server, reader, writer):
+        """initialize the session.
+
+        Args:
+            server (GameServer): the server hosting the session.
+            reader (AsyncMessageReader): reader of player1's messages.
+            writer (StreamWriter): stream to send messages to player1.
+        """
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        self.game = gameboard.BoardClass()
+        self.channel = None
+        self.player1_name = None
+        self.playing = False
+        self.token = None
+        # drops the session if it stays parked too long
+        self.expiry = None
+        # set once the session is parked, while a resume waits for it
+        self.detached = None
+        # time.monotonic() by which player1 must send the next message
+        self.deadline = None
+        self.timed_out = False
+
+    def send(self, frame):
+        """Send an encoded message to player1.
+        """
+        self.writer.write(frame)
+
+    def handshake(self, hello):
+        """Take player1's name and answer with the server's name,
+           mirroring `App.get_username` of both players, followed by the
+           token that resumes the session.
+
+        Args:
+            hello (Hello): the first message of player1.
+        """
+        self.player1_name = hello.name
+        frame = protocol.encode_hello(self.server.name)
+        if self.resumable:
+            self.token = secrets.token_bytes(TOKEN_SIZE)
+            self.server.tokens[self.token] = self
+            frame += protocol.encode_token(self.token)
+        self.send(frame)
+        self.game.set_player_name(self.player1_name, self.server.name)
+
+    def state(self):
+        """Encode what player1 needs to carry on the session, from player1's side.
+        """
+        game = self.game
+        return protocol.encode_state(game.board_width, game.win_length, not self.playing,
+                                     game.last_player == self.player1_name, game.games_played,
+                                     game.losses, game.wins, game.ties, game.history)
+
+    def play_move(self, name, r, c, mark):
+        """Apply a move to the board.
+
+        Returns:
+            boolean: If the game is over, returns True. Otherwise returns False.
+        """
+        self.game.updateGameBoard(name, r, c, mark)
+        self.server.stats.moves += 1
+        self.server.metrics.moves.inc()
+        over = self.game.checkGameOver(r, c)
+        if over:
+            self.server.stats.add_game(self.game)
+            self.server.metrics.games_finished.inc()
+            if self.server.store is not None:
+                outcome = stats_store.outcome_of(self.game)
+                self.server.store.record(self.server.name, self.player1_name, outcome)
+                self.server.store.record(self.player1_name, self.server.name, -outcome)
+            if self.server.recorder is not None:
+                self.server.recorder.record_game(self.game, self.player1_name, self.server.name)
+        return over
+
+    def start_game(self):
+        """Set up the board of a new game, player1 moving first.
+        """
+        self.game.init_player(self.server.name, self.server.name)
+        self.game.resetGameBoard()
+        self.channel.start_game()
+        self.playing = True
+        self.server.metrics.games_started.inc()
+        self.deadline = time.monotonic() + self.server.deadlines.move
+
+    def take_move(self, r, c):
+        """Apply player1's move and answer with the server's.
+
+        Returns:
+            boolean: If the game is over, returns True. Otherwise returns False.
+        """
+        if not self.game.checkLegalMove(r, c):
+            self.server.metrics.illegal_moves.inc()
+            self.send(protocol.encode_error(protocol.ILLEGAL_MOVE, f"{r},{c}"))
+            raise protocol.ProtocolError(f"illegal move {r},{c} from {self.player1_name}")
+        # spectators who fell behind catch up from the board after the move
+        over = self.play_move(self.player1_name, r, c, "X")
+        if self.channel.subscribers:
+            self.channel.publish(protocol.encode_move(r, c))
+        if over:
+            return True
+        r, c = self.server.bot.choose_move(self.game)
+        move = protocol.encode_move(r, c)
+        self.send(move)
+        over = self.play_move(self.server.name, r, c, "O")
+        self.channel.publish(move)
+        return over
+
+    def handle(self, message):
+        """Apply one message of player1: a move during a game, then the
+           decision of playing again.
+
+        Returns:
+            boolean: If the session is over, returns True. Otherwise returns False.
+        """
+        if isinstance(message, protocol.Quit):
+            return True
+        if self.playing:
+            if not isinstance(message, protocol.Move):
+                raise protocol.ProtocolError(f"expected a move, got {message!r}")
+            received = time.perf_counter()
+            over = self.take_move(message.row, message.col)
+            self.server.metrics.move_seconds.observe(time.perf_counter() - received)
+            self.deadline = time.monotonic() + (self.server.deadlines.rematch if over
+                                                else self.server.deadlines.move)
+            if over:
+                self.playing = False
+                if self.server.draining:
+                    # stop between games; player1 may reconnect to another server
+                    self.send(protocol.encode_quit())
+                    return True
+            return False
+        if isinstance(message, protocol.Rematch):
+            self.start_game()
+            return False
+        raise protocol.ProtocolError(f"expected play again or quit, got {message!r}")
+
+    def open(self, hello):
+        """Answer player1's Hello and start the first game.
+        """
+        self.handshake(hello)
+        self.channel = self.server.spectators.open(self.game)
+        self.start_game()
+
+    async def run(self):
+        """Handle player1's messages until player1 stops playing or the
+           server shuts down.
+
+        Returns:
+            boolean: If the connection dropped and the session was parked to
+                     be resumed, returns True. Otherwise returns False.
+        """
+        while True:
+            try:
+                message = await self.reader.recv()
+            except ConnectionError:
+                if self.server.park(self):
+                    return True
+                raise
+            if self.handle(message):
+                return False
+
+    def time_out(self):
+        """End the session after player1 missed the deadline of a move or
+           of the decision to play again.
+        """
+        self.timed_out = True
+        self.deadline = None
+        self.send(protocol.encode_error(protocol.TIMEOUT, "move" if self.playing else "rematch"))
+        self.writer.close()
+
+    def close(self):
+        """Release the session's spectator channel.
+        """
+        if self.channel is not None:
+            self.server.spectators.close(self.channel)
+
+
+class MuxSession(Session):
+    """One of the matches multiplexed over a connection. It has no task of
+       its own: the connection hands it player1's messages as they arrive,
+       and its answers are queued to be sent together with the others'.
+    """
+    resumable = False
+
+    def __init__(self, server, reader, writer, session, out, sessions):
+        """initialize the session.
+
+        Args:
+            server (GameServer): the server hosting the session.
+            reader (AsyncMessageReader): reader of the shared connection.
+            writer (StreamWriter): stream of the shared connection.
+            session (int): the session id chosen by player1.
+            out (list): where the encoded answers of every session are queued.
+            sessions (dict): the sessions of the connection, by id.
+        """
+        super().__init__(server, reader, writer)
+        self.session = session
+        self.out = out
+        self.sessions = sessions
+
+    def send(self, frame):
+        """Queue an encoded message to player1, tagged with the session id.
+        """
+        self.out.append(protocol.encode_mux(self.session, frame))
+
+    def time_out(self):
+        """End only this session, like a connection of its own would end.
+        """
+        self.timed_out = True
+        self.send(protocol.encode_error(protocol.TIMEOUT, "move" if self.playing else "rematch"))
+        self.send(protocol.encode_quit())
+        # timers fire between the batches of the connection, whose answers are sent
+        self.writer.write(b"".join(self.out))
+        self.out.clear()
+        self.server.end_mux_session(self.sessions, self)
+
+
+class GameServer:
+    """Hosts any number of concurrent matches from one asyncio event loop.
+    """
+    def __init__(self, host, port, name=SERVER_NAME, bot=None, store=None, recorder=None,
+                 reuse_port=False, registry=None, deadlines=DEADLINES):
+        """initialize the server.
+
+        Args:
+            host (str): ip address to listen on.
+            port (int): port to listen on, 0 picks a free one.
+            name (str): name the server plays under.
+            bot: picks the server's moves, a RandomBot by default.
+            store (StatsStore): where results are persisted, if anywhere.
+            recorder (GameRecorder): where finished games are recorded, if anywhere.
+            reuse_port (bool): let other processes listen on the same port,
+                               the kernel spreading connections among them.
+            registry (Registry): where the live metrics are registered, a new
+                                 one by default.
+            deadlines (Deadlines): seconds player1 has for each phase, and
+                                   the heartbeats of the connections.
+        """
+        self.host = host
+        self.port = port
+        self.name = name
+        self.bot = bot or bots.RandomBot()
+        self.store = store
+        self.recorder = recorder
+        self.reuse_port = reuse_port
+        self.draining = False
+        self.stats = ServerStats()
+        self.metrics = ServerMetrics(registry)
+        self.spectators = spectators.Spectators()
+        self.sessions = set()
+        # resume token -> session, and the sessions whose connection dropped
+        self.tokens = {}
+        self.parked = {}
+        self.deadlines = deadlines
+        self.timers = timers.TimerWheel(time.monotonic())
+        self.ticker = None
+        self.server = None
+
+    async def start(self):
+        """Start listening. The bound port is stored in `self.port`.
+        """
+        self.server = await transport.start_server(self.handle_connection, self.host, self.port,
+                                                   backlog=4096, reuse_port=self.reuse_port or None)
+        if transport.kind(self.host) == transport.TCP:
+            self.port = self.server.sockets[0].getsockname()[1]
+        self.ticker = asyncio.create_task(self.run_timers())
+
+    async def run_timers(self):
+        """Fire the timers of the connections and parked sessions as they
+           fall due.
+        """
+        while True:
+            await asyncio.sleep(self.timers.tick)
+            self.timers.advance(time.monotonic())
+
+    async def shutdown(self, timeout):
+        """Stop accepting connections and let the running games finish,
+           waiting up to `timeout`, then close the connections left.
+
+        Args:
+            timeout (float): seconds to wait for the sessions.
+        """
+        self.draining = True
+        self.server.close()
+        for token in list(self.parked):
+            self.expire(token)
+        deadline = time.monotonic() + timeout
+        while self.sessions and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        for session in list(self.sessions):
+            session.writer.close()
+        # the sessions end as their reads see the connection closed
+        while self.sessions:
+            await asyncio.sleep(0.01)
+        self.ticker.cancel()
+        self.flush()
+
+    async def serve_forever(self):
+        """Start listening and serve until cancelled.
+        """
+        if self.server is None:
+            await self.start()
+        flusher = asyncio.create_task(self.flush_stats())
+        try:
+            async with self.server:
+                await self.server.serve_forever()
+        finally:
+            flusher.cancel()
+            self.ticker.cancel()
+            self.flush()
+
+    async def flush_stats(self):
+        """Write the queued results and game records every flush interval,
+           even while no game ends.
+        """
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            self.flush()
+
+    def flush(self):
+        """Write the queued results and game records.
+        """
+        if self.store is not None:
+            self.store.flush()
+        if self.recorder is not None:
+            self.recorder.flush()
+
+    async def serve_mux(self, connection, messages):
+        """Serve the sessions multiplexed over one connection until it closes.
+           Each batch of messages received is handled in order, then the
+           answers of every session are sent with one write.
+
+        Args:
+            connection (Connection): the connection.
+            messages (list): the messages already received.
+        """
+        reader = connection.reader
+        writer = connection.writer
+        out = []
+        sessions = connection.sessions
+        try:
+            while True:
+                for message in messages:
+                    if not isinstance(message, protocol.Mux):
+                        raise protocol.ProtocolError(f"expected a session message, got {message!r}")
+                    session = sessions.get(message.session)
+                    try:
+                        if session is None:
+                            if not isinstance(message.message, protocol.Hello):
+                                raise protocol.ProtocolError(f"expected a name, got {message!r}")
+                            session = MuxSession(self, reader, writer, message.session, out, sessions)
+                            sessions[message.session] = session
+                            self.sessions.add(session)
+                            self.stats.active += 1
+                            session.open(message.message)
+                        elif session.handle(message.message):
+                            self.end_mux_session(sessions, session)
+                    except protocol.ProtocolError:
+                        # only this session ends, like a connection of its own would
+                        out.append(protocol.encode_mux(message.session, protocol.encode_quit()))
+                        if session is not None:
+                            self.end_mux_session(sessions, session)
+                if out:
+                    writer.write(b"".join(out))
+                    out.clear()
+                if self.draining and not sessions:
+                    return
+                messages = await reader.recv_batch()
+        finally:
+            for session in list(sessions.values()):
+                self.end_mux_session(sessions, session)
+
+    def end_mux_session(self, sessions, session):
+        """Forget a multiplexed session that is over.
+        """
+        del sessions[session.session]
+        self.end_session(session)
+
+    def end_session(self, session):
+        """Forget a session that is over.
+        """
+        session.close()
+        self.stats.active -= 1
+        self.sessions.discard(session)
+        if session.token is not None:
+            del self.tokens[session.token]
+        if session.detached is not None and not session.detached.done():
+            session.detached.set_result(None)
+
+    def park(self, session):
+        """Keep a session whose connection dropped, for player1 to resume
+           within RESUME_TIMEOUT seconds.
+
+        Returns:
+            boolean: If the session was parked, returns True. Otherwise returns False.
+        """
+        if session.token is None or self.draining or session.timed_out:
+            return False
+        self.sessions.discard(session)
+        session.reader = session.writer = None
+        session.expiry = self.timers.schedule(time.monotonic() + RESUME_TIMEOUT, self.expire,
+                                              session.token)
+        self.parked[session.token] = session
+        if session.detached is not None and not session.detached.done():
+            session.detached.set_result(None)
+        return True
+
+    def expire(self, token):
+        """Drop a parked session that was not resumed in time.
+        """
+        session = self.parked.pop(token)
+        session.expiry.cancel()
+        self.end_session(session)
+
+    async def resume(self, token, reader, writer):
+        """Attach a dropped session to player1's new connection and send
+           player1 its state. If the server has not yet seen the old
+           connection drop, it is given RESUME_GRACE seconds to be read to
+           its end, then closed.
+
+        Args:
+            token (bytes): the token player1 got with the server's Hello.
+            reader (AsyncMessageReader): reader of the new connection.
+            writer (StreamWriter): stream of the new connection.
+
+        Returns:
+            Session: the resumed session, None if no session has the token.
+        """
+        session = self.tokens.get(token)
+        if session is not None and token not in self.parked and session.detached is None:
+            session.detached = asyncio.get_running_loop().create_future()
+            try:
+                await asyncio.wait_for(asyncio.shield(session.detached), RESUME_GRACE)
+            except asyncio.TimeoutError:
+                session.writer.close()
+                await session.detached
+            session.detached = None
+        session = self.parked.pop(token, None)
+        if session is None:
+            writer.write(protocol.encode_error(protocol.NO_SESSION))
+            return None
+        session.expiry.cancel()
+        session.expiry = None
+        session.reader = reader
+        session.writer = writer
+        session.deadline = time.monotonic() + (self.deadlines.move if session.playing
+                                               else self.deadlines.rematch)
+        self.sessions.add(session)
+        self.stats.resumes += 1
+        session.send(session.state())
+        return session
+
+    async def handle_connection(self, reader, writer):
+        """Serve a new connection, counting it as open while it lasts.
+
+        Args:
+            reader (StreamReader): stream to receive player1's messages.
+            writer (StreamWriter): stream to send messages to player1.
+        """
+        self.metrics.connections.inc()
+        try:
+            await self.serve_connection(reader, writer)
+        finally:
+            self.metrics.connections.dec()
+
+    async def serve_connection(self, reader, writer):
+        """Run a session for a new player1 connection, resume a dropped
+           one, or serve a spectator.
+
+        Args:
+            reader (StreamReader): stream to receive player1's messages.
+            writer (StreamWriter): stream to send messages to player1.
+        """
+        accepted = time.perf_counter()
+        message_reader = protocol.AsyncMessageReader(reader, writer)
+        connection = Connection(self, message_reader, writer)
+        session = None
+        try:
+            message = await message_reader.recv()
+            connection.deadline = None
+            if isinstance(message, protocol.Watch):
+                self.stats.spectators += 1
+                await self.spectators.watch(message.game_id, message_reader, writer)
+                return
+            if isinstance(message, protocol.Mux):
+                self.stats.connections += 1
+                await self.serve_mux(connection, [message])
+                return
+            if isinstance(message, protocol.Resume):
+                session = await self.resume(message.token, message_reader, writer)
+                if session is None:
+                    return
+            elif isinstance(message, protocol.Hello):
+                session = Session(self, message_reader, writer)
+                self.sessions.add(session)
+                self.stats.connections += 1
+                self.stats.active += 1
+                session.open(message)
+                self.metrics.handshake_seconds.observe(time.perf_counter() - accepted)
+            else:
+                raise protocol.ProtocolError(f"expected a name, got {message!r}")
+        except (ConnectionError, protocol.ProtocolError):
+            return
+        finally:
+            if session is None:
+                connection.close()
+                writer.close()
+        connection.sessions[0] = session
+        parked = False
+        try:
+            parked = await session.run()
+        except (ConnectionError, protocol.ProtocolError):
+            pass
+        finally:
+            connection.close()
+            writer.close()
+            if not parked:
+                self.end_session(session)
+
+
+def main(argv=None):
+    """run the server.
+    """
+    parser = argparse.ArgumentParser(description="Headless Tic-Tac-Toe host (player 2).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--stats-db", default=None,
+                        help="SQLite file to keep every player's results in")
+    parser.add_argument("--record", default=None,
+                        help="segment file to record every finished game in")
+    parser.add_argument("--metrics-port", type=int, default=0,
+                        help="port of the Prometheus /metrics endpoint, 0 for none")
+    parser.add_argument("--handshake-timeout", type=float, default=DEADLINES.handshake,
+                        help="seconds from connecting to player1's name")
+    parser.add_argument("--move-timeout", type=float, default=DEADLINES.move,
+                        help="seconds player1 has for each move")
+    parser.add_argument("--rematch-timeout", type=float, default=DEADLINES.rematch,
+                        help="seconds player1 has to decide on another game")
+    parser.add_argument("--heartbeat", type=float, default=DEADLINES.heartbeat_interval,
+                        help="seconds of silence before a connection is pinged; three"
+                             " times that and it is closed")
+    args = parser.parse_args(argv)
+
+    store = stats_store.StatsStore(args.stats_db) if args.stats_db else None
+    recorder = records.GameRecorder(args.record) if args.record else None
+    deadlines = Deadlines(args.handshake_timeout, args.move_timeout, args.rematch_timeout,
+                          args.heartbeat, 3 * args.heartbeat)
+    server = GameServer(args.host, args.port, store=store, recorder=recorder, deadlines=deadlines)
+    if args.metrics_port:
+        # the endpoint is HTTP over TCP whatever the game is served over
+        metrics_host = args.host if transport.kind(args.host) == transport.TCP else "127.0.0.1"
+        metrics.serve(server.metrics.registry, metrics_host, args.metrics_port)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if store is not None:
+            store.close()
+        if recorder is not None:
+            recorder.close()
+    print(server.stats.computeStats(), end="")
+
+
+if __name__ == "__main__":
+    main()
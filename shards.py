@@ -0,0 +1,217 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+import queue
+import signal
+import time
+
+import server
+import stats_store
+
+# runs one server process per core, all listening on the same port with
+# SO_REUSEPORT, so the kernel spreads new connections over the workers and
+# each worker hosts its own games in its own interpreter.
+#
+#     python shards.py --port 5000 --workers 4
+#
+# SIGHUP restarts the workers one at a time: the new worker listens first,
+# then the old one stops accepting and finishes its games. Workers that die
+# are started again. SIGINT or SIGTERM stops every worker the same way and
+# prints the stats of all of them together.
+
+# seconds between the stats each worker sends to the launcher
+REPORT_INTERVAL = 1.0
+
+
+def run_worker(index, host, port, stats_db, messages, drain_timeout):
+    """Serve on the shared port until SIGTERM, reporting the stats.
+
+    Args:
+        index (int): the worker's slot.
+        host (str): ip address to listen on.
+        port (int): the shared port.
+        stats_db (str): SQLite file of the results, None for none.
+        messages (Queue): where ("ready" | "stats" | "stopped", index, pid,
+                          snapshot) messages are sent to the launcher.
+        drain_timeout (float): seconds to let running games finish on SIGTERM.
+    """
+    # Ctrl-C and hangups reach the whole process group; the launcher decides
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    pid = os.getpid()
+    store = stats_store.StatsStore(stats_db) if stats_db else None
+
+    async def serve():
+        game_server = server.GameServer(host, port, store=store, reuse_port=True)
+        await game_server.start()
+        stop = asyncio.Event()
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+        messages.put(("ready", index, pid, game_server.stats.snapshot()))
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), REPORT_INTERVAL)
+            except asyncio.TimeoutError:
+                messages.put(("stats", index, pid, game_server.stats.snapshot()))
+                game_server.flush()
+        await game_server.shutdown(drain_timeout)
+        messages.put(("stopped", index, pid, game_server.stats.snapshot()))
+
+    try:
+        asyncio.run(serve())
+    finally:
+        if store is not None:
+            store.close()
+
+
+class Launcher:
+    """Starts, restarts and stops the workers, and adds up their stats.
+    """
+    def __init__(self, host, port, workers, stats_db=None, drain_timeout=10.0):
+        """initialize the launcher.
+
+        Args:
+            host (str): ip address to listen on.
+            port (int): the port every worker listens on.
+            workers (int): number of worker processes.
+            stats_db (str): SQLite file shared by the workers, None for none.
+            drain_timeout (float): seconds a stopping worker lets its games finish.
+        """
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.stats_db = stats_db
+        self.drain_timeout = drain_timeout
+        self.started = time.perf_counter()
+        self.messages = multiprocessing.Queue()
+        # slot -> running process
+        self.processes = {}
+        # pid -> latest counters of every worker ever started
+        self.snapshots = {}
+        self.ready = set()
+        self.restarts = 0
+        self.restart_requested = False
+        self.stop_requested = False
+
+    def start_worker(self, index):
+        """Start a worker in a slot and wait until it listens.
+
+        Returns:
+            Process: the new worker.
+        """
+        process = multiprocessing.Process(target=run_worker, name=f"shard-{index}",
+                                          args=(index, self.host, self.port, self.stats_db,
+                                                self.messages, self.drain_timeout))
+        process.start()
+        while process.pid not in self.ready and process.is_alive():
+            self.receive(0.1)
+        if not process.is_alive():
+            raise RuntimeError(f"worker {index} exited with {process.exitcode}")
+        return process
+
+    def stop_worker(self, process):
+        """Let a worker finish its games, then wait for it to exit.
+        """
+        if process.is_alive():
+            process.terminate()
+        deadline = time.monotonic() + self.drain_timeout + 5
+        while process.is_alive() and time.monotonic() < deadline:
+            self.receive(0.1)
+        if process.is_alive():
+            process.kill()
+        process.join()
+        self.ready.discard(process.pid)
+
+    def receive(self, timeout):
+        """Take in the messages of the workers for up to `timeout` seconds.
+        """
+        try:
+            kind, index, pid, snapshot = self.messages.get(timeout=timeout)
+        except queue.Empty:
+            return
+        while True:
+            self.snapshots[pid] = snapshot
+            if kind == "ready":
+                self.ready.add(pid)
+            try:
+                kind, index, pid, snapshot = self.messages.get_nowait()
+            except queue.Empty:
+                return
+
+    def restart(self):
+        """Replace every worker, one at a time, without closing the port.
+        """
+        for index in sorted(self.processes):
+            old = self.processes[index]
+            self.processes[index] = self.start_worker(index)
+            self.stop_worker(old)
+            self.restarts += 1
+
+    def run(self):
+        """Start the workers and look after them until SIGINT or SIGTERM.
+        """
+        signal.signal(signal.SIGHUP, lambda signum, frame: setattr(self, "restart_requested", True))
+        signal.signal(signal.SIGTERM, lambda signum, frame: setattr(self, "stop_requested", True))
+        signal.signal(signal.SIGINT, lambda signum, frame: setattr(self, "stop_requested", True))
+        for index in range(self.workers):
+            self.processes[index] = self.start_worker(index)
+        print(f"{self.workers} workers listening on {self.host}:{self.port}", flush=True)
+        while not self.stop_requested:
+            self.receive(0.5)
+            if self.restart_requested:
+                self.restart_requested = False
+                self.restart()
+            for index, process in list(self.processes.items()):
+                if not process.is_alive():
+                    # crashed; its last reported counters are kept
+                    process.join()
+                    self.ready.discard(process.pid)
+                    self.processes[index] = self.start_worker(index)
+                    self.restarts += 1
+        for process in self.processes.values():
+            process.terminate()
+        for process in self.processes.values():
+            self.stop_worker(process)
+        self.receive(0.1)
+
+    def stats(self):
+        """Add up the counters of every worker.
+
+        Returns:
+            ServerStats: the stats of the whole server, timed from the launch.
+        """
+        total = server.ServerStats()
+        total.started = self.started
+        for snapshot in self.snapshots.values():
+            total.add_snapshot(snapshot)
+        return total
+
+    def computeStats(self):
+        """compute the stats of all the workers, like `ServerStats.computeStats`.
+        """
+        return self.stats().computeStats() + \
+            f"Workers: {self.workers}\n" + \
+            f"Restarts: {self.restarts}\n"
+
+
+def main(argv=None):
+    """run the launcher.
+    """
+    parser = argparse.ArgumentParser(description="Run one server process per core on one port.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--stats-db", default=None,
+                        help="SQLite file to keep every player's results in")
+    parser.add_argument("--drain-timeout", type=float, default=10.0,
+                        help="seconds a stopping worker lets running games finish")
+    args = parser.parse_args(argv)
+
+    launcher = Launcher(args.host, args.port, args.workers, args.stats_db, args.drain_timeout)
+    launcher.run()
+    print(launcher.computeStats(), end="")
+
+
+if __name__ == "__main__":
+    main()
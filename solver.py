@@ -0,0 +1,87 @@
+import argparse
+import time
+
+import gameboard
+
+# one-time generator of the perfect-play table of the 3x3 game.
+#
+#     python solver.py
+#
+# solves every reachable position with negamax, folds the 8 symmetries and
+# writes gameboard.TABLE_PATH, which `BoardClass.bestMove`/`evaluate` read.
+
+LINES = gameboard._line_masks(3, 3)
+FULL = (1 << 9) - 1
+
+
+def solve():
+    """Solve every position reachable from the empty board.
+
+    Returns:
+        dict: canonical key -> (score, best move on the canonical board).
+              score is positive if the side to move wins, larger for
+              quicker wins, negative for losses and 0 for ties.
+    """
+    solved = {}
+
+    def negamax(mover, other):
+        """Solve a position, `mover` being the bits of the side to move.
+        """
+        x_bits, o_bits = (mover, other) if bin(mover).count("1") == bin(other).count("1") \
+            else (other, mover)
+        key, symmetry = gameboard.canonical(x_bits, o_bits)
+        if key in solved:
+            return solved[key][0]
+        empty = FULL & ~(mover | other)
+        if any(other & line == line for line in LINES):
+            # the side that just moved won; sooner losses score lower
+            result = (-(bin(empty).count("1") + 1), gameboard.NO_MOVE)
+        elif not empty:
+            result = (0, gameboard.NO_MOVE)
+        else:
+            best = None
+            for cell in range(9):
+                if empty >> cell & 1:
+                    score = -negamax(other, mover | 1 << cell)
+                    if best is None or score > best[0]:
+                        best = (score, cell)
+            result = (best[0], gameboard.SYMMETRIES[symmetry][best[1]])
+        solved[key] = result
+        return result[0]
+
+    negamax(0, 0)
+    return solved
+
+
+def write_table(solved, path=gameboard.TABLE_PATH):
+    """Write the solved positions, sorted by key.
+
+    Args:
+        solved (dict): the result of `solve`.
+        path (str): the file to write.
+    """
+    with open(path, "wb") as f:
+        f.write(gameboard.TABLE_MAGIC)
+        for key in sorted(solved):
+            score, move = solved[key]
+            value = (score > 0) - (score < 0)
+            f.write(gameboard.TABLE_RECORD.pack(key, (value + 1) << 4 | move))
+
+
+def main(argv=None):
+    """generate the table.
+    """
+    parser = argparse.ArgumentParser(description="Write the 3x3 perfect-play table.")
+    parser.add_argument("--output", default=gameboard.TABLE_PATH)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    solved = solve()
+    write_table(solved, args.output)
+    elapsed = time.perf_counter() - start
+    size = len(gameboard.TABLE_MAGIC) + len(solved) * gameboard.TABLE_RECORD.size
+    print(f"{len(solved)} canonical positions, {size} bytes, written in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
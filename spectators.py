@@ -0,0 +1,224 @@
+import argparse
+import asyncio
+
+import gameboard
+import protocol
+import transport
+
+# read-only spectators of live games. Every match hosted by the server or
+# refereed by the lobby has a channel; a spectator connects to the same port,
+# sends Watch instead of Hello, and gets a Snapshot of the board followed by
+# every move, then a Snapshot at the start of each rematch and Quit when the
+# match is over.
+#
+# each move is encoded once and the same bytes are written to every
+# spectator. Writes to spectators never wait: one whose unsent bytes pass
+# HIGH_WATER stops getting moves, and once they are down to LOW_WATER gets a
+# fresh Snapshot in place of the moves missed, so a slow spectator costs the
+# players nothing and never holds more than about HIGH_WATER bytes.
+#
+#     python spectators.py --port 5000 --game 0
+#
+# game ids belong to one server process; behind shards.py a spectator only
+# sees the games of the worker their connection lands on.
+
+HIGH_WATER = 64 * 1024
+LOW_WATER = 16 * 1024
+
+
+class Channel:
+    """The spectators of one match.
+    """
+    def __init__(self, game_id, game):
+        """initialize the channel.
+
+        Args:
+            game_id (int): the id spectators ask for.
+            game (BoardClass): the board of the match.
+        """
+        self.game_id = game_id
+        self.game = game
+        # spectator's writer -> whether they fell behind and wait for a Snapshot
+        self.subscribers = {}
+        self.closed = asyncio.get_running_loop().create_future()
+
+    def snapshot(self):
+        """Encode the board as it is now.
+        """
+        game = self.game
+        return protocol.encode_snapshot(self.game_id, game.player1_name or "", game.player2_name or "",
+                                        game.board_width, game.win_length, game.x_bits, game.o_bits)
+
+    def subscribe(self, writer):
+        """Add a spectator, sending them the board.
+        """
+        writer.write(self.snapshot())
+        self.subscribers[writer] = False
+
+    def unsubscribe(self, writer):
+        """Remove a spectator.
+        """
+        self.subscribers.pop(writer, None)
+
+    def publish(self, frame, snapshot=None):
+        """Write an encoded message to every spectator who keeps up.
+
+        Args:
+            frame (bytes): the message, written as is to every spectator.
+            snapshot (bytes): the Snapshot of the board after the message,
+                              encoded on first use if not given.
+        """
+        for writer, lagging in self.subscribers.items():
+            if writer.is_closing():
+                continue
+            buffered = writer.transport.get_write_buffer_size()
+            if lagging:
+                if buffered > LOW_WATER:
+                    continue
+                if snapshot is None:
+                    snapshot = self.snapshot()
+                writer.write(snapshot)
+                self.subscribers[writer] = False
+            elif buffered > HIGH_WATER:
+                self.subscribers[writer] = True
+            else:
+                writer.write(frame)
+
+    def start_game(self):
+        """Send every spectator the empty board of a new game.
+        """
+        if self.subscribers:
+            snapshot = self.snapshot()
+            self.publish(snapshot, snapshot)
+
+    def close(self):
+        """Tell every spectator the match is over.
+        """
+        frame = protocol.encode_quit()
+        for writer in self.subscribers:
+            if not writer.is_closing():
+                writer.write(frame)
+        self.subscribers.clear()
+        self.closed.set_result(None)
+
+
+class Spectators:
+    """The channels of every live match of a server or lobby.
+    """
+    def __init__(self):
+        """initialize the registry.
+        """
+        self.channels = {}
+        self.next_id = 1
+        self.latest = None
+        self.watching = 0
+
+    def open(self, game):
+        """Open the channel of a new match.
+
+        Args:
+            game (BoardClass): the board of the match.
+
+        Returns:
+            Channel: the channel, with a new game id.
+        """
+        channel = Channel(self.next_id, game)
+        self.channels[channel.game_id] = channel
+        self.latest = channel.game_id
+        self.next_id += 1
+        return channel
+
+    def close(self, channel):
+        """Close the channel of a match that is over.
+        """
+        del self.channels[channel.game_id]
+        channel.close()
+
+    async def watch(self, game_id, reader, writer):
+        """Serve a spectator until the match is over or they leave.
+
+        Args:
+            game_id (int): the game asked for, 0 for the latest one.
+            reader (AsyncMessageReader): reader of the spectator's messages.
+            writer (StreamWriter): stream to send messages to the spectator.
+        """
+        channel = self.channels.get(game_id or self.latest)
+        if channel is None:
+            writer.write(protocol.encode_error(protocol.NO_GAME, str(game_id)))
+            return
+        channel.subscribe(writer)
+        self.watching += 1
+        # spectators have nothing to say; anything they send, or closing
+        # the connection, means they leave
+        leaving = asyncio.ensure_future(reader.recv())
+        try:
+            await asyncio.wait((leaving, channel.closed), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            self.watching -= 1
+            channel.unsubscribe(writer)
+            if leaving.done():
+                leaving.exception()
+            else:
+                leaving.cancel()
+
+
+def show(game):
+    """Print a board.
+    """
+    for row in game.game_board:
+        print("|".join(row))
+    print(flush=True)
+
+
+def run_watch(host, port, game_id):
+    """Watch a game, printing the board after every move.
+
+    Args:
+        host (str): ip address of the server or lobby.
+        port (int): its port.
+        game_id (int): the game to watch, 0 for the latest one.
+    """
+    s = transport.connect(host, port)
+    reader = protocol.MessageReader(s)
+    s.sendall(protocol.encode_watch(game_id))
+    game = None
+    try:
+        while True:
+            message = reader.recv()
+            if isinstance(message, protocol.Snapshot):
+                game = gameboard.BoardClass(message.board_width, message.win_length)
+                game.set_player_name(message.player1, message.player2)
+                game.x_bits = message.x_bits
+                game.o_bits = message.o_bits
+                game.moves = bin(message.x_bits | message.o_bits).count("1")
+                print(f"game {message.game_id}: {message.player1} (X) vs {message.player2} (O)")
+            elif isinstance(message, protocol.Move):
+                mark = "O" if game.moves % 2 else "X"
+                name = game.player2_name if mark == "O" else game.player1_name
+                game.updateGameBoard(name, message.row, message.col, mark)
+            elif isinstance(message, protocol.Error):
+                print(f"no game {message.text}")
+                return
+            elif isinstance(message, protocol.Quit):
+                print("match over")
+                return
+            show(game)
+    except ConnectionError:
+        pass
+    finally:
+        s.close()
+
+
+def main(argv=None):
+    """run a spectator.
+    """
+    parser = argparse.ArgumentParser(description="Watch a live Tic-Tac-Toe game.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--game", type=int, default=0, help="game id, 0 for the latest game")
+    args = parser.parse_args(argv)
+    run_watch(args.host, args.port, args.game)
+
+
+if __name__ == "__main__":
+    main()
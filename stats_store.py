@@ -0,0 +1,167 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+# durable per-player statistics in a local SQLite database.
+#
+# results are queued in memory and written in one transaction per batch,
+# so a busy server does not pay a commit for every game. The per-player
+# totals are kept in their own table keyed by name, so a player's lifetime
+# stats are one primary key lookup however long the history is.
+
+DEFAULT_PATH = os.environ.get("TTT_STATS_DB", "ttt_stats.db")
+
+WIN = 1
+TIE = 0
+LOSS = -1
+
+Lifetime = namedtuple("Lifetime", "games_played wins losses ties")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS players (
+    name TEXT PRIMARY KEY,
+    games_played INTEGER NOT NULL,
+    wins INTEGER NOT NULL,
+    losses INTEGER NOT NULL,
+    ties INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    player TEXT NOT NULL,
+    opponent TEXT,
+    outcome INTEGER NOT NULL,
+    finished REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_player ON results (player, finished);
+"""
+
+_UPSERT = """
+INSERT INTO players (name, games_played, wins, losses, ties) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (name) DO UPDATE SET
+    games_played = games_played + excluded.games_played,
+    wins = wins + excluded.wins,
+    losses = losses + excluded.losses,
+    ties = ties + excluded.ties
+"""
+
+
+def outcome_of(game):
+    """Get the outcome of a finished game for the owner of the board.
+
+    Args:
+        game (BoardClass): the board, right after `checkGameOver` returned True.
+
+    Returns:
+        int: WIN, TIE or LOSS.
+    """
+    if game.isTie:
+        return TIE
+    return WIN if game.imWinner else LOSS
+
+
+def format_stats(lifetime):
+    """Format lifetime stats like `BoardClass.computeStats`.
+    """
+    str = f"Games Played: {lifetime.games_played}\n"+\
+          f"Wins Number: {lifetime.wins}\n"+\
+          f"Losses Number: {lifetime.losses}\n"+\
+          f"Ties Number: {lifetime.ties}\n"
+    return str
+
+
+class StatsStore:
+    """Batched writer and reader of the statistics database.
+    """
+    def __init__(self, path=DEFAULT_PATH, batch_size=1000, flush_interval=1.0):
+        """open the database, creating it if needed.
+
+        Args:
+            path (str): the database file.
+            batch_size (int): queued results that trigger a write.
+            flush_interval (float): seconds after which queued results are
+                                    written by the next `record`.
+        """
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        # the write-ahead log only syncs at checkpoints with synchronous=NORMAL
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.pending = []
+        self.pending_totals = {}
+        self.last_flush = time.monotonic()
+
+    def record(self, player, opponent, outcome):
+        """Queue the result of one game for one player.
+
+        Args:
+            player (str): the player's name.
+            opponent (str): the opponent's name.
+            outcome (int): WIN, TIE or LOSS for the player.
+        """
+        with self.lock:
+            self.pending.append((player, opponent, outcome, time.time()))
+            totals = self.pending_totals.setdefault(player, [0, 0, 0, 0])
+            totals[0] += 1
+            totals[{WIN: 1, LOSS: 2, TIE: 3}[outcome]] += 1
+            due = (len(self.pending) >= self.batch_size
+                   or time.monotonic() - self.last_flush >= self.flush_interval)
+        if due:
+            self.flush()
+
+    def record_game(self, game, player, opponent):
+        """Queue the result of a finished game for the owner of the board.
+        """
+        self.record(player, opponent, outcome_of(game))
+
+    def flush(self):
+        """Write every queued result in one transaction.
+        """
+        with self.lock:
+            pending, self.pending = self.pending, []
+            totals, self.pending_totals = self.pending_totals, {}
+            self.last_flush = time.monotonic()
+            if not pending:
+                return
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT INTO results (player, opponent, outcome, finished) VALUES (?, ?, ?, ?)",
+                    pending)
+                self.conn.executemany(_UPSERT, [(name, *counts) for name, counts in totals.items()])
+
+    def lifetime(self, player):
+        """Get a player's lifetime stats, including queued results.
+
+        Args:
+            player (str): the player's name.
+
+        Returns:
+            Lifetime: games played, wins, losses and ties.
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT games_played, wins, losses, ties FROM players WHERE name = ?",
+                (player,)).fetchone() or (0, 0, 0, 0)
+            queued = self.pending_totals.get(player, (0, 0, 0, 0))
+        return Lifetime(*(a + b for a, b in zip(row, queued)))
+
+    def history(self, player, limit=10):
+        """Get a player's latest results, newest first.
+
+        Returns:
+            list: (opponent, outcome, finished) tuples.
+        """
+        self.flush()
+        return self.conn.execute(
+            "SELECT opponent, outcome, finished FROM results WHERE player = ?"
+            " ORDER BY finished DESC LIMIT ?", (player, limit)).fetchall()
+
+    def close(self):
+        """Write the queued results and close the database.
+        """
+        self.flush()
+        self.conn.close()
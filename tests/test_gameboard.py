@@ -0,0 +1,163 @@
+import random
+
+import pytest
+
+import gameboard
+
+
+def reference_winner(grid, width, win_length):
+    """Scan every cell in every direction for `win_length` equal marks.
+    """
+    for r in range(width):
+        for c in range(width):
+            mark = grid[r][c]
+            if mark == " ":
+                continue
+            for dr, dc in ((0, 1), (1, 0), (1, 1), (1, -1)):
+                cells = [(r + dr * i, c + dc * i) for i in range(win_length)]
+                if all(0 <= rr < width and 0 <= cc < width and grid[rr][cc] == mark
+                       for rr, cc in cells):
+                    return mark
+    return None
+
+
+def reference_status(grid, width, win_length):
+    winner = reference_winner(grid, width, win_length)
+    if winner == "X":
+        return gameboard.X_WON
+    if winner == "O":
+        return gameboard.O_WON
+    if all(mark != " " for row in grid for mark in row):
+        return gameboard.TIE
+    return gameboard.ONGOING
+
+
+@pytest.mark.parametrize("width,win_length", [(3, 3), (4, 3), (4, 4), (5, 4), (6, 4), (7, 5), (9, 5)])
+def test_random_games_match_a_reference_scan(width, win_length):
+    rng = random.Random(width * 100 + win_length)
+    game = gameboard.BoardClass(width, win_length)
+    game.init_player("p1", "p2")
+    for _ in range(100):
+        game.resetGameBoard()
+        grid = [[" "] * width for _ in range(width)]
+        cells = list(range(width * width))
+        rng.shuffle(cells)
+        played = (game.games_played, game.wins, game.losses, game.ties)
+        for i, cell in enumerate(cells):
+            r, c = divmod(cell, width)
+            mark, name = ("X", "p1") if i % 2 == 0 else ("O", "p2")
+            assert game.checkLegalMove(r, c)
+            game.updateGameBoard(name, r, c, mark)
+            grid[r][c] = mark
+            assert not game.checkLegalMove(r, c)
+            expected = reference_status(grid, width, win_length)
+            assert game.status() == expected
+            assert game.game_board == grid
+            over = game.checkGameOver(r, c)
+            assert over == (expected != gameboard.ONGOING)
+            if over:
+                break
+        games, wins, losses, ties = played
+        # counted from p1's side
+        assert game.games_played == games + 1
+        assert (game.wins - wins, game.losses - losses, game.ties - ties) == {
+            gameboard.X_WON: (1, 0, 0), gameboard.O_WON: (0, 1, 0), gameboard.TIE: (0, 0, 1)}[expected]
+
+        # a board set up from its bitmasks alone has every line checked
+        bare = gameboard.BoardClass(width, win_length)
+        bare.x_bits, bare.o_bits = game.x_bits, game.o_bits
+        bare.moves = game.moves
+        assert bare.status() == expected
+
+
+def test_win_length_must_fit_the_board():
+    with pytest.raises(ValueError):
+        gameboard.BoardClass(3, 4)
+
+
+@pytest.mark.parametrize("width,win_length", [(3, 3), (5, 4), (8, 5)])
+def test_push_pop_keep_the_zobrist_hash(width, win_length):
+    rng = random.Random(width)
+    game = gameboard.BoardClass(width, win_length)
+    assert game.zobrist == 0
+    for _ in range(50):
+        cells = rng.sample(range(width * width), rng.randrange(1, width * width + 1))
+        hashes = []
+        for cell in cells:
+            game.push(cell)
+            hashes.append(game.zobrist)
+        # the same as a board that played the moves, computed from its bitmasks
+        played = gameboard.BoardClass(width, win_length)
+        for i, cell in enumerate(cells):
+            played.updateGameBoard("p", *divmod(cell, width), "XO"[i % 2])
+        assert (played.x_bits, played.o_bits, played.zobrist) == (game.x_bits, game.o_bits, hashes[-1])
+        for cell in reversed(cells):
+            assert game.zobrist == hashes.pop()
+            assert game.pop() == cell
+        assert (game.x_bits, game.o_bits, game.moves, game.zobrist) == (0, 0, 0, 0)
+        assert not game.history
+
+
+def test_zobrist_tells_apart_marks_and_cells():
+    seen = {}
+    for cell in range(9):
+        for mark in "XO":
+            game = gameboard.BoardClass()
+            game.updateGameBoard("p", *divmod(cell, 3), mark)
+            seen[(cell, mark)] = game.zobrist
+    assert len(set(seen.values())) == 18
+
+
+def negamax(x_bits, o_bits, memo):
+    """Value of a 3x3 position for the side to move, by full search.
+    """
+    key = (x_bits, o_bits)
+    if key not in memo:
+        game = gameboard.BoardClass()
+        game.x_bits, game.o_bits = x_bits, o_bits
+        game.moves = bin(x_bits | o_bits).count("1")
+        status = game.status()
+        if status in (gameboard.X_WON, gameboard.O_WON):
+            value = -1
+        elif status == gameboard.TIE:
+            value = 0
+        else:
+            x_moves = game.moves % 2 == 0
+            value = -1
+            for cell in range(9):
+                if not (x_bits | o_bits) >> cell & 1:
+                    child = (x_bits | 1 << cell, o_bits) if x_moves else (x_bits, o_bits | 1 << cell)
+                    value = max(value, -negamax(*child, memo))
+        memo[key] = value
+    return memo[key]
+
+
+def test_perfect_play_table_matches_a_full_search():
+    memo = {}
+    negamax(0, 0, memo)
+    assert len(memo) == 5478
+    game = gameboard.BoardClass()
+    for (x_bits, o_bits), value in memo.items():
+        game.x_bits, game.o_bits = x_bits, o_bits
+        game.moves = bin(x_bits | o_bits).count("1")
+        assert game.evaluate() == value
+        move = game.bestMove()
+        if game.status() != gameboard.ONGOING:
+            assert move is None
+            continue
+        cell = move[0] * 3 + move[1]
+        assert game.checkLegalMove(*move)
+        if game.moves % 2 == 0:
+            child = (x_bits | 1 << cell, o_bits)
+        else:
+            child = (x_bits, o_bits | 1 << cell)
+        assert -negamax(*child, memo) == value
+
+
+def test_perfect_play_is_only_known_for_3x3():
+    game = gameboard.BoardClass(4, 3)
+    assert not game.isSolved()
+    with pytest.raises(ValueError):
+        game.evaluate()
+    with pytest.raises(ValueError):
+        game.bestMove()
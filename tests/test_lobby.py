@@ -0,0 +1,95 @@
+import asyncio
+
+import lobby
+import protocol
+import server
+
+
+async def read_frame(reader, timeout=2.0):
+    """Read one frame off a raw stream, Pings and Pongs included, which
+       the message readers keep to themselves.
+
+    Returns:
+        tuple: (message type, payload).
+    """
+    header = await asyncio.wait_for(reader.readexactly(protocol.HEADER.size), timeout)
+    _, msg_type, length = protocol.HEADER.unpack(header)
+    payload = await asyncio.wait_for(reader.readexactly(length), timeout)
+    return msg_type, payload
+
+
+async def pair(lobby_):
+    """Connect two players to the lobby and wait for their match.
+
+    Returns:
+        tuple: the (reader, writer) of 'X', then of 'O'.
+    """
+    players = []
+    for name in ("alice", "bob"):
+        reader, writer = await asyncio.open_connection("127.0.0.1", lobby_.port)
+        writer.write(protocol.encode_hello(name))
+        await writer.drain()
+        players.append((reader, writer))
+        # the first player is queued before the second arrives
+        await asyncio.sleep(0.05)
+    for reader, _ in players:
+        msg_type, _ = await read_frame(reader)
+        assert msg_type == protocol.MATCH
+    return players
+
+
+def run_with_lobby(deadlines, scenario):
+    async def main():
+        lobby_ = lobby.Lobby("127.0.0.1", 0, deadlines=deadlines)
+        await lobby_.start()
+        try:
+            await scenario(lobby_)
+        finally:
+            lobby_.server.close()
+    asyncio.run(main())
+
+
+def test_waiting_player_is_answered_while_the_mover_thinks():
+    async def scenario(lobby_):
+        (x_reader, x_writer), (o_reader, o_writer) = await pair(lobby_)
+        # 'X' has not moved yet; 'O' pings while waiting
+        o_writer.write(protocol.encode_ping())
+        assert await read_frame(o_reader) == (protocol.PONG, b"")
+        x_writer.write(protocol.encode_move(1, 1))
+        assert await read_frame(o_reader) == (protocol.MOVE, protocol.MOVE_BODY.pack(1, 1))
+        x_writer.close()
+        o_writer.close()
+    run_with_lobby(server.DEADLINES, scenario)
+
+
+def test_mover_missing_the_move_deadline_ends_the_match():
+    deadlines = server.Deadlines(handshake=5.0, move=0.3, rematch=5.0,
+                                 heartbeat_interval=5.0, heartbeat_timeout=15.0)
+
+    async def scenario(lobby_):
+        (x_reader, x_writer), (o_reader, o_writer) = await pair(lobby_)
+        msg_type, payload = await read_frame(x_reader)
+        assert msg_type == protocol.ERROR
+        assert protocol.ERROR_CODE.unpack_from(payload)[0] == protocol.TIMEOUT
+        assert (await read_frame(o_reader))[0] == protocol.QUIT
+        x_writer.close()
+        o_writer.close()
+    run_with_lobby(deadlines, scenario)
+
+
+def test_silent_waiting_player_ends_the_match():
+    deadlines = server.Deadlines(handshake=5.0, move=5.0, rematch=5.0,
+                                 heartbeat_interval=0.1, heartbeat_timeout=0.3)
+
+    async def scenario(lobby_):
+        (x_reader, x_writer), (o_reader, o_writer) = await pair(lobby_)
+        # 'X' answers the lobby's Pings while thinking, 'O' never does
+        while True:
+            msg_type, _ = await read_frame(x_reader)
+            if msg_type != protocol.PING:
+                break
+            x_writer.write(protocol.encode_pong())
+        assert msg_type == protocol.QUIT
+        x_writer.close()
+        o_writer.close()
+    run_with_lobby(deadlines, scenario)
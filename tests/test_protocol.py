@@ -0,0 +1,99 @@
+import socket
+
+import pytest
+
+import protocol
+
+MESSAGES = [
+    protocol.Hello("alice"),
+    protocol.Move(2, 1),
+    protocol.Rematch(),
+    protocol.Quit(),
+    protocol.Error(protocol.ILLEGAL_MOVE, "1,1"),
+    protocol.Match("bob", "O"),
+    protocol.Watch(7),
+    protocol.Snapshot(7, "alice", "bob", 3, 3, 0b101, 0b10),
+    protocol.Mux(4, protocol.Move(0, 2)),
+    protocol.Token(b"\x01" * 16),
+    protocol.Resume(b"\x02" * 16),
+    protocol.State(3, 3, False, True, 2, 1, 0, 1, (4, 0, 8)),
+    protocol.Board(7, 4),
+]
+
+
+def frame(msg_type, payload):
+    return protocol.HEADER.pack(protocol.VERSION, msg_type, len(payload)) + payload
+
+
+@pytest.mark.parametrize("message", MESSAGES, ids=lambda m: type(m).__name__)
+def test_round_trip(message):
+    assert protocol.Decoder().feed(protocol.encode(message)) == [message]
+
+
+def test_coalesced_frames():
+    data = b"".join(protocol.encode(message) for message in MESSAGES)
+    assert protocol.Decoder().feed(data) == MESSAGES
+
+
+def test_split_frames():
+    data = b"".join(protocol.encode(message) for message in MESSAGES)
+    decoder = protocol.Decoder()
+    decoded = []
+    for i in range(len(data)):
+        decoded += decoder.feed(data[i:i + 1])
+    assert decoded == MESSAGES
+    assert not decoder.buffer
+
+
+def test_heartbeats_are_counted_not_returned():
+    decoder = protocol.Decoder()
+    data = protocol.encode_ping() + protocol.encode_move(1, 1) + protocol.encode_pong() + protocol.encode_ping()
+    assert decoder.feed(data) == [protocol.Move(1, 1)]
+    assert decoder.pings == 2
+
+
+@pytest.mark.parametrize("data", [
+    frame(protocol.ERROR, b""),
+    frame(protocol.ERROR, b"\x00") + protocol.encode_move(1, 1),
+    frame(protocol.HELLO, b"\xff\xfe"),
+    frame(protocol.ERROR, b"\x00\x01\xff"),
+    frame(protocol.MATCH, b"X\xc3"),
+    frame(protocol.MATCH, b""),
+    frame(protocol.MOVE, b"\x00\x01"),
+    frame(protocol.WATCH, b"\x00"),
+    frame(protocol.STATE, b"\x00" * (protocol.STATE_HEAD.size + 1)),
+    frame(protocol.SNAPSHOT, b"\x00" * 3),
+    protocol.encode_snapshot(1, "a", "b", 3, 3, 0, 0).replace(b"a", b"\xff"),
+    frame(protocol.MUX, b"\x00\x00\x00\x01" + frame(protocol.MOVE, b"\x00")),
+    frame(protocol.MUX, b"\x00\x00\x00\x01" + frame(protocol.HELLO, b"\xff")),
+    frame(protocol.BOARD, b"\x07"),
+    frame(99, b""),
+    b"\x02" + protocol.encode_quit()[1:],
+], ids=["error-empty", "error-short", "hello-utf8", "error-utf8", "match-utf8", "match-empty",
+        "move-short", "watch-short", "state-odd", "snapshot-short", "snapshot-utf8",
+        "mux-inner-short", "mux-inner-utf8", "board-short", "unknown-type", "version"])
+def test_malformed_frames_raise_protocol_error(data):
+    with pytest.raises(protocol.ProtocolError):
+        protocol.Decoder().feed(data)
+
+
+def test_messages_before_a_malformed_one_are_kept():
+    decoder = protocol.Decoder()
+    data = protocol.encode_move(0, 0) + protocol.encode_quit() + frame(protocol.HELLO, b"\xff")
+    assert decoder.feed(data) == [protocol.Move(0, 0), protocol.Quit()]
+    with pytest.raises(protocol.ProtocolError):
+        decoder.feed(b"")
+    with pytest.raises(protocol.ProtocolError):
+        decoder.feed(protocol.encode_move(1, 1))
+
+
+def test_reader_raises_after_the_messages_before_a_malformed_one():
+    a, b = socket.socketpair()
+    with a, b:
+        a.sendall(protocol.encode_move(2, 2) + frame(protocol.ERROR, b"\x00"))
+        reader = protocol.MessageReader(b)
+        assert reader.recv() == protocol.Move(2, 2)
+        # raised without waiting for more bytes
+        b.settimeout(1)
+        with pytest.raises(protocol.ProtocolError):
+            reader.recv()
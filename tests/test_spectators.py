@@ -0,0 +1,109 @@
+import asyncio
+
+import bots
+import gameboard
+import protocol
+import server
+import spectators
+
+
+class FakeTransport:
+    """Reports a write buffer of a chosen size.
+    """
+    def __init__(self):
+        self.buffered = 0
+
+    def get_write_buffer_size(self):
+        return self.buffered
+
+
+class FakeWriter:
+    """Collects what is written, in place of a StreamWriter.
+    """
+    def __init__(self):
+        self.transport = FakeTransport()
+        self.data = bytearray()
+
+    def write(self, data):
+        self.data += data
+
+    def is_closing(self):
+        return False
+
+    def close(self):
+        pass
+
+    def messages(self):
+        """Decode and forget everything written so far.
+        """
+        messages = protocol.Decoder().feed(bytes(self.data))
+        self.data.clear()
+        return messages
+
+
+def run(coroutine):
+    return asyncio.run(coroutine())
+
+
+def test_lagging_spectator_skips_moves_then_catches_up():
+    async def scenario():
+        game = gameboard.BoardClass()
+        game.set_player_name("alice", "bob")
+        channel = spectators.Spectators().open(game)
+        writer = FakeWriter()
+        channel.subscribe(writer)
+        assert isinstance(writer.messages()[0], protocol.Snapshot)
+
+        game.updateGameBoard("alice", 0, 0, "X")
+        channel.publish(protocol.encode_move(0, 0))
+        assert writer.messages() == [protocol.Move(0, 0)]
+
+        # past HIGH_WATER the spectator is marked lagging and gets nothing
+        writer.transport.buffered = spectators.HIGH_WATER + 1
+        game.updateGameBoard("bob", 1, 1, "O")
+        channel.publish(protocol.encode_move(1, 1))
+        assert channel.subscribers[writer] is True
+        assert writer.messages() == []
+
+        # still above LOW_WATER: nothing either
+        writer.transport.buffered = spectators.LOW_WATER + 1
+        game.updateGameBoard("alice", 0, 1, "X")
+        channel.publish(protocol.encode_move(0, 1))
+        assert writer.messages() == []
+
+        # drained: a Snapshot of the board replaces the moves missed
+        writer.transport.buffered = 0
+        game.updateGameBoard("bob", 2, 2, "O")
+        channel.publish(protocol.encode_move(2, 2))
+        (snapshot,) = writer.messages()
+        assert isinstance(snapshot, protocol.Snapshot)
+        assert (snapshot.x_bits, snapshot.o_bits) == (game.x_bits, game.o_bits)
+        assert channel.subscribers[writer] is False
+
+        game.updateGameBoard("alice", 0, 2, "X")
+        channel.publish(protocol.encode_move(0, 2))
+        assert writer.messages() == [protocol.Move(0, 2)]
+    run(scenario)
+
+
+def test_session_publishes_moves_after_playing_them():
+    async def scenario():
+        game_server = server.GameServer("127.0.0.1", 0, bot=bots.RandomBot(1))
+        session = server.Session(game_server, None, FakeWriter())
+        session.open(protocol.Hello("alice"))
+        spectator = FakeWriter()
+        session.channel.subscribe(spectator)
+        spectator.messages()
+        # a spectator who fell behind and drained catches up on the next move
+        session.channel.subscribers[spectator] = True
+
+        session.take_move(0, 0)
+        snapshot, answer = spectator.messages()
+        assert (snapshot.x_bits, snapshot.o_bits) == (0b1, 0)
+        # the Snapshot and the server's move add up to the server's board
+        assert isinstance(answer, protocol.Move)
+        cell = answer.row * 3 + answer.col
+        assert session.game.o_bits == 1 << cell
+        assert session.game.x_bits == snapshot.x_bits
+        session.close()
+    run(scenario)
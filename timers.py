@@ -0,0 +1,106 @@
+import math
+
+# one scheduler for the many timers of a host: every connection has a
+# deadline and a heartbeat, and every dropped session an expiry.
+#
+# a hashed timing wheel: a ring of slots, one per tick, each holding the
+# timers due in that tick of some rotation. Scheduling and cancelling cost
+# the same however many timers there are; `advance` only looks at the slots
+# of the ticks that went by. A timer is due within a tick after its time.
+# Cancelled timers are dropped when their slot comes round.
+
+# seconds per slot, and slots per rotation
+TICK = 0.1
+SLOTS = 1024
+
+
+class Timer:
+    """A callback due at a time, as returned by `TimerWheel.schedule`.
+    """
+    __slots__ = ('when', 'tick', 'callback', 'args', 'cancelled')
+
+    def __init__(self, when, tick, callback, args):
+        """initialize the timer.
+
+        Args:
+            when (float): when it is due, in the clock of the wheel.
+            tick (int): the tick it is due at.
+            callback: called with `args` once due.
+            args (tuple): the arguments of the callback.
+        """
+        self.when = when
+        self.tick = tick
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        """Keep the timer from firing.
+        """
+        self.cancelled = True
+        self.callback = self.args = None
+
+
+class TimerWheel:
+    """Fires timers as the time they are due goes by.
+    """
+    def __init__(self, now, tick=TICK, slots=SLOTS):
+        """initialize the wheel.
+
+        Args:
+            now (float): the current time, e.g. time.monotonic().
+            tick (float): seconds per slot.
+            slots (int): slots per rotation.
+        """
+        self.tick = tick
+        self.slots = [[] for _ in range(slots)]
+        self.current = int(now / tick)
+        self.count = 0
+
+    def __len__(self):
+        """Count the timers scheduled, including cancelled ones not yet dropped.
+        """
+        return self.count
+
+    def schedule(self, when, callback, *args):
+        """Call `callback(*args)` once `when` has gone by.
+
+        Returns:
+            Timer: the timer, to cancel it.
+        """
+        tick = max(math.ceil(when / self.tick), self.current + 1)
+        timer = Timer(when, tick, callback, args)
+        self.slots[tick % len(self.slots)].append(timer)
+        self.count += 1
+        return timer
+
+    def advance(self, now):
+        """Fire every timer due by `now`.
+
+        Returns:
+            int: the number of timers fired.
+        """
+        target = int(now / self.tick)
+        fired = 0
+        # after a long pause, one rotation visits every slot
+        first = max(self.current + 1, target - len(self.slots) + 1)
+        for tick in range(first, target + 1):
+            index = tick % len(self.slots)
+            slot = self.slots[index]
+            if not slot:
+                continue
+            # callbacks may schedule into this slot again
+            self.slots[index] = []
+            later = []
+            for timer in slot:
+                if timer.cancelled:
+                    self.count -= 1
+                elif timer.tick <= target:
+                    self.count -= 1
+                    fired += 1
+                    timer.callback(*timer.args)
+                else:
+                    later.append(timer)
+            self.slots[index].extend(later)
+        self.current = max(self.current, target)
+        return fired
@@ -0,0 +1,206 @@
+import os
+import sys
+import threading
+import time
+import traceback
+
+# opt-in instrumentation of the players' move path.
+#
+# set TTT_TRACE=1 to enable it (each player writes <player>.trace on exit),
+# or set it to the file name to write to.
+# TTT_STALL_MS sets how long the Tk mainloop may be blocked before the
+# watchdog reports it (100 ms by default).
+
+# the stages a move is stamped at. A local move is clicked, rendered and
+# sent; a move of the opponent is received, handed over to the main thread
+# through the message buffer and rendered.
+STAGES = ("click", "send", "receive", "handoff", "render")
+
+
+def percentile(sorted_values, p):
+    """Get a percentile of sorted values, nearest-rank.
+
+    Args:
+        sorted_values (list): the values, sorted ascending.
+        p (float): the percentile, 0 to 100.
+
+    Returns:
+        float: the value at that percentile, 0.0 if there are no values.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(p / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize(name, values):
+    """Format count and p50/p95/p99 of a list of durations in milliseconds.
+    """
+    values = sorted(values)
+    return (f"{name}: n={len(values)} p50={percentile(values, 50):.2f}ms "
+            f"p95={percentile(values, 95):.2f}ms p99={percentile(values, 99):.2f}ms")
+
+
+class NullTracer:
+    """Tracer used when tracing is off; every call does nothing.
+    """
+    def stamp(self, key, stage):
+        pass
+
+    def finish(self, key):
+        pass
+
+    def watch(self, root):
+        pass
+
+    def close(self, stats=""):
+        pass
+
+
+NULL_TRACER = NullTracer()
+
+
+class MoveTracer:
+    """Timestamps every move at each stage and keeps a histogram of the
+       time spent between stages, for one player session.
+    """
+    def __init__(self, path, stall_ms=100):
+        """initialize the tracer.
+
+        Args:
+            path (str): file the histograms are written to on close.
+            stall_ms (float): mainloop block, in milliseconds, reported by the watchdog.
+        """
+        self.path = path
+        self.moves = {}
+        self.durations = {}
+        self.watchdog = Watchdog(stall_ms)
+
+    def stamp(self, key, stage):
+        """Record that a move reached a stage. Safe to call from any thread.
+
+        Args:
+            key (tuple): (row, col) of the move.
+            stage (str): one of STAGES.
+        """
+        self.moves.setdefault(tuple(key), {})[stage] = time.perf_counter()
+
+    def finish(self, key):
+        """Add the time between the consecutive stages of a move,
+           and from its first to its last stage, to the histograms.
+
+        Args:
+            key (tuple): (row, col) of the move.
+        """
+        stamps = sorted(self.moves.pop(tuple(key), {}).items(), key=lambda item: item[1])
+        for (first, t1), (second, t2) in zip(stamps, stamps[1:]):
+            self.add(f"{first}->{second}", t2 - t1)
+        if len(stamps) > 2:
+            self.add(f"{stamps[0][0]}->{stamps[-1][0]}", stamps[-1][1] - stamps[0][1])
+
+    def add(self, name, seconds):
+        self.durations.setdefault(name, []).append(seconds * 1000)
+
+    def watch(self, root):
+        """Watch the mainloop of a (new) Tk root.
+        """
+        self.watchdog.watch(root)
+
+    def report(self):
+        """Format the histograms.
+
+        Returns:
+            str: one line per stage pair, then the mainloop stalls.
+        """
+        lines = [summarize(name, values) for name, values in sorted(self.durations.items())]
+        lines.append(summarize("mainloop stalls", self.watchdog.stalls))
+        return "\n".join(lines) + "\n"
+
+    def close(self, stats=""):
+        """Stop the watchdog and write the stats and histograms to the file.
+
+        Args:
+            stats (str): the `computeStats` text of the session.
+        """
+        self.watchdog.stop()
+        with open(self.path, "w") as f:
+            f.write(stats)
+            f.write(self.report())
+
+
+class Watchdog:
+    """Reports when the Tk mainloop is blocked for longer than a threshold.
+
+    A heartbeat is scheduled on the mainloop with `after`. A background
+    thread checks that it keeps beating and prints the main thread's stack
+    while it is blocked; the length of each stall is recorded once the
+    mainloop runs again.
+    """
+    def __init__(self, stall_ms):
+        """initialize the watchdog.
+
+        Args:
+            stall_ms (float): mainloop block, in milliseconds, that is reported.
+        """
+        self.threshold = stall_ms / 1000
+        self.interval = self.threshold / 4
+        self.stalls = []
+        self.last_beat = time.perf_counter()
+        self.reported = False
+        self.root = None
+        self.main_thread_id = threading.get_ident()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.check, daemon=True)
+        self.thread.start()
+
+    def watch(self, root):
+        """Start beating on a Tk root, which replaces any earlier one.
+        """
+        self.root = root
+        self.last_beat = time.perf_counter()
+        root.after(int(self.interval * 1000), self.beat, root)
+
+    def beat(self, root):
+        """The heartbeat, run by the mainloop.
+        """
+        if root is not self.root:
+            return
+        now = time.perf_counter()
+        late = now - self.last_beat - self.interval
+        if late > self.threshold:
+            self.stalls.append(late * 1000)
+        self.last_beat = now
+        self.reported = False
+        root.after(int(self.interval * 1000), self.beat, root)
+
+    def check(self):
+        """Background thread: report a mainloop that stopped beating.
+        """
+        while not self.stopped.wait(self.interval):
+            blocked = time.perf_counter() - self.last_beat - self.interval
+            if self.root is not None and blocked > self.threshold and not self.reported:
+                self.reported = True
+                frame = sys._current_frames().get(self.main_thread_id)
+                stack = "".join(traceback.format_stack(frame)) if frame else ""
+                print(f"mainloop blocked for {blocked * 1000:.0f}ms at:\n{stack}",
+                      file=sys.stderr)
+
+    def stop(self):
+        self.stopped.set()
+
+
+def from_env(default_path):
+    """Create the tracer selected by the environment.
+
+    Args:
+        default_path (str): file to write to when TTT_TRACE is "1".
+
+    Returns:
+        MoveTracer or NullTracer: a MoveTracer if TTT_TRACE is set, else NULL_TRACER.
+    """
+    path = os.environ.get("TTT_TRACE")
+    if not path:
+        return NULL_TRACER
+    if path == "1":
+        path = default_path
+    return MoveTracer(path, float(os.environ.get("TTT_STALL_MS", "100")))
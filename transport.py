@@ -0,0 +1,229 @@
+import asyncio
+import errno
+import os
+import queue
+import socket
+import stat
+import threading
+
+# the transports the players and the headless host talk over, chosen by the
+# host typed in for player2, so that nothing else changes:
+#
+#     127.0.0.1, 5000            TCP, as always
+#     unix:/tmp/ttt.sock         a Unix domain socket at that path, the port
+#                                is ignored
+#     inproc:NAME                both ends in one process, for co-located bots
+#                                and tests, the port is ignored
+#
+# a Unix domain socket skips the TCP stack: no checksums, no congestion
+# control, no Nagle, one copy from one buffer to the other. The in-process
+# transport goes further and never names anything on the file system: each
+# connection is a `socket.socketpair()`, one end handed to the listener's
+# `accept` through a queue. Every transport gives real sockets, so
+# `sendall`, `settimeout` and protocol.MessageReader work the same over all
+# three.
+#
+# the asyncio helpers cover TCP and Unix domain sockets; an in-process
+# listener lives in the threads of the process that opened it.
+
+TCP = "tcp"
+UNIX = "unix"
+INPROC = "inproc"
+
+UNIX_PREFIX = UNIX + ":"
+INPROC_PREFIX = INPROC + ":"
+
+# name -> InProcessListener of this process
+_listeners = {}
+_listeners_lock = threading.Lock()
+
+
+def kind(host):
+    """Tell the transport a host names.
+
+    Args:
+        host (str): an ip address or name, "unix:PATH" or "inproc:NAME".
+
+    Returns:
+        str: TCP, UNIX or INPROC.
+    """
+    if host.startswith(UNIX_PREFIX):
+        return UNIX
+    if host.startswith(INPROC_PREFIX):
+        return INPROC
+    return TCP
+
+
+def _address(host):
+    """Strip the prefix of a Unix or in-process host.
+    """
+    return host.split(":", 1)[1]
+
+
+def _clear_stale(path):
+    """Remove the socket file a dead host left at `path`, so it can be bound
+       again. A host still listening there is not disturbed.
+    """
+    try:
+        if not stat.S_ISSOCK(os.stat(path).st_mode):
+            return
+    except FileNotFoundError:
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except ConnectionRefusedError:
+        os.unlink(path)
+        return
+    except OSError:
+        return
+    finally:
+        probe.close()
+    raise OSError(errno.EADDRINUSE, f"a host is already listening on {path}")
+
+
+class InProcessListener:
+    """The listening end of the in-process transport, in the manner of a
+       listening socket.
+    """
+    def __init__(self, name):
+        """initialize the listener and register it under its name.
+
+        Args:
+            name (str): the name clients connect to.
+        """
+        self.name = name
+        self.pending = queue.Queue()
+        with _listeners_lock:
+            if name in _listeners:
+                raise OSError(errno.EADDRINUSE, f"{INPROC_PREFIX}{name} is already listening")
+            _listeners[name] = self
+
+    def accept(self):
+        """Wait for a client.
+
+        Returns:
+            tuple: (socket, name), as `socket.accept` returns.
+        """
+        conn = self.pending.get()
+        if conn is None:
+            # wake any other thread waiting too
+            self.pending.put(None)
+            raise OSError(errno.EBADF, "listener closed")
+        return conn, self.name
+
+    def getsockname(self):
+        """Name the listener the way clients connect to it.
+        """
+        return INPROC_PREFIX + self.name
+
+    def close(self):
+        """Stop taking connections; clients not accepted yet are closed.
+        """
+        with _listeners_lock:
+            if _listeners.get(self.name) is self:
+                del _listeners[self.name]
+        while True:
+            try:
+                conn = self.pending.get_nowait()
+            except queue.Empty:
+                break
+            if conn is not None:
+                conn.close()
+        self.pending.put(None)
+
+
+def listen(host, port, backlog=1):
+    """Open a listener.
+
+    Args:
+        host (str): ip address to listen on, "unix:PATH" or "inproc:NAME".
+        port (int or str): port to listen on, ignored but by TCP.
+        backlog (int): connections waiting to be accepted.
+
+    Returns:
+        socket or InProcessListener: the listener, with `accept` and `close`.
+    """
+    transport = kind(host)
+    if transport == INPROC:
+        return InProcessListener(_address(host))
+    if transport == UNIX:
+        path = _address(host)
+        _clear_stale(path)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(path)
+    else:
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind((host, int(port)))
+    listener.listen(backlog)
+    return listener
+
+
+def connect(host, port):
+    """Connect to a listener.
+
+    Args:
+        host (str): ip address of the host, "unix:PATH" or "inproc:NAME".
+        port (int or str): port of the host, ignored but by TCP.
+
+    Returns:
+        socket: the connected socket.
+    """
+    transport = kind(host)
+    if transport == INPROC:
+        name = _address(host)
+        with _listeners_lock:
+            listener = _listeners.get(name)
+        if listener is None:
+            raise ConnectionRefusedError(errno.ECONNREFUSED, f"nothing listens on {host}")
+        client, conn = socket.socketpair()
+        listener.pending.put(conn)
+        return client
+    if transport == UNIX:
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            s.connect(_address(host))
+        except OSError:
+            s.close()
+            raise
+        return s
+    return socket.create_connection((host, int(port)))
+
+
+async def open_connection(host, port, **kwargs):
+    """`asyncio.open_connection` over TCP or a Unix domain socket.
+
+    Returns:
+        tuple: (StreamReader, StreamWriter).
+    """
+    transport = kind(host)
+    if transport == INPROC:
+        raise ValueError(f"{host}: the in-process transport has no asyncio listener")
+    if transport == UNIX:
+        return await asyncio.open_unix_connection(_address(host), **kwargs)
+    return await asyncio.open_connection(host, port, **kwargs)
+
+
+async def start_server(callback, host, port, backlog=100, reuse_port=None):
+    """`asyncio.start_server` over TCP or a Unix domain socket.
+
+    Args:
+        callback: called with (StreamReader, StreamWriter) of each connection.
+        host (str): ip address to listen on or "unix:PATH".
+        port (int): port to listen on, ignored by a Unix domain socket.
+        backlog (int): connections waiting to be accepted.
+        reuse_port (bool): let other processes listen on the same port, TCP only.
+
+    Returns:
+        asyncio.Server: the server.
+    """
+    transport = kind(host)
+    if transport == INPROC:
+        raise ValueError(f"{host}: the in-process transport has no asyncio listener")
+    if transport == UNIX:
+        if reuse_port:
+            raise ValueError("processes cannot share a Unix domain socket; give each its own path")
+        path = _address(host)
+        _clear_stale(path)
+        return await asyncio.start_unix_server(callback, path, backlog=backlog)
+    return await asyncio.start_server(callback, host, port, backlog=backlog, reuse_port=reuse_port)